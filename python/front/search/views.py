@@ -27,23 +27,33 @@ def index(request: WSGIRequest):
         url_params = parse_url(urlparse(full_path).query)
         page_list: list[dict] = []
         has_next = False
+        next_token = ''
 
         # 検索時
         if url_params['q']:
             start_time = time.time()
-            # TODO: 複数のキーワード検索にも対応する。
+            # afterがあれば，前回表示したページの続きから検索する．
+            after = url_params['after'][0] if url_params.get('after') else None
+            # 自然言語と数式を両方含む場合は，Searcherがそれぞれを同時に検索する．
             result = Searcher.search(
-                url_params['q'][0], int(url_params['start'][0]), url_params['lr']
+                url_params['q'], int(url_params['start'][0]), url_params['lr'], after=after
                 )
             page_list = result['search_result']
             has_next = result['has_next']
-            search_time = time.time() - start_time
-            print(f'search time: {search_time}秒')
+            next_token = result['next'] or ''
+            # 数式のLaTeXをpath setに変換した時間は検索の時間に含めない．
+            compile_time = result['compile_time']
+            search_time = time.time() - start_time - compile_time
+            cache_stats = Searcher.result_cache.stats()
+            print(f'compile time: {compile_time}秒, search time: {search_time}秒, query count: {result["query_count"]}, '
+                  f'cache hit: {result["cache_hit"]}, cache hit ratio: {cache_stats["hit_ratio"]:.2f}, '
+                  f'timed out: {result["timed_out"]}')
 
         context = {
             'page_list': page_list,
             'has_next': has_next,
             'start': str(int(url_params['start'][0])+10),
+            'after': next_token,
             'ocr': '',
         }
         return render(request, 'search/index.html', context)
@@ -95,6 +95,19 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+# SEARCH_CACHE_URLを設定すると，uWSGIのworkerで数式の検索結果を共有する．
+# e.g. SEARCH_CACHE_URL=filecache:///var/tmp/twels_search_cache
+#      SEARCH_CACHE_URL=rediscache://127.0.0.1:6379/1
+
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+if env.str('SEARCH_CACHE_URL', default=''):
+    CACHES['search'] = env.cache('SEARCH_CACHE_URL')
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 
@@ -15,3 +15,15 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'twelS.settings')
 
 application = get_wsgi_application()
+
+# 有効になっていれば，workerが検索を始める前にpath_dictionaryをメモリに読み込む．
+from twels.searcher.path_index import PathIndex  # noqa: E402
+PathIndex.get()
+
+# SEARCH_CACHE_URLが設定されていれば，workerで数式の検索結果を共有する．
+from django.conf import settings  # noqa: E402
+from django.core.cache import caches  # noqa: E402
+from twels.searcher.searcher import Searcher  # noqa: E402
+if 'search' in settings.CACHES:
+    Searcher.result_cache.backend = caches['search']
+    Searcher.continuation_cache.backend = caches['search']
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""Expression._clean()のbenchmark．
+test_dataのHTMLファイルの数式を，lxmlのparser targetで1回の走査で整形した場合と，
+BeautifulSoupで整形した場合とで比較する．
+testsディレクトリで実行する．
+    python -m benchmarks.bench_expression
+"""
+import time
+from pathlib import Path
+
+from scrapy.http import HtmlResponse
+
+from twels.expr.expression import Expression
+
+TEST_DATA_DIR = Path(__file__).resolve().parent.parent / 'test_data'
+REPEAT = 5
+
+
+def load_mathmls() -> list[str]:
+    """test_dataのHTMLファイルからcrawlerと同じ方法でMathMLを取り出す関数．"""
+    mathmls = []
+    for path in sorted(TEST_DATA_DIR.glob('*.html')):
+        response = HtmlResponse(url=f'file://{path}', body=path.read_bytes(), encoding='utf-8')
+        mathmls.extend(response.xpath('//math').getall())
+    return mathmls
+
+
+def measure(mathmls: list[str], clean) -> tuple[float, list[str]]:
+    """全てのMathMLをREPEAT回整形したときの1数式あたりの秒数と，整形結果を返す関数．"""
+    results = [clean(mathml) for mathml in mathmls]
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        for mathml in mathmls:
+            clean(mathml)
+    return (time.perf_counter() - start) / (REPEAT * len(mathmls)), results
+
+
+def main():
+    mathmls = load_mathmls()
+    print(f'{len(mathmls)} exprs, {REPEAT} times')
+
+    bs4_time, bs4_results = measure(mathmls, Expression._clean_with_bs4)
+    lxml_time, lxml_results = measure(mathmls, Expression._clean)
+
+    assert bs4_results == lxml_results, 'BeautifulSoupとlxmlで結果が異なります．'
+    print(f'  BeautifulSoup : {bs4_time * 1000:8.3f} ms/expr')
+    print(f'  lxml target   : {lxml_time * 1000:8.3f} ms/expr')
+    print(f'  speedup       : {bs4_time / lxml_time:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""1ページからSnippetと数式のリストを作る処理のbenchmark．
+functions.get_snippet()とfunctions.get_exprs()をそれぞれ呼ぶ場合と，
+ExpressionTableを共有するfunctions.get_snippet_and_exprs()を呼ぶ場合とで，
+1ページあたりのCPU時間を比較する．
+testsディレクトリで実行する．
+    python -m benchmarks.bench_functions
+"""
+import time
+from pathlib import Path
+
+from scrapy.http import HtmlResponse
+
+from twels.expr.expression import ExpressionTable
+from web_crawler.web_crawler.spiders import functions
+
+TEST_DATA_DIR = Path(__file__).resolve().parent.parent / 'test_data'
+REPEAT = 5
+
+
+def separately(response: HtmlResponse) -> tuple:
+    return functions.get_snippet(response), functions.get_exprs(response)
+
+
+def measure(response: HtmlResponse, func) -> tuple[float, tuple]:
+    """REPEAT回実行したときの1回あたりのCPU時間(秒)と，結果を返す関数．"""
+    result = func(response)
+    start = time.process_time()
+    for _ in range(REPEAT):
+        func(response)
+    return (time.process_time() - start) / REPEAT, result
+
+
+def main():
+    for path in sorted(TEST_DATA_DIR.glob('*.html')):
+        response = HtmlResponse(url=f'file://{path}', body=path.read_bytes(), encoding='utf-8')
+        separate_time, (separate_snippet, separate_exprs) = measure(response, separately)
+        shared_time, (shared_snippet, shared_exprs) = measure(response, functions.get_snippet_and_exprs)
+
+        assert separate_snippet.text == shared_snippet.text, 'snippetが異なります．'
+        assert set(separate_exprs) == set(shared_exprs), '数式が異なります．'
+
+        expr_table = ExpressionTable()
+        functions.get_exprs(response, expr_table)
+        functions.get_snippet(response, expr_table)
+        print(f'{path.name}: {len(shared_exprs)} exprs '
+              f'(cleaned {expr_table.misses} times, reused {expr_table.hits} times)')
+        print(f'  get_snippet + get_exprs : {separate_time * 1000:8.2f} ms/page')
+        print(f'  get_snippet_and_exprs   : {shared_time * 1000:8.2f} ms/page')
+        print(f'  saved                   : {(separate_time - shared_time) * 1000:8.2f} ms/page '
+              f'({1 - shared_time / separate_time:.1%})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""Infoのbenchmark．
+多くのページに含まれる数式の大きなinfoについて，
+以前のJSONとlistの実装と，posting.pyのbinaryとarrayの実装とで，
+メモリ使用量，保存するサイズ，読み込みと書き込みの時間を比較する．
+testsディレクトリで実行する．
+    python -m benchmarks.bench_info
+"""
+import copy
+import json
+import random
+import time
+import tracemalloc
+
+from twels.indexer.info import Info
+
+PAGE_NUM = 100000
+REPEAT = 5
+
+
+class JsonInfo:
+    """以前のInfoの実装．JSONを読み込んで，listをdeepcopyして保存する．"""
+    def __init__(self, info: dict):
+        self.uri_id_list: list[str] = copy.deepcopy(info['uri_id'])
+        self.lang_list: list[str] = copy.deepcopy(info['lang'])
+        self.expr_start_pos_list: list[list[int]] = copy.deepcopy(info['expr_start_pos'])
+
+    @staticmethod
+    def loads(data: str) -> 'JsonInfo':
+        return JsonInfo(json.loads(data))
+
+    def dumps(self) -> str:
+        return json.dumps({
+            "uri_id": self.uri_id_list,
+            "lang": self.lang_list,
+            "expr_start_pos": self.expr_start_pos_list
+        })
+
+
+def make_info_dict(page_num: int) -> dict:
+    """page_numページに含まれる数式のinfoを作る関数．"""
+    rng = random.Random(0)
+    uri_ids = sorted(rng.sample(range(1, page_num * 3), page_num))
+    return {
+        'uri_id': [str(uri_id) for uri_id in uri_ids],
+        'lang': [rng.choice(['ja', 'en']) for _ in uri_ids],
+        'expr_start_pos': [sorted(rng.sample(range(30000), rng.randint(1, 5))) for _ in uri_ids],
+    }
+
+
+def update_json(data: str) -> str:
+    """以前のIndexerと同じように，1ページ分の情報を追加して保存し直す関数．"""
+    info = JsonInfo.loads(data)
+    info.uri_id_list.append(str(PAGE_NUM * 3))
+    info.lang_list.append('ja')
+    info.expr_start_pos_list.append([100])
+    return info.dumps()
+
+
+def update_binary(data: bytes) -> bytes:
+    """1ページ分の情報を追加して保存し直す関数．"""
+    info = Info.loads(data)
+    info.add_page(PAGE_NUM * 3, 'ja', [100])
+    return info.to_bytes()
+
+
+def measure_memory(loads, data) -> int:
+    """loads(data)で作ったオブジェクトが使うメモリのbyte数を返す関数．"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    info = loads(data)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del info
+    return after - before
+
+
+def measure_time(func, *args) -> float:
+    """REPEAT回実行したときの1回あたりの秒数を返す関数．"""
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        func(*args)
+    return (time.perf_counter() - start) / REPEAT
+
+
+def main():
+    info_dict = make_info_dict(PAGE_NUM)
+    json_data = JsonInfo(info_dict).dumps()
+    binary_data = Info(info_dict).to_bytes()
+    assert Info.loads(binary_data).dumps() == json_data, 'binaryとJSONで結果が異なります．'
+
+    print(f'{PAGE_NUM} pages, {sum(map(len, info_dict["expr_start_pos"]))} start positions, {REPEAT} times')
+    rows = [
+        ('JSON + list', json_data, JsonInfo.loads, lambda info: info.dumps(), update_json),
+        ('binary + array', binary_data, Info.loads, lambda info: info.to_bytes(), update_binary),
+    ]
+    for name, data, loads, dumps, update in rows:
+        info = loads(data)
+        size = len(data.encode('utf-8')) if isinstance(data, str) else len(data)
+        print(f'  {name:15}: stored {size / 1024:8.1f} KiB, '
+              f'memory {measure_memory(loads, data) / 1024:8.1f} KiB, '
+              f'decode {measure_time(loads, data) * 1000:7.1f} ms, '
+              f'encode {measure_time(dumps, info) * 1000:7.1f} ms, '
+              f'update 1 page {measure_time(update, data) * 1000:7.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""Parser.get_parsed_tree()のbenchmark．
+test_dataのHTMLファイルの数式を，Earley parserだけで解析した場合と，
+LALR parserで解析してから失敗したものだけEarley parserで解析した場合とで比較する．
+testsディレクトリで実行する．
+    python -m benchmarks.bench_parser
+"""
+import time
+from pathlib import Path
+
+from scrapy.http import HtmlResponse
+
+from twels.expr.expression import Expression
+from twels.expr.parser import Parser
+from web_crawler.web_crawler.spiders import functions
+
+TEST_DATA_DIR = Path(__file__).resolve().parent.parent / 'test_data'
+REPEAT = 5
+
+
+def load_exprs() -> list[Expression]:
+    """test_dataのHTMLファイルからcrawlerと同じ方法で数式を取り出す関数．"""
+    exprs = []
+    for path in sorted(TEST_DATA_DIR.glob('*.html')):
+        response = HtmlResponse(url=f'file://{path}', body=path.read_bytes(), encoding='utf-8')
+        exprs.extend(functions.get_exprs(response))
+    return exprs
+
+
+def measure(exprs: list[Expression], use_lalr: bool) -> tuple[float, list]:
+    """全ての数式をREPEAT回解析したときの1数式あたりの秒数と，解析結果を返す関数．
+    Parser.parse()はcacheを使うので，Parser.get_parsed_tree()を直接呼ぶ．
+    """
+    Parser.use_lalr = use_lalr
+    trees = [Parser.get_parsed_tree(expr) for expr in exprs]
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        for expr in exprs:
+            Parser.get_parsed_tree(expr)
+    return (time.perf_counter() - start) / (REPEAT * len(exprs)), trees
+
+
+def main():
+    exprs = load_exprs()
+    print(f'{len(exprs)} exprs, {REPEAT} times')
+
+    earley_time, earley_trees = measure(exprs, use_lalr=False)
+    Parser.reset_stats()
+    lalr_time, lalr_trees = measure(exprs, use_lalr=True)
+    stats = Parser.get_stats()
+    Parser.use_lalr = True
+
+    assert earley_trees == lalr_trees, 'LALR parserとEarley parserで結果が異なります．'
+    total = sum(stats.values()) - stats['error']
+    print(f'  earley only : {earley_time * 1000:8.3f} ms/expr')
+    print(f'  lalr first  : {lalr_time * 1000:8.3f} ms/expr '
+          f'(lalr {stats["lalr"]}, earley fallback {stats["earley"]}, error {stats["error"]}, '
+          f'lalr ratio {stats["lalr"] / total:.1%})')
+    print(f'  speedup     : {earley_time / lalr_time:.1f}x')
+
+    # LALR parserで解析できる数式だけで比較する．
+    lalr_exprs = [expr for expr in exprs if Parser._get_lalr_parsed_tree(expr) is not None]
+    if lalr_exprs:
+        earley_time, _ = measure(lalr_exprs, use_lalr=False)
+        lalr_time, _ = measure(lalr_exprs, use_lalr=True)
+        print(f'{len(lalr_exprs)} exprs that LALR parser can parse')
+        print(f'  earley only : {earley_time * 1000:8.3f} ms/expr')
+        print(f'  lalr        : {lalr_time * 1000:8.3f} ms/expr')
+        print(f'  speedup     : {earley_time / lalr_time:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""PathIndexのbenchmark．
+path_dictionaryのレコード(expr_idsはJSONの文字列)から類似度を計算する場合と，
+メモリ上のPathIndexのarrayから計算する場合とで，1回の検索の時間を比較する．
+MySQLとの通信の時間は含まないので，MySQLを使う場合の実際の時間はこれより長い．
+全ての数式の類似度を計算してsortする以前のstored functionと同じ方法の時間も表示する．
+testsディレクトリで実行する．
+    python -m benchmarks.bench_path_index
+"""
+import json
+import time
+
+from benchmarks.bench_search import LIMIT, QUERIES, make_records, measure, sort_all
+from twels.expr.expression import Expression
+from twels.expr.parser import Parser
+from twels.searcher import similarity
+from twels.searcher.path_index import PathIndex
+
+
+def main():
+    print(f'top {LIMIT}')
+    for mathml in QUERIES:
+        path_set = Parser.parse(Expression(mathml))
+        records = make_records(path_set)
+        rows = [(expr_size, expr_ids) for _, expr_size, expr_ids in records]
+
+        start = time.perf_counter()
+        path_index = PathIndex()
+        path_index.load_rows(records)
+        load_time = time.perf_counter() - start
+
+        sort_time, sorted_result = measure(sort_all, rows, len(path_set))
+        mysql_time, mysql_result = measure(similarity.top_k, rows, len(path_set), LIMIT)
+        index_time, index_result = measure(path_index.search, path_set, LIMIT)
+
+        assert mysql_result == index_result, 'MySQLとPathIndexで検索結果が異なります．'
+        assert sorted_result[:LIMIT] == index_result, '全ての数式をsortした場合と検索結果が異なります．'
+        expr_num = sum(len(json.loads(expr_ids)) for _, expr_ids in rows)
+        print(f'{mathml}: {len(path_set)} paths, {len(records)} records, {expr_num} postings')
+        print(f'  load PathIndex              : {load_time * 1000:8.2f} ms')
+        print(f'  score all + sorted          : {sort_time * 1000:8.2f} ms/query')
+        print(f'  JSON records + top_k        : {mysql_time * 1000:8.2f} ms/query')
+        print(f'  PathIndex + top_k           : {index_time * 1000:8.2f} ms/query')
+        print(f'  speedup (vs score all)      : {sort_time / index_time:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""数式の類似度の順位付けのbenchmark．
+'x'のように多くの数式に含まれるpathで検索したときの，1回の検索の時間を比較する．
+1. search() stored functionの結果の並べ方．以前のCursor.search()のように全ての数式をsortする場合と，
+   similarity.rank()やsimilarity.iter_ranked()で上位の数式だけを並べる場合．
+   stored functionの結果はデータベースがないと作れないので，Jaccard係数の類似度を順番を変えて使う．
+2. PathIndexとSegmentSetが使うJaccard係数の計算．全ての数式の類似度を計算してsortする場合と，
+   similarity.top_k()で上位の数式が決まった時点で計算を止める場合．
+path_dictionaryのレコードはデータベースから取得したときと同じようにexpr_idsをJSONの文字列にする．
+testsディレクトリで実行する．
+    python -m benchmarks.bench_search
+"""
+import json
+import random
+import time
+from itertools import islice
+
+from twels.expr.expression import Expression
+from twels.expr.parser import Parser
+from twels.searcher import similarity
+
+EXPR_NUM = 200000
+MAX_EXPR_SIZE = 200
+# 1ページ目の検索で必要な数式の数．Searcher.expr_batch_sizeと同じ．
+LIMIT = 20
+REPEAT = 5
+
+QUERIES = [
+    '<math><mi>x</mi></math>',
+    '<math><mi>x</mi><mo>+</mo><mn>1</mn></math>',
+    '<math><msup><mi>x</mi><mn>2</mn></msup><mo>+</mo><mi>y</mi></math>',
+]
+
+
+def make_records(path_set: set[str]) -> list[tuple[str, int, str]]:
+    """path_setのpathのpath_dictionaryのレコードを(expr_path, expr_size, expr_ids)で作る関数．
+    全ての数式がpath_setのうち少なくとも1つのpathを含み，多くの数式はpathの数が多い．
+    """
+    rng = random.Random(0)
+    paths = sorted(path_set)
+    # {(path, expr_size): expr_ids}
+    records: dict[tuple[str, int], list[str]] = {}
+    for expr_id in range(1, EXPR_NUM + 1):
+        expr_size = min(int(rng.expovariate(1 / 20)) + 1, MAX_EXPR_SIZE)
+        shared = rng.randint(1, min(len(paths), expr_size))
+        for path in rng.sample(paths, shared):
+            records.setdefault((path, expr_size), []).append(str(expr_id))
+    return [(expr_path, expr_size, json.dumps(expr_ids)) for (expr_path, expr_size), expr_ids in records.items()]
+
+
+def make_rows(path_set: set[str]) -> list[tuple[int, str]]:
+    """path_setのpathのpath_dictionaryのレコードの(expr_size, expr_ids)を作る関数．"""
+    return [(expr_size, expr_ids) for _, expr_size, expr_ids in make_records(path_set)]
+
+
+def sort_all(rows: list[tuple[int, str]], query_size: int, limit: int | None = LIMIT) -> list[list]:
+    """全ての数式のJaccard係数を計算してsortする．"""
+    shared: dict[str, int] = {}
+    sizes: dict[str, int] = {}
+    for expr_size, expr_ids in rows:
+        for expr_id in json.loads(expr_ids):
+            shared[expr_id] = shared.get(expr_id, 0) + 1
+            sizes[expr_id] = expr_size
+    scores = [[expr_id, similarity.jaccard(n, query_size, sizes[expr_id])] for expr_id, n in shared.items()]
+    return sorted(scores, key=lambda x: (-x[1], int(x[0])))[:limit]
+
+
+def measure(func, *args) -> tuple[float, list]:
+    """REPEAT回実行したときの1回あたりの秒数と，結果を返す関数．"""
+    result = func(*args)
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        func(*args)
+    return (time.perf_counter() - start) / REPEAT, result
+
+
+def make_stored_scores(rows: list[tuple[int, str]], query_size: int) -> list[list]:
+    """search() stored functionの戻り値の代わりに，順番を決めない[['expr_id', 類似度], ...]を作る関数．"""
+    scores = sort_all(rows, query_size, limit=None)
+    random.Random(0).shuffle(scores)
+    return scores
+
+
+def sort_stored(scores: list[list]) -> list[list]:
+    """以前のCursor.search()のように，stored functionの結果を全てsortする．"""
+    return sorted(scores, key=lambda x: (-x[1], int(x[0])))[:LIMIT]
+
+
+def iter_ranked(scores: list[list]) -> list[list]:
+    return [[str(expr_id), score] for expr_id, score in islice(similarity.iter_ranked(scores), LIMIT)]
+
+
+def main():
+    print(f'{EXPR_NUM} exprs, top {LIMIT}, {REPEAT} times')
+    for mathml in QUERIES:
+        path_set = Parser.parse(Expression(mathml))
+        rows = make_rows(path_set)
+        print(f'{mathml}: {len(path_set)} paths, {len(rows)} records')
+
+        scores = make_stored_scores(rows, len(path_set))
+        sort_time, sorted_result = measure(sort_stored, scores)
+        rank_time, rank_result = measure(similarity.rank, scores, LIMIT)
+        ranked_time, ranked_result = measure(iter_ranked, scores)
+        assert sorted_result == rank_result == ranked_result, '検索結果が異なります．'
+        print(f'  stored function ({len(scores)} exprs)')
+        print(f'    sorted               : {sort_time * 1000:8.2f} ms/query')
+        print(f'    similarity.rank      : {rank_time * 1000:8.2f} ms/query ({sort_time / rank_time:.1f}x)')
+        print(f'    similarity.iter_ranked: {ranked_time * 1000:8.2f} ms/query ({sort_time / ranked_time:.1f}x)')
+
+        sort_time, sorted_result = measure(sort_all, rows, len(path_set))
+        top_k_time, top_k_result = measure(similarity.top_k, rows, len(path_set), LIMIT)
+        assert sorted_result == top_k_result, '検索結果が異なります．'
+        print('  Jaccard (PathIndex, SegmentSet)')
+        print(f'    score all + sorted   : {sort_time * 1000:8.2f} ms/query')
+        print(f'    similarity.top_k     : {top_k_time * 1000:8.2f} ms/query ({sort_time / top_k_time:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""segment fileのbenchmark．
+同じpath_dictionaryのレコードをPathIndexに読み込む場合とsegment fileを開く場合とで，
+準備にかかる時間，使うメモリ，1回の検索の時間を比較する．
+segmentのarrayはmmapを参照するので，開く時間はレコードの数によらず，
+複数のプロセスで開いてもOSのpage cacheの1つのコピーを共有する．
+testsディレクトリで実行する．
+    python -m benchmarks.bench_segment
+"""
+import json
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from benchmarks.bench_search import LIMIT, QUERIES, make_records, measure
+from twels.expr.expression import Expression
+from twels.expr.parser import Parser
+from twels.searcher import similarity
+from twels.searcher.path_index import PathIndex
+from twels.segment.segment import Segment, SegmentWriter
+
+
+def load_path_index(records: list[tuple[str, int, str]]) -> PathIndex:
+    path_index = PathIndex()
+    path_index.load_rows(records)
+    return path_index
+
+
+def traced(func, *args):
+    """funcの実行時間とPythonのheapに確保したメモリのbyte数を返す関数．
+    tracemallocを使うと遅くなるので，時間とメモリは別々に測る．
+    """
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    del result
+    tracemalloc.start()
+    result = func(*args)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, size, result
+
+
+def main():
+    print(f'top {LIMIT}')
+    with tempfile.TemporaryDirectory() as directory:
+        for mathml in QUERIES:
+            path_set = Parser.parse(Expression(mathml))
+            records = make_records(path_set)
+            rows = [(expr_size, expr_ids) for _, expr_size, expr_ids in records]
+
+            path = Path(directory) / 'bench.twseg'
+            writer = SegmentWriter()
+            for expr_path, expr_size, expr_ids in records:
+                writer.add_path(expr_path, expr_size, json.loads(expr_ids))
+            write_start = time.perf_counter()
+            writer.write(path)
+            write_time = time.perf_counter() - write_start
+
+            index_load_time, index_memory, path_index = traced(load_path_index, records)
+            segment_open_time, segment_memory, segment = traced(Segment, path)
+
+            json_time, json_result = measure(similarity.top_k, rows, len(path_set), LIMIT)
+            index_time, index_result = measure(path_index.search, path_set, LIMIT)
+            segment_time, segment_result = measure(
+                lambda: similarity.top_k(segment.rows(path_set), len(path_set), LIMIT))
+            assert json_result == index_result == segment_result, '検索結果が異なります．'
+
+            print(f'{mathml}: {len(path_set)} paths, {len(records)} records')
+            print(f'  write segment          : {write_time * 1000:8.2f} ms, {path.stat().st_size / 2**20:.2f} MiB')
+            print(f'  load PathIndex         : {index_load_time * 1000:8.2f} ms, {index_memory / 2**20:.2f} MiB heap')
+            print(f'  open segment (mmap)    : {segment_open_time * 1000:8.2f} ms, {segment_memory / 2**20:.2f} MiB heap')
+            print(f'  JSON records + top_k   : {json_time * 1000:8.2f} ms/query')
+            print(f'  PathIndex + top_k      : {index_time * 1000:8.2f} ms/query')
+            print(f'  segment + top_k        : {segment_time * 1000:8.2f} ms/query')
+            del segment_result
+            segment.close()
+
+
+if __name__ == '__main__':
+    main()
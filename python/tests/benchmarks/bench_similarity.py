@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""similarity.iter_scores()のbenchmark．
+以前のCursor.search()のように数式ごとにPythonで共通するpathの数を数えてheapで順番を決める場合と，
+CSR行列にしてNumPyで全ての数式の類似度をまとめて計算する場合とで，1回の検索の時間を比較する．
+検索結果の順番と類似度が完全に一致することも確認する．
+testsディレクトリで実行する．
+    python -m benchmarks.bench_similarity
+"""
+import heapq
+import json
+from array import array
+from collections import Counter
+from itertools import chain, islice
+
+from benchmarks.bench_search import LIMIT, QUERIES, make_rows, measure
+from twels.expr.expression import Expression
+from twels.expr.parser import Parser
+from twels.searcher import similarity
+
+
+def iter_scores_heap(rows: list[tuple[int, str]], query_size: int):
+    """以前のsimilarity.iter_scores()．expr_sizeごとにCounterで数えて，heapで順番を決める．"""
+    groups: dict[int, list] = {}
+    for expr_size, expr_ids in rows:
+        groups.setdefault(expr_size, []).append(expr_ids)
+    sizes = sorted(groups, key=lambda expr_size: (-similarity.upper_bound(query_size, expr_size), expr_size))
+
+    heap = []
+    for expr_size in sizes:
+        bound = similarity.upper_bound(query_size, expr_size)
+        while heap and -heap[0][0] > bound:
+            neg_score, expr_id = heapq.heappop(heap)
+            yield expr_id, -neg_score
+        counts = Counter(chain.from_iterable(
+            json.loads(expr_ids) if isinstance(expr_ids, str) else expr_ids for expr_ids in groups[expr_size]
+            ))
+        heap.extend((-similarity.jaccard(shared, query_size, expr_size), int(expr_id)) for expr_id, shared in counts.items())
+        heapq.heapify(heap)
+
+    while heap:
+        neg_score, expr_id = heapq.heappop(heap)
+        yield expr_id, -neg_score
+
+
+def take(iter_scores, rows: list, query_size: int, limit: int | None) -> list:
+    return list(islice(iter_scores(rows, query_size), limit))
+
+
+def main():
+    print(f'{LIMIT} and all exprs')
+    for mathml in QUERIES:
+        path_set = Parser.parse(Expression(mathml))
+        json_rows = make_rows(path_set)
+        array_rows = [(expr_size, array('I', map(int, json.loads(expr_ids)))) for expr_size, expr_ids in json_rows]
+        print(f'{mathml}: {len(path_set)} paths, {len(json_rows)} records')
+        for name, rows in (('JSON', json_rows), ('array', array_rows)):
+            for limit in (LIMIT, None):
+                heap_time, heap_result = measure(take, iter_scores_heap, rows, len(path_set), limit)
+                numpy_time, numpy_result = measure(take, similarity.iter_scores, rows, len(path_set), limit)
+                assert heap_result == numpy_result, '検索結果の順番または類似度が異なります．'
+                print(f'  {name:5} top {limit or "all":>3} : Counter + heap {heap_time * 1000:8.2f} ms, '
+                      f'NumPy CSR {numpy_time * 1000:8.2f} ms ({heap_time / numpy_time:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""検索結果の1件ごとのsnippetの整形のbenchmark．
+以前のようにpage tableのsnippetから全ての数式のExpressionを作り，snippet全体をハイライトしてから抜粋する場合と，
+Snippet(lazy=True)で数式のExpressionを作らず，抜粋する範囲だけをハイライトする場合とで，1件あたりの時間を比較する．
+長いページの場合として，test_dataのページのsnippetを繰り返してつなげたものも使う．
+testsディレクトリで実行する．
+    python -m benchmarks.bench_snippet
+"""
+import time
+from pathlib import Path
+
+from scrapy.http import HtmlResponse
+
+from twels.expr.expression import Expression
+from twels.snippet.formatter import Formatter
+from twels.snippet.snippet import Snippet
+from web_crawler.web_crawler.spiders import functions
+
+TEST_DATA_DIR = Path(__file__).resolve().parent.parent / 'test_data'
+# 長いページを作るためにsnippetを繰り返す回数．
+LONG_PAGE_REPEAT = 30
+REPEAT = 20
+
+
+def get_last_math_tag_index(snippet: str, start_index: int) -> int:
+    """以前のFormatter._get_last_math_tag_index()．先頭から順にmathタグを探す．"""
+    index = snippet.find('<math')
+    last_index = 0
+    while True:
+        if index == -1 or start_index - index < 0:
+            break
+        last_index = index
+        index = snippet.find('<math', index+1)
+    return last_index
+
+
+def format_eagerly(snippet: str, expr_start_pos: list[int], expr_len: int) -> str:
+    """以前の方法．全ての数式のExpressionを作り，snippet全体をハイライトしてから抜粋する．"""
+    text = Snippet(snippet, clean=False).text
+    start_pos = expr_start_pos[0]
+    return Formatter._excerpt(Formatter._highlight(text, start_pos, start_pos + expr_len), start_pos)
+
+
+def format_lazily(snippet: str, expr_start_pos: list[int], expr_len: int) -> str:
+    return Formatter.format(Snippet(snippet, clean=False, lazy=True), expr_start_pos, expr_len)
+
+
+def measure(func, *args) -> tuple[float, str]:
+    """REPEAT回実行したときの1回あたりの時間(秒)と，結果を返す関数．"""
+    result = func(*args)
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        func(*args)
+    return (time.perf_counter() - start) / REPEAT, result
+
+
+def load_pages() -> list[tuple[str, str]]:
+    """(名前, page tableに保存するsnippet)のリストを返す関数．"""
+    pages = []
+    for path in sorted(TEST_DATA_DIR.glob('*.html')):
+        response = HtmlResponse(url=f'file://{path}', body=path.read_bytes(), encoding='utf-8')
+        snippet, _ = functions.get_snippet_and_exprs(response)
+        pages.append((path.stem, str(snippet)))
+    pages.append((f'{pages[0][0]} x{LONG_PAGE_REPEAT}', pages[0][1] * LONG_PAGE_REPEAT))
+    return pages
+
+
+def main():
+    new_get_last_math_tag_index = Formatter._get_last_math_tag_index
+    for name, text in load_pages():
+        # [(数式の開始位置, 数式), ...]
+        exprs = []
+        pos = 0
+        for elem in Snippet(text, clean=False).snippet:
+            if isinstance(elem, Expression):
+                exprs.append((pos, elem))
+            pos += len(str(elem))
+        print(f'{name}: {len(text)} chars, {len(exprs)} exprs')
+        # 先頭，中央，最後の数式がhitした場合．
+        for label, (expr_start_pos, expr) in [('first', exprs[0]), ('middle', exprs[len(exprs) // 2]), ('last', exprs[-1])]:
+            args = (text, [expr_start_pos], len(expr.mathml))
+            Formatter._get_last_math_tag_index = staticmethod(get_last_math_tag_index)
+            try:
+                eager_time, eager_result = measure(format_eagerly, *args)
+            finally:
+                Formatter._get_last_math_tag_index = new_get_last_math_tag_index
+            lazy_time, lazy_result = measure(format_lazily, *args)
+            assert eager_result == lazy_result, '整形したsnippetが異なります．'
+            print(f'  {label:>6}: eager {eager_time * 1000:8.3f} ms/hit, lazy {lazy_time * 1000:8.3f} ms/hit '
+                  f'({eager_time / lazy_time:.0f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""自然言語の検索1回あたりのSolrへの問い合わせの時間のbenchmark．
+以前のように検索のたびにZooKeeperに接続してclientを作る場合と，
+get_solr_client()でprocessで共有するclientを使い回す場合とで比較する．
+SolrCloudとZooKeeperが動いている環境(Pythonコンテナ)のtestsディレクトリで実行する．
+    python -m benchmarks.bench_solr_client
+"""
+import statistics
+import time
+
+from twels.solr import client
+
+QUERIES = ['方程式', '関数', '微分', '積分', '行列', 'equation', 'function', 'matrix']
+REPEAT = 5
+
+
+def search(solr, query: str):
+    return solr.search(f'text:{query}', **{'hl': 'true', 'hl.fl': 'content', 'hl.fragsize': 300})
+
+
+def search_with_new_client(query: str):
+    """以前の方法．検索のたびに新しくZooKeeperとSolrに接続する．"""
+    solr = client.create_solr_client()
+    try:
+        return search(solr, query)
+    finally:
+        solr.get_session().close()
+        solr.zookeeper.zk.stop()
+        solr.zookeeper.zk.close()
+
+
+def search_with_shared_client(query: str):
+    return search(client.get_solr_client(), query)
+
+
+def measure(func) -> list[float]:
+    """全てのqueryをREPEAT回検索したときの1回ごとの時間(秒)のリストを返す関数．"""
+    times = []
+    for _ in range(REPEAT):
+        for query in QUERIES:
+            start = time.perf_counter()
+            func(query)
+            times.append(time.perf_counter() - start)
+    return times
+
+
+def main():
+    # 最初の接続の時間は含めない．
+    search_with_shared_client(QUERIES[0])
+    for name, func in [('new client', search_with_new_client), ('shared client', search_with_shared_client)]:
+        times = sorted(measure(func))
+        p95 = times[int(len(times) * 0.95) - 1]
+        print(f'{name:>13}: mean {statistics.mean(times) * 1000:8.2f} ms, '
+              f'median {statistics.median(times) * 1000:8.2f} ms, p95 {p95 * 1000:8.2f} ms')
+    client.close_solr_client()
+
+
+if __name__ == '__main__':
+    main()
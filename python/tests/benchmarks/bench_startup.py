@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""起動時間のbenchmark．
+新しいprocessで`import twels.searcher.searcher`にかかる時間を，
+LALR parserのcacheがない場合とある場合とで比較する．
+Earley parserは必要になったときに作成するので，その時間も別に計測する．
+testsディレクトリで実行する．
+    python -m benchmarks.bench_startup
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPEAT = 5
+
+IMPORT_CODE = """
+import time
+start = time.perf_counter()
+import twels.searcher.searcher
+end = time.perf_counter()
+from twels.expr.parser import Parser
+Parser._get_lark()
+print(end - start, time.perf_counter() - end)
+"""
+
+
+def measure(cache_dir: str, clear_cache: bool) -> tuple[float, float]:
+    """新しいprocessでimportしたときの(importの秒数, Earley parserの作成の秒数)を返す関数．"""
+    if clear_cache:
+        for name in os.listdir(cache_dir):
+            os.remove(os.path.join(cache_dir, name))
+    env = dict(os.environ, LARK_CACHE_DIR=cache_dir)
+    result = subprocess.run([sys.executable, '-W', 'ignore', '-c', IMPORT_CODE],
+                            env=env, capture_output=True, text=True, check=True)
+    import_time, earley_time = result.stdout.split()
+    return float(import_time), float(earley_time)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for clear_cache in (True, False):
+            results = [measure(cache_dir, clear_cache) for _ in range(REPEAT)]
+            import_time = statistics.median(t for t, _ in results)
+            earley_time = statistics.median(t for _, t in results)
+            mode = 'without cache' if clear_cache else 'with cache   '
+            print(f'{mode}: import twels.searcher.searcher {import_time * 1000:7.1f} ms, '
+                  f'first Earley parser {earley_time * 1000:7.1f} ms (median of {REPEAT})')
+
+
+if __name__ == '__main__':
+    main()
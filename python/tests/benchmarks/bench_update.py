@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""数式の登録と削除のbenchmark．
+path_dictionaryのようにpathごとのexpr_idsのJSONを読み込んで書き換える場合と，
+SegmentUpdaterで追加・削除した数式だけをdeltaとして書き込む場合とで，登録済みの数式が増えたときの1秒あたりの数式の数を比較する．
+MySQLとの通信の時間は含まないので，MySQLを使う場合の実際の時間はこれより長い．
+数式のpathはZipf分布で選ぶので，よく使われるpathのexpr_idsは数式が増えるほど長くなる．
+testsディレクトリで実行する．
+    python -m benchmarks.bench_update
+"""
+import json
+import random
+import tempfile
+import time
+
+from benchmarks.bench_search import LIMIT
+from twels.searcher import similarity
+from twels.segment.segment import SegmentWriter
+from twels.segment.segment_set import SegmentSet
+from twels.segment.updater import SegmentUpdater
+
+PATH_NUM = 5000
+ROUNDS = 10
+EXPRS_PER_ROUND = 10000
+# 1回のcommit(flush)で登録する数式の数．bulk_indexerの1つのchunkくらい．
+EXPRS_PER_COMMIT = 500
+# 1回のcommitで登録する数式の数に対する，削除する登録済みの数式の数の割合．
+DELETE_RATIO = 0.2
+
+
+def make_path_set(rng: random.Random, weights: list[float]) -> set[str]:
+    """よく使われるpathを含みやすい数式のpath setを作る関数．"""
+    expr_size = min(int(rng.expovariate(1 / 10)) + 1, 100)
+    return {f'path{i}' for i in rng.choices(range(PATH_NUM), weights=weights, k=expr_size)}
+
+
+def make_commits(total: int) -> list[tuple[list[tuple[int, set[str]]], list[tuple[int, set[str]]]]]:
+    """commitごとの(追加する数式, 削除する数式)のリストを作る関数．"""
+    rng = random.Random(0)
+    weights = [1 / (i + 1) for i in range(PATH_NUM)]
+    registered: list[tuple[int, set[str]]] = []
+    commits = []
+    for first in range(1, total + 1, EXPRS_PER_COMMIT):
+        added = [(expr_id, make_path_set(rng, weights)) for expr_id in range(first, first + EXPRS_PER_COMMIT)]
+        rng.shuffle(registered)
+        delete_num = min(int(EXPRS_PER_COMMIT * DELETE_RATIO), len(registered))
+        deleted, registered = registered[:delete_num], registered[delete_num:]
+        registered.extend(added)
+        commits.append((added, deleted))
+    return commits
+
+
+def update_json(table: dict[tuple[str, int], str], added: list, deleted: list):
+    """Cursor.append_expr_id_if_not_registered()とCursor.remove_expr_id_from_path_dictionary()と同じように，
+    pathごとにexpr_idsのJSONを読み込んで書き換える．
+    """
+    for expr_id, path_set in added:
+        expr_size = len(path_set)
+        for expr_path in path_set:
+            expr_ids = json.loads(table.get((expr_path, expr_size), '[]'))
+            if str(expr_id) not in expr_ids:
+                expr_ids.append(str(expr_id))
+            table[(expr_path, expr_size)] = json.dumps(expr_ids)
+    for expr_id, path_set in deleted:
+        expr_size = len(path_set)
+        for expr_path in path_set:
+            expr_ids = [e for e in json.loads(table[(expr_path, expr_size)]) if e != str(expr_id)]
+            if expr_ids:
+                table[(expr_path, expr_size)] = json.dumps(expr_ids)
+            else:
+                del table[(expr_path, expr_size)]
+
+
+def update_segment(updater: SegmentUpdater, added: list, deleted: list):
+    """Indexerと同じように，追加した数式のpathと削除した数式のtombstoneをdeltaとして書き込む．"""
+    writer = SegmentWriter()
+    for expr_id, path_set in added:
+        for expr_path in path_set:
+            writer.add_path(expr_path, len(path_set), [expr_id])
+        writer.add_expr(expr_id, len(path_set), 10, b'')
+    for expr_id, _ in deleted:
+        writer.add_tombstone(expr_id)
+    updater.flush(writer)
+
+
+def main():
+    commits = make_commits(ROUNDS * EXPRS_PER_ROUND)
+    commits_per_round = EXPRS_PER_ROUND // EXPRS_PER_COMMIT
+    print(f'{EXPRS_PER_COMMIT} added + {int(EXPRS_PER_COMMIT * DELETE_RATIO)} deleted exprs/commit')
+    print(f'{"registered":>10} | {"JSON rewrite":>14} | {"LSM segments":>14} | segments | search top {LIMIT}')
+
+    table: dict[tuple[str, int], str] = {}
+    with tempfile.TemporaryDirectory() as directory:
+        updater = SegmentUpdater(directory)
+        for i in range(ROUNDS):
+            round_commits = commits[i * commits_per_round:(i + 1) * commits_per_round]
+            expr_num = sum(len(added) + len(deleted) for added, deleted in round_commits)
+
+            start = time.perf_counter()
+            for added, deleted in round_commits:
+                update_json(table, added, deleted)
+            json_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for added, deleted in round_commits:
+                update_segment(updater, added, deleted)
+            segment_time = time.perf_counter() - start
+
+            # mergeが追いつくまでの時間は含めない．
+            updater.wait()
+            segment_set = SegmentSet(directory)
+            start = time.perf_counter()
+            segment_set.search({'path0', 'path1', 'path2'}, LIMIT)
+            search_time = time.perf_counter() - start
+            print(f'{(i + 1) * EXPRS_PER_ROUND:>10} | {expr_num / json_time:>8.0f} expr/s | {expr_num / segment_time:>8.0f} expr/s | '
+                  f'{len(segment_set.segments):>8} | {search_time * 1000:.2f} ms')
+
+        # 検索結果が同じことを確認する．
+        path_set = {'path0', 'path1', 'path2'}
+        json_rows = [(expr_size, expr_ids) for (expr_path, expr_size), expr_ids in table.items() if expr_path in path_set]
+        assert similarity.top_k(json_rows, len(path_set), LIMIT) == SegmentSet(directory).search(path_set, LIMIT), \
+            'JSONとsegmentで検索結果が異なります．'
+
+
+if __name__ == '__main__':
+    main()
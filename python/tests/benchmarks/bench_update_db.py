@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""Indexer.update_db()のbenchmark．
+1ページを登録するときのデータベースとの往復の回数と時間を，
+従来の方法とbatchの方法で比較する．
+テスト用データベースを使うので，testsディレクトリで実行する．
+    python -m benchmarks.bench_update_db
+"""
+import time
+from pathlib import Path
+
+from itemadapter import ItemAdapter
+from scrapy.http import HtmlResponse
+
+from tests.functions import reset_tables
+from twels.database.cursor import Cursor
+from twels.expr.parser import Parser
+from twels.indexer.indexer import Indexer
+from web_crawler.web_crawler.items import Page
+from web_crawler.web_crawler.spiders import functions
+
+TEST_DATA_DIR = Path(__file__).resolve().parent.parent / 'test_data'
+
+
+def load_page(path: Path) -> ItemAdapter:
+    """test_dataのHTMLファイルからcrawlerと同じ方法でPageを作成する関数．"""
+    response = HtmlResponse(url=f'file://{path}', body=path.read_bytes(), encoding='utf-8')
+    snippet, exprs = functions.get_snippet_and_exprs(response)
+    return ItemAdapter(Page(
+        uri=path.name,
+        title=functions.get_title(response),
+        snippet=snippet,
+        lang=functions.get_lang(response),
+        exprs=exprs
+    ))
+
+
+def measure(page_info: ItemAdapter, batch: bool) -> tuple[int, float]:
+    """1ページを登録したときの(queryの数, 秒数)を返す関数．"""
+    Cursor.reset_query_count()
+    start = time.perf_counter()
+    Indexer.update_db(page_info, test=True, batch=batch)
+    return Cursor.get_query_count(), time.perf_counter() - start
+
+
+def main():
+    for path in sorted(TEST_DATA_DIR.glob('*.html')):
+        page_info = load_page(path)
+        # parseにかかる時間はどちらの方法でも同じなので，先に計測しておく．
+        start = time.perf_counter()
+        for expr in page_info['exprs']:
+            Parser.parse(expr)
+        parse_time = time.perf_counter() - start
+
+        print(f'{path.name}: {len(page_info["exprs"])} exprs, parse {parse_time:.3f} s')
+        for batch in (False, True):
+            try:
+                reset_tables()
+                queries_new, time_new = measure(page_info, batch)
+                # 同じページをもう一度登録（数式の変更なし）
+                queries_same, time_same = measure(page_info, batch)
+            finally:
+                reset_tables()
+            mode = 'batch ' if batch else 'legacy'
+            print(f'  {mode}: new page {queries_new:6d} queries {time_new:8.3f} s, '
+                  f'unchanged page {queries_same:6d} queries {time_same:8.3f} s')
+
+
+if __name__ == '__main__':
+    main()
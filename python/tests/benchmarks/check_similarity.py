@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""search() stored functionとsimilarity.jaccard()の検索結果を比較するscript．
+PathIndexやSegmentSetを有効にする前に，実際のデータベースで同じ類似度と順位になることを確認する．
+inverted_indexから数式をランダムに選んで検索し，以下を比較する．
+    1. expr_idごとの類似度．
+    2. 類似度の高い順に並べたときの上位LIMIT個．類似度が同じ数式の順番は比べない．
+testsディレクトリで実行する．
+    python -m benchmarks.check_similarity --samples 100 [--test] [--segment-dir DIR]
+"""
+import argparse
+import math
+import random
+
+from benchmarks.bench_search import LIMIT
+from twels.database.cursor import Cursor
+from twels.expr.expression import Expression
+from twels.expr.parser import Parser
+from twels.searcher.path_index import PathIndex
+from twels.segment.segment_set import SegmentSet
+
+
+def sample_exprs(samples: int, test: bool) -> list[str]:
+    """inverted_indexから数式をランダムにsamples個選ぶ関数．"""
+    with Cursor.connect(test) as cnx, Cursor.cursor(cnx) as cursor:
+        cursor.execute('SELECT expr FROM inverted_index')
+        exprs = [expr for expr, in cursor.fetchall()]
+    return random.Random(0).sample(exprs, min(samples, len(exprs)))
+
+
+def diff(expected: list, actual: list) -> list[str]:
+    """2つの検索結果の違いを説明する文字列のリストを返す関数．違いがなければ空のリスト．"""
+    messages = []
+    expected_scores = {int(expr_id): score for expr_id, score in expected}
+    actual_scores = {int(expr_id): score for expr_id, score in actual}
+    if expected_scores.keys() != actual_scores.keys():
+        messages.append(f'expr_ids: {len(expected_scores.keys() - actual_scores.keys())} missing, '
+                        f'{len(actual_scores.keys() - expected_scores.keys())} extra')
+    different = [expr_id for expr_id in expected_scores.keys() & actual_scores.keys()
+                 if not math.isclose(expected_scores[expr_id], actual_scores[expr_id])]
+    if different:
+        expr_id = different[0]
+        messages.append(f'scores: {len(different)} different '
+                        f'(e.g. expr_id {expr_id}: {expected_scores[expr_id]} != {actual_scores[expr_id]})')
+    # 上位LIMIT個の類似度の並びと，類似度ごとの数式を比べる．
+    expected_top = sorted(expected, key=lambda x: x[1], reverse=True)[:LIMIT]
+    actual_top = sorted(actual, key=lambda x: x[1], reverse=True)[:LIMIT]
+    if not all(math.isclose(x[1], y[1]) for x, y in zip(expected_top, actual_top)) or len(expected_top) != len(actual_top):
+        messages.append(f'top {LIMIT}: different order')
+    return messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description='search() stored functionとsimilarity.jaccard()の検索結果を比較する．')
+    parser.add_argument('--samples', type=int, default=100, help='検索する数式の数．')
+    parser.add_argument('--test', action='store_true', help='テスト用データベースを使う．')
+    parser.add_argument('--segment-dir', help='SegmentSetのdirectory．指定しない場合はSegmentSetを比較しない．')
+    args = parser.parse_args()
+
+    path_index = PathIndex()
+    path_index.load(args.test)
+    engines = {'PathIndex': path_index}
+    if args.segment_dir:
+        engines['SegmentSet'] = SegmentSet(args.segment_dir)
+
+    mismatches = dict.fromkeys(engines, 0)
+    exprs = sample_exprs(args.samples, args.test)
+    for mathml in exprs:
+        path_set = Parser.parse(Expression(mathml))
+        with Cursor.connect(args.test) as cnx, Cursor.cursor(cnx) as cursor:
+            expected = Cursor.search(cursor, path_set)
+        for name, engine in engines.items():
+            messages = diff(expected, engine.search(path_set))
+            if messages:
+                mismatches[name] += 1
+                print(f'{name}: {mathml}')
+                for message in messages:
+                    print(f'  {message}')
+
+    for name, count in mismatches.items():
+        print(f'{name}: {len(exprs) - count}/{len(exprs)} exprs match the stored function.')
+
+
+if __name__ == '__main__':
+    main()
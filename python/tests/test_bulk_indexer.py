@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""module description
+"""
+
+from twels.expr.parser import Parser
+from twels.indexer.indexer import Indexer
+from web_crawler.web_crawler import bulk_indexer
+
+
+def test_parse_page_1():
+    """bulk_indexer.parse_page()のテスト．
+    crawlerと同じ情報とpath setが得られることを確認．
+    """
+    page, path_sets = bulk_indexer.parse_page('test_data/方程式 - Wikipedia.html')
+
+    assert page['uri'] == 'https://ja.wikipedia.org/wiki/%E6%96%B9%E7%A8%8B%E5%BC%8F'
+    assert page['title'] == '方程式 - Wikipedia'
+    assert page['lang'] == 'ja'
+    assert len(page['exprs']) > 0
+    for expr, path_set in path_sets.items():
+        assert expr in page['exprs']
+        assert path_set == Parser.parse(expr)
+
+
+def test_parse_page_2():
+    """bulk_indexer.parse_page()のテスト．
+    存在しないファイルの場合．
+    """
+    page, path_sets = bulk_indexer.parse_page('test_data/not_exist.html')
+    assert page is None
+    assert path_sets == {}
+
+
+def test_checkpoint_1(tmp_path):
+    """bulk_indexer.save_checkpoint()とbulk_indexer.load_checkpoint()のテスト．
+    """
+    checkpoint = tmp_path / 'indexed_paths.txt'
+    assert bulk_indexer.load_checkpoint(checkpoint) == set()
+
+    bulk_indexer.save_checkpoint(checkpoint, ['a.html', 'b.html'])
+    bulk_indexer.save_checkpoint(checkpoint, ['c.html'])
+    assert bulk_indexer.load_checkpoint(checkpoint) == {'a.html', 'b.html', 'c.html'}
+
+
+def test_build_1(tmp_path, monkeypatch):
+    """bulk_indexer.build()のテスト．
+    解析に失敗したファイルはcheckpointに記録せず，もう一度実行したときに登録し直すことを確認．
+    """
+    indexed_uris = []
+
+    def update_db_in_bulk(pages, test=False):
+        indexed_uris.extend(page_info['uri'] for page_info, _ in pages)
+        return True
+
+    monkeypatch.setattr(Indexer, 'update_db_in_bulk', staticmethod(update_db_in_bulk))
+    checkpoint = tmp_path / 'indexed_paths.txt'
+    parsed_path = 'test_data/方程式 - Wikipedia.html'
+    failed_path = str(tmp_path / 'later.html')
+    paths = [parsed_path, failed_path]
+
+    assert bulk_indexer.build(paths, checkpoint, workers=1, chunk_size=2)
+    assert indexed_uris == ['https://ja.wikipedia.org/wiki/%E6%96%B9%E7%A8%8B%E5%BC%8F']
+    indexed = bulk_indexer.load_checkpoint(checkpoint)
+    assert indexed == {parsed_path}
+
+    # 解析に失敗したファイルを直してから，続きを登録する．
+    with open(parsed_path, 'rb') as f:
+        (tmp_path / 'later.html').write_bytes(f.read())
+    remaining = [path for path in paths if path not in indexed]
+    assert remaining == [failed_path]
+    assert bulk_indexer.build(remaining, checkpoint, workers=1, chunk_size=2)
+    assert len(indexed_uris) == 2
+    assert bulk_indexer.load_checkpoint(checkpoint) == {parsed_path, failed_path}
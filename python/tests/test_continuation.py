@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""module description
+"""
+from contextlib import nullcontext
+
+import pytest
+
+from twels.database.cursor import Cursor
+from twels.indexer.info import Info
+from twels.searcher import continuation, similarity
+from twels.searcher.continuation import Continuation
+from twels.searcher.result_cache import ResultCache
+from twels.searcher.searcher import Searcher
+
+
+def test_encode_1():
+    """encode()した文字列をdecode()すると元に戻り，URLに使えない文字を含まないことを確認。"""
+    position = Continuation(continuation.query_hash({'a', 'b'}, ['ja']), 20, 1 / 3, 12, 345)
+    token = continuation.encode(position)
+    assert continuation.decode(token) == position
+    assert set(token) <= set('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_')
+
+
+@pytest.mark.parametrize('token', ['', 'abc', '!!!', continuation.encode(('q', 1, 0.5))])
+def test_decode_1(token):
+    """不正なtokenの場合はNoneを返すことを確認。"""
+    assert continuation.decode(token) is None
+
+
+class _Segments:
+    """SegmentSet.infos()の代わり。"""
+    def __init__(self, infos: dict[int, Info]):
+        self._infos = infos
+
+    def infos(self, expr_ids: list[int]) -> dict[int, tuple[Info, int]]:
+        return {expr_id: (self._infos[expr_id], 10) for expr_id in expr_ids if expr_id in self._infos}
+
+
+def _make_index() -> tuple[list[tuple[int, list[int]]], dict[int, Info]]:
+    """1つのページが複数の数式を含み，1つの数式が複数のページに含まれるindexを作る関数。"""
+    rows = []
+    infos = {}
+    for expr_id in range(1, 41):
+        rows.append((expr_id % 5 + 1, [expr_id]))
+        info = Info({'uri_id': [], 'lang': [], 'expr_start_pos': []})
+        for uri_id in (expr_id % 17, expr_id % 11 + 100, expr_id // 3 + 200):
+            info.add_page(uri_id, 'en' if uri_id % 7 == 0 else 'ja', [0])
+        infos[expr_id] = info
+    return rows, infos
+
+
+def test_resume_1(monkeypatch):
+    """tokenで続きを検索した結果が，startで検索した結果と同じで，同じページを2回表示しないことを確認。"""
+    monkeypatch.setattr(Cursor, 'connect', lambda test=False: nullcontext())
+    monkeypatch.setattr(Cursor, 'cursor', lambda cnx: nullcontext())
+    # uri_idが3の倍数のページは削除されている。
+    monkeypatch.setattr(Cursor, 'select_uri_id_from_page_where_uri_id_in',
+                        lambda cursor, uri_ids: {uri_id for uri_id in uri_ids if uri_id % 3})
+    monkeypatch.setattr(Cursor, 'select_uri_title_snippet_from_page_where_uri_id_in',
+                        lambda cursor, uri_ids: {uri_id: (f'uri_{uri_id}', 'title', 'snippet') for uri_id in uri_ids})
+    monkeypatch.setattr(Searcher, 'continuation_cache', ResultCache(maxsize=100))
+
+    rows, infos = _make_index()
+    path_set = {'a', 'b', 'c'}
+    lr_list = ['ja']
+    segments = _Segments(infos)
+
+    def search(start: int, resume=None):
+        after = (resume[0].score, resume[0].expr_id) if resume is not None else None
+        scores = similarity.iter_scores(rows, len(path_set), after)
+        return Searcher._get_search_result(scores, start, lr_list, segments=segments, seen=resume[1] if resume else None)
+
+    shown = []
+    resume = None
+    start = 0
+    while True:
+        expected, expected_has_next, _ = search(start)
+        actual, has_next, last = search(start, resume)
+        assert [page['uri'] for page in actual] == [page['uri'] for page in expected]
+        assert has_next == expected_has_next
+        shown.extend(page['uri'] for page in actual)
+        if not has_next:
+            break
+        (score, expr_id, uri_id), seen = last
+        position = Continuation(continuation.query_hash(path_set, lr_list), start + Searcher.search_num, score, expr_id, uri_id)
+        token = continuation.encode(position)
+        Searcher.continuation_cache.put(continuation.state_key(token), {'seen': sorted(seen)})
+        resume = Searcher._resume(token, path_set, lr_list)
+        start = resume[0].page_count
+    assert start > Searcher.search_num
+    assert len(shown) == len(set(shown))
+
+
+def test_resume_2(monkeypatch):
+    """違う検索のtokenや，確認したページが保存されていないtokenは使わないことを確認。"""
+    monkeypatch.setattr(Searcher, 'continuation_cache', ResultCache(maxsize=100))
+    token = continuation.encode(Continuation(continuation.query_hash({'a'}, ['ja']), 10, 0.5, 1, 2))
+    assert Searcher._resume(token, {'a'}, ['ja']) is None
+    Searcher.continuation_cache.put(continuation.state_key(token), {'seen': [2]})
+    assert Searcher._resume(token, {'a'}, ['ja']) == (continuation.decode(token), {2})
+    assert Searcher._resume(token, {'b'}, ['ja']) is None
+    assert Searcher._resume(token, {'a'}, ['en']) is None
+    assert Searcher._resume(None, {'a'}, ['ja']) is None
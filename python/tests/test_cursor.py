@@ -460,6 +460,13 @@ def test_remove_info_from_inverted_index_1(cursor):
     assert str(actual_info) == str(expected_info)
 
 
+def test_remove_info_from_inverted_index_2(cursor):
+    """inverted_indexに数式のレコードがない場合は何もせずにNoneを返すことを確認するテスト．
+    """
+    expr = Expression('<math>a</math>')
+    assert Cursor.remove_info_from_inverted_index(cursor, expr, 1) is None
+
+
 def test_search_1(cursor):
     """Cursor.search()のテスト。"""
     path_set = {'path1', 'path2', 'path3', 'path4', 'path5'}
@@ -513,6 +520,32 @@ def test_search_1(cursor):
         assert 0 <= item[1] <= 1
 
 
+def test_search_2(cursor):
+    """Cursor.search()のlimit, offsetのテスト。
+    search() stored functionの類似度の高い順に並べた結果のoffset番目からlimit個を返す。
+    """
+    path_set = {'path1', 'path2', 'path3'}
+    info = Info({"uri_id": ["1"], "lang": ["ja"], "expr_start_pos": [[0]]})
+    expr_ids = []
+    for i, expr_size in enumerate([3, 3, 3, 1, 30]):
+        cursor.execute('INSERT INTO inverted_index (expr, expr_len, expr_size, info) VALUES (%s, %s, %s, %s)',
+                       (f'expr{i}', 14, expr_size, info.dumps()))
+        expr_ids.append(str(cursor.lastrowid))
+    query = 'INSERT INTO path_dictionary (expr_path, expr_size, expr_ids) VALUES (%s, %s, %s)'
+    cursor.execute(query, ('path1', 3, json.dumps(expr_ids[:3])))
+    cursor.execute(query, ('path2', 3, json.dumps(expr_ids[:2])))
+    cursor.execute(query, ('path3', 3, json.dumps(expr_ids[:1])))
+    cursor.execute(query, ('path1', 1, json.dumps(expr_ids[3:4])))
+    cursor.execute(query, ('path1', 30, json.dumps(expr_ids[4:])))
+
+    expected = sorted(Cursor.select_search(cursor, path_set), key=lambda x: (-x[1], int(x[0])))
+    assert len(expected) == 5
+    assert Cursor.search(cursor, path_set) == expected
+    assert Cursor.search(cursor, path_set, limit=2) == expected[:2]
+    assert Cursor.search(cursor, path_set, limit=2, offset=2) == expected[2:4]
+    assert Cursor.search(cursor, path_set, offset=3) == expected[3:]
+
+
 def test_select_all_from_index_where_expr_id_1(cursor):
     """Cursor.select_all_from_index_where_expr_id_1()のテスト．
     """
@@ -634,7 +667,7 @@ def test_select_info_from_inverted_index_where_expr_id_1(cursor):
 
     expr_id = Cursor.select_expr_id_from_inverted_index_where_expr_1(cursor, expr)
     result_info = Cursor.select_info_from_inverted_index_where_expr_id_1(cursor, expr_id)
-    assert str(Info(result_info)) == str(info)
+    assert str(result_info) == str(info)
 
 
 def test_select_uri_id_and_exprs_from_page_where_uri_1(cursor):
@@ -787,8 +820,8 @@ def test_update_index_2(cursor):
     assert expr_id_1 == expr_id_2
     assert was_registered_2 is True
 
-    info_dict = Cursor.select_info_from_inverted_index_where_expr_id_1(cursor, expr_id_2)
-    assert str(info2) == str(Info(info_dict))
+    actual_info = Cursor.select_info_from_inverted_index_where_expr_id_1(cursor, expr_id_2)
+    assert str(info2) == str(actual_info)
 
 
 def test_update_index_3(cursor):
@@ -833,8 +866,8 @@ def test_update_index_3(cursor):
             [77]
         ]
     })
-    info_dict = Cursor.select_info_from_inverted_index_where_expr_id_1(cursor, expr_id_2)
-    assert str(expected_info) == str(Info(info_dict))
+    actual_info = Cursor.select_info_from_inverted_index_where_expr_id_1(cursor, expr_id_2)
+    assert str(expected_info) == str(actual_info)
 
 
 def test_update_inverted_index_set_info_1_where_expr_2(cursor):
@@ -1,10 +1,12 @@
 # -*- coding: utf-8 -*-
 """module description
 """
+from pathlib import Path
+
 import latex2mathml.converter
 import pytest
 
-from twels.expr.expression import Expression
+from twels.expr.expression import Expression, ExpressionTable
 
 
 def test_expression_1():
@@ -132,3 +134,82 @@ def test_expression_is_hashable_1():
     actual = set(exprs)
     expected = {expr1, expr2}
     assert actual == expected
+
+
+def _get_raw_mathmls() -> list[str]:
+    """test_dataのHTMLファイルに含まれる，Expressionに渡す前のMathMLのリストを返す関数．"""
+    from scrapy.http import HtmlResponse
+    test_data_dir = Path(__file__).resolve().parent / 'test_data'
+    mathmls = []
+    for path in sorted(test_data_dir.glob('*.html')):
+        response = HtmlResponse(url=f'file://{path}', body=path.read_bytes(), encoding='utf-8')
+        mathmls.extend(response.xpath('//math').getall())
+    return mathmls
+
+
+def test_clean_1():
+    """test_dataの数式で，BeautifulSoupを使った場合と同じ結果になることを確認．"""
+    mathmls = _get_raw_mathmls()
+    assert mathmls
+    for mathml in mathmls:
+        assert Expression._clean(mathml) == Expression._clean_with_bs4(mathml)
+
+
+def test_clean_2():
+    """latex2mathmlで作成した数式で，BeautifulSoupを使った場合と同じ結果になることを確認．"""
+    latex_list = [
+        'a+b', '\\frac{1}{2}', 'x^{2}+y^{2}=z^{2}', '\\sum_{i=1}^{n} i', '\\int_{0}^{1} x dx',
+        '\\begin{pmatrix}a & b\\\\c & d\\end{pmatrix}', 'a \\equiv b \\pmod p', '\\sqrt[3]{x} < y',
+        '\\text{if } x > 0', 'f(x) = \\left| x \\right|',
+    ]
+    for latex in latex_list:
+        mathml = latex2mathml.converter.convert(latex)
+        assert Expression._clean(mathml) == Expression._clean_with_bs4(mathml), latex
+
+
+@pytest.mark.parametrize('mathml', [
+    # コメント，mspace，&#x2061;
+    '<math><mi>f</mi><!-- comment --><mspace width="1em"/><mo>&#x2061;</mo><mo>(</mo><mi>x</mi><mo>)</mo></math>',
+    # semantics, mstyle, annotation, annotation-xml
+    '<math><semantics><mstyle displaystyle="true"><mi>a</mi></mstyle>'
+    '<annotation encoding="application/x-tex">a</annotation>'
+    '<annotation-xml encoding="MathML-Content"><ci>a</ci></annotation-xml></semantics></math>',
+    # annotationの中のannotation
+    '<math><mi>a</mi><annotation><annotation>b</annotation><mi>c</mi></annotation><mi>d</mi></math>',
+    # 属性，空白，改行，タブ
+    '<math xmlns="http://www.w3.org/1998/Math/MathML" display="block">\n\t<mrow>\n\t\t<mi mathvariant="bold"> a b </mi>\n\t</mrow>\n</math>',
+    # 改行を含む属性
+    '<math alttext="a\nb"><mi>a</mi></math>',
+    # '>'や'&'を含む属性と文字列
+    '<math alttext="a > b &amp; c"><mi>a</mi><mo>&gt;</mo><mo>&amp;</mo><mo>&lt;</mo></math>',
+    # 実体参照
+    '<math><mo>&#x0002B;</mo><mo>&minus;</mo><mi>&alpha;</mi><mo>&InvisibleTimes;</mo><mtext>&nbsp;</mtext></math>',
+    # 大文字のタグ，名前空間付きのタグ
+    '<math><MI>a</MI><m:mi>b</m:mi></math>',
+    # HTMLのタグ
+    '<math><mtext>a<br>b</mtext><mtext><script>1 < 2</script></mtext><mtext><b>c</b></mtext></math>',
+    # processing instruction, CDATA
+    '<math><?xml version="1.0"?><mi><![CDATA[a<b]]></mi></math>',
+    # 複数のmath
+    '<math><mi>a</mi></math> <math><mi>b</mi></math>',
+])
+def test_clean_3(mathml):
+    """BeautifulSoupを使った場合と同じ結果になることを確認．"""
+    assert Expression._clean(mathml) == Expression._clean_with_bs4(mathml)
+
+
+def test_expression_table_1():
+    """同じMathMLと，_clean()した後に同じになるMathMLで同じオブジェクトを返すことを確認するテスト。
+    """
+    expr_table = ExpressionTable()
+    expr1 = expr_table.get('<math display="inline"><mi>a</mi></math>')
+    expr2 = expr_table.get('<math display="inline"><mi>a</mi></math>')
+    expr3 = expr_table.get('<math>\n<mi>a</mi>\n</math>')
+    expr4 = expr_table.get('<math><mi>b</mi></math>')
+    assert expr1 is expr2
+    assert expr1 is expr3
+    assert expr1 == Expression('<math><mi>a</mi></math>')
+    assert expr4 == Expression('<math><mi>b</mi></math>')
+    assert len(expr_table) == 2
+    assert expr_table.hits == 1
+    assert expr_table.misses == 3
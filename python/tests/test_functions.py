@@ -50,6 +50,20 @@ def test_get_snippet_1(response):
     assert str(actual_snippet) is not None
 
 
+def test_get_snippet_and_exprs_1(response):
+    """get_snippet()とget_exprs()をそれぞれ呼んだ場合と同じ結果になり，
+    snippetとexprsで同じExpressionのオブジェクトを使っていることを確認するテスト。
+    """
+    snippet, exprs = functions.get_snippet_and_exprs(response)
+    assert snippet.text == functions.get_snippet(response).text
+    assert set(exprs) == set(functions.get_exprs(response))
+
+    snippet_exprs = [elem for elem in snippet.snippet if not isinstance(elem, str)]
+    assert snippet_exprs
+    for expr in snippet_exprs:
+        assert any(expr is page_expr for page_expr in exprs)
+
+
 # I don't use this function now, but I maybe use this in the future.
 # def test_render_katex_1():
 #     """KaTeXで書かれた数式がMathMLに変換されているか確認するテスト。
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""module description
+"""
+import pytest
+
+from twels.searcher import hybrid
+from twels.searcher.searcher import Searcher
+
+
+@pytest.mark.parametrize('terms, expected', [
+    (['Fourier transform \\int f(x)e^{-ikx}dx'], ('Fourier transform', ['\\int f(x)e^{-ikx}dx'])),
+    (['Fourier transform', '\\int f(x)e^{-ikx}dx'], ('Fourier transform', ['\\int f(x)e^{-ikx}dx'])),
+    (['関数 x^2 の 微分'], ('関数 の 微分', ['x^2'])),
+    (['a+b', 'c-d'], ('', ['a+b', 'c-d'])),
+    (['x = 1'], ('', ['x = 1'])),
+    (['\\sin x + \\cos x'], ('', ['\\sin x + \\cos x'])),
+    (['sin x + 1'], ('', ['sin x + 1'])),
+    (['Kubernetes'], ('Kubernetes', [])),
+    (['K8s'], ('', ['K8s'])),
+    (['y = ax + b where a > 0'], ('where', ['y = ax + b', 'a > 0'])),
+    (['α + β'], ('', ['α + β'])),
+    (['π r^2'], ('', ['π r^2'])),
+    (['2 π r'], ('', ['2 π r'])),
+    (['E = ℏ ω + 1'], ('', ['E = ℏ ω + 1'])),
+    (['α 線 の エネルギー E = 1'], ('線 の エネルギー', ['α', 'E = 1'])),
+])
+def test_split_query_1(terms, expected):
+    """自然言語の単語と数式を分け，続く数式の語を1つの数式にまとめることを確認するテスト。"""
+    assert hybrid.split_query(terms, Searcher._is_expr) == expected
+
+
+def test_fuse_1():
+    """両方の検索結果に含まれるページが上位になり，同じuriのページは1つにまとめることを確認するテスト。"""
+    formula = [{'uri': 'a', 'snippet': 'formula'}, {'uri': 'b', 'snippet': 'formula'}, {'uri': 'c', 'snippet': 'formula'}]
+    text = [{'uri': 'c', 'snippet': 'text'}, {'uri': 'd', 'snippet': 'text'}]
+    actual = hybrid.fuse([formula, text])
+    # bとdは同じ順位なので，先に現れたbが先になる。
+    assert [page['uri'] for page in actual] == ['c', 'a', 'b', 'd']
+    # 最も順位が高い検索結果のページを使う。
+    assert actual[0]['snippet'] == 'text'
+    assert hybrid.fuse([]) == []
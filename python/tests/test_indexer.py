@@ -151,7 +151,7 @@ def test_update_index_and_path_table_1():
         expr_id = inverted_index_result[0]
         actual_expr = inverted_index_result[1]
         actual_expr_len = inverted_index_result[2]
-        actual_info = Info(json.loads(inverted_index_result[4]))
+        actual_info = Info.loads(inverted_index_result[4])
         actual_paths = set([path_dict_result[i][0] for i in range(len(path_dict_result))])
 
         expr_start_pos_list = [
@@ -321,7 +321,7 @@ def test_update_index_and_path_table_3():
         expr_id = inverted_index_result[0]
         actual_expr = inverted_index_result[1]
         actual_expr_len = inverted_index_result[2]
-        actual_info = Info(json.loads(inverted_index_result[4]))
+        actual_info = Info.loads(inverted_index_result[4])
         actual_paths = set([path_dict_result[i][0] for i in range(len(path_dict_result))])
 
         expr_start_pos_list = [
@@ -390,7 +390,7 @@ def test_update_db_1():
 
                 # infoの取得
                 cursor.execute('SELECT info FROM inverted_index')  # どうせ1つしかないからWHEREは使わない．
-                actual_info = Info(json.loads(cursor.fetchone()[0]))
+                actual_info = Info.loads(cursor.fetchone()[0])
 
                 cursor.execute('SELECT * from path_dictionary')
                 actual_path_dict = cursor.fetchall()
@@ -466,6 +466,129 @@ def test_update_db_2():
         reset_tables()
 
 
+def test_update_db_batch_1():
+    """Indexer.update_db(batch=True)のテスト．
+    inverted_index tableについて，あるexpr_idで複数のuri_idが登録されるか確認するテスト．
+    """
+    try:
+        uri_1 = 'uri_1'
+        title = 'title'
+        body = """<math xmlns="http://www.w3.org/1998/Math/MathML" display="inline">
+                        <mrow>
+                            <mn>1</mn>
+                            <mo>+</mo>
+                            <mn>2</mn>
+                        </mrow>
+                    </math>は数式です。"""
+        snippet1 = Snippet(body)
+        lang = 'ja'
+        expr = Expression(body[:body.index('は')])
+        exprs = [expr]
+
+        page_item_1 = Page(uri=uri_1, title=title, snippet=snippet1, lang=lang, exprs=exprs)
+        assert Indexer.update_db(ItemAdapter(page_item_1), test=True, batch=True)
+
+        uri_2 = 'uri_2'
+        snippet2 = Snippet(f'文章。{body}')
+        page_item_2 = Page(uri=uri_2, title=title, snippet=snippet2, lang=lang, exprs=exprs)
+        assert Indexer.update_db(ItemAdapter(page_item_2), test=True, batch=True)
+
+        with Cursor.connect(test=True) as cnx:
+            with Cursor.cursor(cnx) as cursor:
+                cursor.execute('SELECT uri_id FROM page WHERE uri = %s', (uri_1,))
+                uri_id_1 = str(cursor.fetchone()[0])
+                cursor.execute('SELECT uri_id FROM page WHERE uri = %s', (uri_2,))
+                uri_id_2 = str(cursor.fetchone()[0])
+
+                cursor.execute('SELECT expr_id, expr_size, info FROM inverted_index')
+                expr_id, expr_size, info_str = cursor.fetchone()
+                actual_info = Info.loads(info_str)
+
+                cursor.execute('SELECT expr_path, expr_size, expr_ids FROM path_dictionary')
+                actual_path_dict = cursor.fetchall()
+
+        expected_info = Info({
+            'uri_id': [uri_id_1, uri_id_2],
+            'lang': ['ja', 'ja'],
+            'expr_start_pos': [[0], [3]]
+        })
+        expected_paths = Parser.parse(expr)
+        assert str(actual_info) == str(expected_info)
+        assert expr_size == len(expected_paths)
+        assert set(row[0] for row in actual_path_dict) == expected_paths
+        for _, size, expr_ids in actual_path_dict:
+            assert size == expr_size
+            assert json.loads(expr_ids) == [str(expr_id)]
+    finally:
+        reset_tables()
+
+
+def test_update_db_batch_2():
+    """Indexer.update_db(batch=True)のテスト．
+    2回目の登録で数式が変わった場合。
+    古い数式がinverted_indexとpath_dictionaryから削除されていることを確認。
+    """
+    try:
+        uri = 'https://example.com'
+        title = 'title'
+        lang = 'ja'
+        old_mathml = '<math><mn>1</mn><mo>+</mo><mn>2</mn></math>'
+        new_mathml = '<math><mn>8</mn><mo>-</mo><mn>5</mn></math>'
+        old_expr = Expression(old_mathml)
+        new_expr = Expression(new_mathml)
+
+        page_item_1 = Page(uri=uri, title=title, snippet=Snippet(f'{old_mathml}は数式です。'), lang=lang, exprs=[old_expr])
+        assert Indexer.update_db(ItemAdapter(page_item_1), test=True, batch=True)
+
+        page_item_2 = Page(uri=uri, title=title, snippet=Snippet(f'{new_mathml}は数式です。'), lang=lang, exprs=[new_expr])
+        assert Indexer.update_db(ItemAdapter(page_item_2), test=True, batch=True)
+
+        with Cursor.connect(test=True) as cnx:
+            with Cursor.cursor(cnx) as cursor:
+                cursor.execute('SELECT expr FROM inverted_index')
+                actual_exprs = cursor.fetchall()
+                cursor.execute('SELECT expr_path FROM path_dictionary')
+                actual_paths = set(row[0] for row in cursor.fetchall())
+                cursor.execute('SELECT COUNT(*) FROM page')
+                page_num = cursor.fetchone()[0]
+
+        assert actual_exprs == [(new_expr.mathml,)]
+        assert actual_paths == Parser.parse(new_expr)
+        assert page_num == 1
+    finally:
+        reset_tables()
+
+
+def test_update_db_batch_3():
+    """Indexer.update_db(batch=True)のテスト．
+    1回目の登録では数式が含まれていたが、2回目の登録では数式が含まれていない場合。
+    そのページと数式がデータベースから削除されていることを確認。
+    """
+    try:
+        uri = 'https://example.com'
+        title = 'title'
+        lang = 'ja'
+        mathml = '<math><mn>1</mn><mo>+</mo><mn>2</mn></math>'
+
+        page_item_1 = Page(uri=uri, title=title, snippet=Snippet(f'{mathml}は数式です。'), lang=lang, exprs=[Expression(mathml)])
+        assert Indexer.update_db(ItemAdapter(page_item_1), test=True, batch=True)
+
+        page_item_2 = Page(uri=uri, title=title, snippet=Snippet('文章。'), lang=lang, exprs=[])
+        assert Indexer.update_db(ItemAdapter(page_item_2), test=True, batch=True)
+
+        with Cursor.connect(test=True) as cnx:
+            with Cursor.cursor(cnx) as cursor:
+                cursor.execute('SELECT COUNT(*) FROM page')
+                page_num = cursor.fetchone()[0]
+                cursor.execute('SELECT COUNT(*) FROM inverted_index')
+                expr_num = cursor.fetchone()[0]
+                cursor.execute('SELECT COUNT(*) FROM path_dictionary')
+                path_num = cursor.fetchone()[0]
+        assert (page_num, expr_num, path_num) == (0, 0, 0)
+    finally:
+        reset_tables()
+
+
 def test_get_insert_and_delete_set_1():
     """Indexer._get_insert_and_delete_set()のテスト．
     """
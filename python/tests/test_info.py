@@ -65,3 +65,83 @@ def test_dumps_1():
     actual = info.dumps()
     expected = json.dumps(data)
     assert actual == expected
+
+
+def test_add_page_1():
+    """Info.add_page()のテスト。
+    """
+    info = Info({"uri_id": ["1"], "lang": ["ja"], "expr_start_pos": [[40]]})
+    info.add_page(2, 'en', [200, 310])
+    assert info.uri_id_list == ["1", "2"]
+    assert info.lang_list == ["ja", "en"]
+    assert info.expr_start_pos_list == [[40], [200, 310]]
+
+
+def test_add_page_2():
+    """Info.add_page()のテスト。
+    すでに登録されているページの場合は置き換えることを確認。
+    """
+    info = Info({"uri_id": ["1", "2"], "lang": ["ja", "ja"], "expr_start_pos": [[40], [50]]})
+    info.add_page(1, 'en', [10])
+    assert info.uri_id_list == ["1", "2"]
+    assert info.lang_list == ["en", "ja"]
+    assert info.expr_start_pos_list == [[10], [50]]
+
+
+def test_remove_page_1():
+    """Info.remove_page()のテスト。
+    """
+    info = Info({"uri_id": ["1", "2"], "lang": ["ja", "en"], "expr_start_pos": [[40], [50]]})
+    info.remove_page(1)
+    assert info.uri_id_list == ["2"]
+    assert info.lang_list == ["en"]
+    assert info.expr_start_pos_list == [[50]]
+    info.remove_page(3)
+    assert info.size() == 1
+    info.remove_page("2")
+    assert info.is_empty()
+
+
+def test_info_3():
+    """ページはuri_idの小さい順に並べることを確認。
+    """
+    info = Info({"uri_id": ["10", "2"], "lang": ["ja", "en"], "expr_start_pos": [[40], [50, 60]]})
+    assert info.uri_id_list == ["2", "10"]
+    assert info.lang_list == ["en", "ja"]
+    assert info.expr_start_pos_list == [[50, 60], [40]]
+    assert list(info.pages()) == [(2, "en", [50, 60]), (10, "ja", [40])]
+
+
+def test_to_bytes_1():
+    """Info.to_bytes()とInfo.loads()で元に戻ることを確認。
+    JSONで保存されている古いinfoも読み込めることを確認。
+    """
+    data = {
+        "uri_id": ["1", "2", "300"],
+        "lang": ["ja", "en", None],
+        "expr_start_pos": [
+            [40, 74],
+            [],
+            [200, 310, 440]
+        ]
+    }
+    info = Info(data)
+    assert Info.loads(info.to_bytes()) == info
+    assert Info.loads(json.dumps(data)) == info
+    assert Info.loads(json.dumps(data).encode()) == info
+    assert Info.loads(info.to_bytes()).dumps() == json.dumps(data)
+    assert len(info.to_bytes()) < len(json.dumps(data))
+
+
+def test_add_page_3():
+    """Info.add_page()のテスト。
+    間に追加した場合と，数式の開始位置の数が変わる場合。
+    """
+    info = Info({"uri_id": ["1", "5"], "lang": ["ja", "ja"], "expr_start_pos": [[1, 2], [5]]})
+    info.add_page(3, 'en', [3, 4, 5])
+    info.add_page(1, 'ja', [10])
+    assert info.uri_id_list == ["1", "3", "5"]
+    assert info.lang_list == ["ja", "en", "ja"]
+    assert info.expr_start_pos_list == [[10], [3, 4, 5], [5]]
+    info.remove_page(3)
+    assert info.expr_start_pos_list == [[10], [5]]
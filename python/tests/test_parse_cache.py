@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""module description
+"""
+from twels.expr.parse_cache import ParseCache, get_parser_version
+
+
+def test_get_1():
+    """保存したpath setを返し，hitとmissを数えることを確認．"""
+    cache = ParseCache(maxsize=10)
+    assert cache.get('<math><mi>a</mi></math>') is None
+    cache.put('<math><mi>a</mi></math>', {'a'})
+    assert cache.get('<math><mi>a</mi></math>') == {'a'}
+    stats = cache.stats()
+    assert stats['memory_hits'] == 1
+    assert stats['misses'] == 1
+    assert stats['hit_ratio'] == 0.5
+
+
+def test_get_2():
+    """返したpath setを変更してもcacheが変わらないことを確認．"""
+    cache = ParseCache(maxsize=10)
+    cache.put('<math><mi>a</mi></math>', {'a'})
+    cache.get('<math><mi>a</mi></math>').add('b')
+    assert cache.get('<math><mi>a</mi></math>') == {'a'}
+
+
+def test_get_3():
+    """maxsizeを超えたら最も古く使われた数式から削除することを確認．"""
+    cache = ParseCache(maxsize=2)
+    cache.put('1', {'1'})
+    cache.put('2', {'2'})
+    cache.get('1')
+    cache.put('3', {'3'})
+    assert cache.get('2') is None
+    assert cache.get('1') == {'1'}
+    assert cache.get('3') == {'3'}
+
+
+def test_get_4(tmp_path):
+    """ファイルのcacheが別のinstanceからも読めることを確認．"""
+    cache = ParseCache(maxsize=10, directory=tmp_path)
+    cache.put('<math><mi>a</mi></math>', {'a', 'a/b'})
+
+    new_cache = ParseCache(maxsize=10, directory=tmp_path)
+    assert new_cache.get('<math><mi>a</mi></math>') == {'a', 'a/b'}
+    assert new_cache.stats()['disk_hits'] == 1
+    # 2回目はメモリ上のcacheにhitする．
+    assert new_cache.get('<math><mi>a</mi></math>') == {'a', 'a/b'}
+    assert new_cache.stats()['memory_hits'] == 1
+
+
+def test_get_5(tmp_path):
+    """versionが変わるとファイルのcacheが削除されることを確認．"""
+    cache = ParseCache(maxsize=10, directory=tmp_path, version='1')
+    cache.put('<math><mi>a</mi></math>', {'a'})
+
+    new_cache = ParseCache(maxsize=10, directory=tmp_path, version='2')
+    assert new_cache.get('<math><mi>a</mi></math>') is None
+
+
+def test_get_parser_version_1():
+    assert get_parser_version() == get_parser_version()
@@ -4,7 +4,7 @@
 import html
 
 import latex2mathml.converter
-from lark import Tree, Token
+from lark import Tree, Token, exceptions
 
 from twels.expr.expression import Expression
 from twels.expr.parser import Parser
@@ -3174,3 +3174,95 @@ def test_make_new_trees_1():
         ])
     ]
     assert actual == expected
+
+
+def test_parse_many_1():
+    """複数のprocessで解析した結果がParser.parse()と同じで，順番が変わらないことを確認．"""
+    Parser.cache.clear()
+    exprs = [Expression(f'<math><mn>{i}</mn><mo>+</mo><mi>x</mi></math>') for i in range(Parser.min_exprs_for_pool + 2)]
+    results = Parser.parse_many(exprs, workers=2)
+    Parser.cache.clear()
+    assert [path_set for path_set, _ in results] == [Parser.parse(expr) for expr in exprs]
+    assert all(error is None for _, error in results)
+
+
+def test_parse_many_2():
+    """解析に失敗した数式はその数式だけerrorが返されることを確認．"""
+    Parser.cache.clear()
+    exprs = [Expression(f'<math><mi>a</mi><mo>-</mo><mn>{i}</mn></math>') for i in range(Parser.min_exprs_for_pool)]
+    exprs.insert(3, Expression('<math></math>'))
+    results = Parser.parse_many(exprs, workers=2)
+    assert len(results) == len(exprs)
+    for i, (path_set, error) in enumerate(results):
+        if i == 3:
+            assert path_set is None and isinstance(error, exceptions.LarkError)
+        else:
+            assert path_set == Parser.parse(exprs[i]) and error is None
+
+
+def test_parse_many_3():
+    """workers=1のときはこのprocessで解析することを確認．"""
+    exprs = [Expression('<math><mi>a</mi></math>'), Expression('<math></math>')]
+    results = Parser.parse_many(exprs, workers=1)
+    assert results[0] == (Parser.parse(exprs[0]), None)
+    assert results[1][0] is None and isinstance(results[1][1], exceptions.LarkError)
+
+
+def test_parse_many_4():
+    """cacheにある数式は解析せず，同じ数式は1回だけ解析することを確認．"""
+    Parser.cache.clear()
+    Parser.cache.reset_stats()
+    expr = Expression('<math><mi>b</mi><mo>+</mo><mn>1</mn></math>')
+    results = Parser.parse_many([expr, expr, expr], workers=1)
+    assert results[0] == results[1] == results[2] == (Parser.parse(expr), None)
+    stats = Parser.cache.stats()
+    assert stats['misses'] == 1
+    assert stats['memory_hits'] == 1
+
+
+def test_get_parsed_tree_lalr_1():
+    """LALR parserで解析できる数式は，Earley parserと同じTreeになることを確認．"""
+    latex_list = [
+        'a+b', '-x^{2}+2x-1=0', 'y=\\frac{x^{2}}{4}', 'f(x)=\\sqrt{x+1}', '2(a+b)c',
+        'a\\times b\\div c', 'x_{i}\\in A', 'a<b\\neq c', '\\{a+b\\}[c]', '\\sqrt[3]{-x}',
+    ]
+    for latex in latex_list:
+        expr = Expression(latex2mathml.converter.convert(latex))
+        Parser.use_lalr = True
+        lalr_tree = Parser._get_lalr_parsed_tree(expr)
+        assert lalr_tree is not None, latex
+        Parser.use_lalr = False
+        earley_tree = Parser.get_parsed_tree(expr)
+        Parser.use_lalr = True
+        assert lalr_tree == earley_tree, latex
+
+
+def test_get_parsed_tree_lalr_2():
+    """mathml.larkで特別に扱う数式はLALR parserでは解析しないことを確認．"""
+    latex_list = [
+        '\\sum_{i=1}^{n}i', '\\log x', 'a\\equiv b \\pmod p', '|x|', 'a_{1}+a_{2}+\\cdots+a_{n}',
+        '\\lim_{x \\to 0}x', '\\int_{0}^{1}x dx', '\\begin{pmatrix}a & b\\end{pmatrix}',
+    ]
+    for latex in latex_list:
+        expr = Expression(latex2mathml.converter.convert(latex))
+        assert Parser._get_lalr_parsed_tree(expr) is None, latex
+
+
+def test_get_parsed_tree_lalr_3():
+    """mathml.larkではproductの中に置けないgroupを含む数式はLALR parserでは解析しないことを確認．"""
+    mathml_list = [
+        '<math><mi>x</mi><mrow><mi>a</mi><mo>+</mo><mi>b</mi></mrow></math>',
+        '<math><mi>x</mi><mrow><mo>+</mo><mi>a</mi></mrow></math>',
+        '<math><mi>x</mi><mphantom><mi>a</mi></mphantom></math>',
+        '<math><mo>(</mo><mrow><mi>a</mi><mo>=</mo><mi>b</mi></mrow><mo>)</mo></math>',
+    ]
+    for mathml in mathml_list:
+        assert Parser._get_lalr_parsed_tree(Expression(mathml)) is None, mathml
+
+
+def test_get_stats_1():
+    Parser.reset_stats()
+    Parser.get_parsed_tree(Expression('<math><mi>a</mi><mo>+</mo><mi>b</mi></math>'))
+    Parser.get_parsed_tree(Expression('<math><mo>|</mo><mi>a</mi><mo>|</mo></math>'))
+    Parser.get_parsed_tree(Expression('<math></math>'))
+    assert Parser.get_stats() == {'lalr': 1, 'earley': 2, 'error': 1}
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""module description
+"""
+import json
+from array import array
+
+from twels.searcher import similarity
+from twels.searcher.path_index import PathIndex
+
+
+def _make_rows() -> list[tuple[str, int, str]]:
+    """path_dictionaryのレコードを作る関数。"""
+    return [
+        ('path1', 3, json.dumps(['1', '2', '3'])),
+        ('path2', 3, json.dumps(['1', '2'])),
+        ('path3', 3, json.dumps(['1'])),
+        ('path1', 1, json.dumps(['4'])),
+        ('path1', 30, json.dumps(['5'])),
+        ('path4', 2, json.dumps(['6'])),
+    ]
+
+
+def test_load_rows_1():
+    """load_rows()でpathごとにexpr_sizeとexpr_idsのarrayを作ることを確認するテスト。"""
+    path_index = PathIndex()
+    path_index.load_rows(_make_rows())
+    assert len(path_index) == 4
+    assert sorted(path_index.rows({'path1', 'unknown'})) == [
+        (1, array('I', [4])),
+        (3, array('I', [1, 2, 3])),
+        (30, array('I', [5])),
+    ]
+
+
+def test_search_1():
+    """MySQLのpath_dictionaryのレコードで計算した場合と同じ結果になることを確認するテスト。"""
+    rows = _make_rows()
+    path_set = {'path1', 'path2', 'path3'}
+    path_index = PathIndex()
+    path_index.load_rows(rows)
+
+    mysql_rows = [(expr_size, expr_ids) for expr_path, expr_size, expr_ids in rows if expr_path in path_set]
+    expected = similarity.top_k(mysql_rows, len(path_set))
+    assert path_index.search(path_set) == expected
+    assert path_index.search(path_set, limit=2, offset=1) == expected[1:3]
+    assert [expr_id for expr_id, _ in path_index.iter_scores(path_set)] == [int(expr_id) for expr_id, _ in expected]
+
+
+def test_apply_1():
+    """apply()で追加と削除を記録した順に反映することを確認するテスト。"""
+    path_index = PathIndex()
+    path_index.load_rows(_make_rows())
+    path_index.apply([
+        ('path1', 3, '7', True),
+        ('path5', 2, 8, True),
+        ('path4', 2, 6, False),
+        ('path2', 3, 2, False),
+        ('path2', 3, 2, True),
+        ('path3', 3, 1, False),
+        ('unknown', 2, 9, False),
+    ])
+    assert sorted(path_index.rows({'path1'})) == [
+        (1, array('I', [4])),
+        (3, array('I', [1, 2, 3, 7])),
+        (30, array('I', [5])),
+    ]
+    assert path_index.rows({'path2', 'path3', 'path4'}) == [(3, array('I', [1, 2]))]
+    assert path_index.rows({'path5'}) == [(2, array('I', [8]))]
+    assert path_index.rows({'unknown'}) == []
+
+
+def test_apply_2():
+    """同じ変更をもう一度反映しても結果が変わらないことを確認するテスト。
+    読み込み中に記録された変更は，読み込み後にもう一度反映する。
+    """
+    changes = [('path1', 3, 7, True), ('path2', 3, 1, False)]
+    path_index = PathIndex()
+    path_index.load_rows(_make_rows())
+    path_index.apply(changes)
+    expected = path_index.search({'path1', 'path2'})
+    path_index.apply(changes)
+    assert path_index.search({'path1', 'path2'}) == expected
+
+
+def test_apply_3():
+    """検索中に変更を反映しても，検索中のarrayは変わらないことを確認するテスト。"""
+    path_index = PathIndex()
+    path_index.load_rows(_make_rows())
+    rows = path_index.rows({'path1'})
+    path_index.apply([('path1', 3, 7, True)])
+    assert sorted(rows)[1] == (3, array('I', [1, 2, 3]))
+
+
+def test_apply_changes_1():
+    """後からcommitされた小さいchange_idの変更も，それより後の変更と一緒に順に反映することを確認するテスト。"""
+    path_index = PathIndex()
+    path_index.load_rows(_make_rows())
+    # change_id 2のtransactionがまだcommitされていない。
+    path_index.apply_changes([(1, 'path1', 3, 7, True), (3, 'path4', 2, 9, True)], window=10)
+    assert path_index.rows({'path4'}) == [(2, array('I', [6, 9]))]
+
+    changes = [(1, 'path1', 3, 7, True), (2, 'path4', 2, 9, False), (3, 'path4', 2, 9, True), (4, 'path4', 2, 6, False)]
+    path_index.apply_changes(changes, window=10)
+    assert path_index.rows({'path4'}) == [(2, array('I', [9]))]
+    assert sorted(path_index.rows({'path1'}))[1] == (3, array('I', [1, 2, 3, 7]))
+
+    # 全て反映済みの場合は何もしない。
+    path_index.apply([('path4', 2, 10, True)])
+    path_index.apply_changes(changes, window=10)
+    assert path_index.rows({'path4'}) == [(2, array('I', [9, 10]))]
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""module description
+"""
+import threading
+import time
+
+import pytest
+from mysql.connector.errors import PoolError
+
+from twels.database.pool import ConnectionPool
+
+
+class FakeConnection:
+    """ConnectionPoolのテストのためのconnection．"""
+    def __init__(self):
+        self.closed = False
+        self.connected = True
+        self.in_transaction = False
+        self.rollback_count = 0
+
+    def close(self):
+        self.closed = True
+
+    def is_connected(self) -> bool:
+        return self.connected
+
+    def rollback(self):
+        self.rollback_count += 1
+        self.in_transaction = False
+
+
+def test_acquire_1():
+    """release()したconnectionが再利用されることを確認．"""
+    pool = ConnectionPool(FakeConnection, size=2)
+    cnx1 = pool.acquire()
+    pool.release(cnx1)
+    cnx2 = pool.acquire()
+    assert cnx1 is cnx2
+    assert pool.num_connections() == 1
+
+
+def test_acquire_2():
+    """最大数まで貸し出している場合，wait_timeout後にPoolErrorになることを確認．"""
+    pool = ConnectionPool(FakeConnection, size=1, wait_timeout=0.1)
+    pool.acquire()
+    with pytest.raises(PoolError):
+        pool.acquire()
+
+
+def test_acquire_3():
+    """最大数まで貸し出している場合，release()されるまで待つことを確認．"""
+    pool = ConnectionPool(FakeConnection, size=1, wait_timeout=5)
+    cnx1 = pool.acquire()
+    timer = threading.Timer(0.1, pool.release, args=(cnx1,))
+    timer.start()
+    cnx2 = pool.acquire()
+    timer.join()
+    assert cnx1 is cnx2
+
+
+def test_acquire_4():
+    """health checkに失敗したconnectionは作り直すことを確認．"""
+    pool = ConnectionPool(FakeConnection, size=1, health_check_interval=0)
+    cnx1 = pool.acquire()
+    pool.release(cnx1)
+    cnx1.connected = False
+    cnx2 = pool.acquire()
+    assert cnx1 is not cnx2
+    assert cnx1.closed
+    assert pool.num_connections() == 1
+
+
+def test_acquire_5():
+    """idle_timeoutを過ぎたconnectionはcloseされることを確認．"""
+    pool = ConnectionPool(FakeConnection, size=2, idle_timeout=0.05)
+    cnx1 = pool.acquire()
+    pool.release(cnx1)
+    time.sleep(0.1)
+    cnx2 = pool.acquire()
+    assert cnx1 is not cnx2
+    assert cnx1.closed
+    assert pool.num_connections() == 1
+
+
+def test_acquire_6():
+    """connectionの作成に失敗しても作成済みの数が増えないことを確認．"""
+    def factory():
+        raise OSError('cannot connect')
+
+    pool = ConnectionPool(factory, size=1)
+    with pytest.raises(OSError):
+        pool.acquire()
+    assert pool.num_connections() == 0
+
+
+def test_release_1():
+    """commitされていない変更がrollbackされることを確認．"""
+    pool = ConnectionPool(FakeConnection, size=1)
+    cnx = pool.acquire()
+    cnx.in_transaction = True
+    pool.release(cnx)
+    assert cnx.rollback_count == 1
+    assert pool.num_idle() == 1
+
+
+def test_release_2():
+    """discard=Trueのときはpoolに戻さずにcloseすることを確認．"""
+    pool = ConnectionPool(FakeConnection, size=1)
+    cnx = pool.acquire()
+    pool.release(cnx, discard=True)
+    assert cnx.closed
+    assert pool.num_idle() == 0
+    assert pool.num_connections() == 0
+
+
+def test_close_all_1():
+    pool = ConnectionPool(FakeConnection, size=2)
+    cnx1 = pool.acquire()
+    cnx2 = pool.acquire()
+    pool.release(cnx1)
+    pool.release(cnx2)
+    pool.close_all()
+    assert cnx1.closed and cnx2.closed
+    assert pool.num_connections() == 0
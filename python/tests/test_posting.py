@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""module description
+"""
+from array import array
+
+import pytest
+
+from twels.indexer import posting
+
+
+def test_varints_1():
+    """encode_varints()とdecode_varints()で元に戻ることを確認するテスト。
+    1 byteから4 byte以上になる値の境界を含む。
+    """
+    values = [0, 1, 127, 128, 300, 16383, 16384, 2097151, 2097152, 2**35 + 1]
+    out = bytearray()
+    posting.encode_varints(values, out)
+    assert out[:4] == bytes([0, 1, 127, 0x80])
+    assert posting.decode_varints(out) == values
+
+
+def test_varints_2():
+    """負の数はencodeできないことを確認するテスト。"""
+    with pytest.raises(ValueError):
+        posting.encode_varints([-1], bytearray())
+
+
+def test_encode_1():
+    """encode()とdecode()で元に戻ることを確認するテスト。
+    uri_idは1つ前との差で保存し，LANGSにない言語とNoneも保存できる。
+    """
+    uri_ids = array('q', [3, 10, 1000])
+    langs = array('B', map(posting.lang_to_code, ['ja', 'eo', None]))
+    counts = array('I', [2, 0, 1])
+    positions = array('I', [40, 20000, 7])
+    data = posting.encode(uri_ids, langs, counts, positions)
+    assert data[0] == posting.VERSION
+
+    actual = posting.decode(data)
+    assert actual == (uri_ids, langs, counts, positions)
+    assert [posting.code_to_lang(code) for code in actual[1]] == ['ja', 'eo', None]
+
+
+def test_encode_2():
+    """空のinfoをencode()とdecode()できることを確認するテスト。"""
+    empty = (array('q'), array('B'), array('I'), array('I'))
+    assert posting.decode(posting.encode(*empty)) == empty
+
+
+@pytest.mark.parametrize('data', [
+    b'',
+    b'{"uri_id": []}',  # JSON
+    b'\x01\x01\x00\x00\x05',  # 数式の開始位置が足りない
+    b'\x01\x01\x00\x00\x05\x01\x05\x05',  # 余分なbyteがある
+    b'\x01\x01\x00\x50\x05\x00',  # 存在しない言語
+    b'\x01\x01\x00\x00\x85',  # varintの途中で終わる
+])
+def test_decode_1(data):
+    """壊れたbinaryの場合はPostingErrorが発生することを確認するテスト。"""
+    with pytest.raises(posting.PostingError):
+        posting.decode(data)
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""module description
+"""
+import pickle
+from contextlib import nullcontext
+
+from twels.database.cursor import Cursor
+from twels.searcher import result_cache
+from twels.searcher.result_cache import ResultCache
+from twels.snippet.snippet import Snippet
+
+
+def _make_result(uri: str) -> dict:
+    return {
+        'search_result': [{'uri': uri, 'title': 'title', 'snippet': Snippet('a <math><mi>x</mi></math> b', clean=False)}],
+        'has_next': False,
+    }
+
+
+class _Backend:
+    """Djangoのcache frameworkと同じget()とset()を持つcache。pickleして保存する。"""
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        value = self.data.get(key)
+        return None if value is None else pickle.loads(value)
+
+    def set(self, key, value, timeout):
+        self.data[key] = pickle.dumps(value)
+
+
+def test_make_key_1():
+    """path setとlr_listの順番によらず同じkeyになり，start，generationが違えば違うkeyになることを確認。"""
+    key = ResultCache.make_key({'a', 'b'}, 0, ['ja', 'en'], 1)
+    assert key == ResultCache.make_key({'b', 'a'}, 0, ['en', 'ja'], 1)
+    assert key != ResultCache.make_key({'a', 'b'}, 10, ['ja', 'en'], 1)
+    assert key != ResultCache.make_key({'a', 'b'}, 0, ['ja'], 1)
+    assert key != ResultCache.make_key({'a', 'b'}, 0, ['ja', 'en'], 2)
+
+
+def test_get_1():
+    """保存した検索結果を返し，hitとmissを数えることを確認。返した検索結果を変更してもcacheは変わらない。"""
+    cache = ResultCache(maxsize=10)
+    assert cache.get('key') is None
+    cache.put('key', _make_result('a'))
+    result = cache.get('key')
+    assert result['search_result'][0]['uri'] == 'a'
+    result['search_result'].clear()
+    assert len(cache.get('key')['search_result']) == 1
+    stats = cache.stats()
+    assert stats['memory_hits'] == 2
+    assert stats['misses'] == 1
+    assert stats['hit_ratio'] == 2 / 3
+
+
+def test_get_2(monkeypatch):
+    """maxsizeを超えたら最も古く使われた検索結果から削除し，ttl秒を過ぎたら返さないことを確認。"""
+    now = [0.0]
+    monkeypatch.setattr(result_cache.time, 'monotonic', lambda: now[0])
+    cache = ResultCache(maxsize=2, ttl=10)
+    cache.put('1', _make_result('1'))
+    cache.put('2', _make_result('2'))
+    cache.get('1')
+    cache.put('3', _make_result('3'))
+    assert cache.get('2') is None
+    assert cache.get('1') is not None
+
+    now[0] = 11.0
+    assert cache.get('1') is None
+    assert cache.stats()['memory_size'] == 1
+
+
+def test_backend_1():
+    """backendに保存した検索結果を，他のworkerのcacheが読み込めることを確認。"""
+    backend = _Backend()
+    ResultCache(maxsize=10, backend=backend).put('key', _make_result('a'))
+
+    cache = ResultCache(maxsize=10, backend=backend)
+    result = cache.get('key')
+    assert result['search_result'][0]['uri'] == 'a'
+    assert str(result['search_result'][0]['snippet']) == 'a <math><mi>x</mi></math> b'
+    cache.get('key')
+    stats = cache.stats()
+    assert stats['backend_hits'] == 1
+    assert stats['memory_hits'] == 1
+
+    assert not ResultCache(maxsize=0).enabled
+    assert ResultCache(maxsize=0, backend=backend).enabled
+
+
+def test_generation_1(monkeypatch):
+    """poll_interval秒ごとにgenerationを確認し，変わったらメモリ上の検索結果を削除することを確認。"""
+    now = [0.0]
+    generations = [1]
+    monkeypatch.setattr(result_cache.time, 'monotonic', lambda: now[0])
+    monkeypatch.setattr(Cursor, 'connect', lambda test=False: nullcontext())
+    monkeypatch.setattr(Cursor, 'cursor', lambda cnx: nullcontext())
+    monkeypatch.setattr(Cursor, 'select_generation_from_index_generation', lambda cursor: generations[0])
+
+    cache = ResultCache(maxsize=10, poll_interval=1)
+    assert cache.generation() == 1
+    cache.put('key', _make_result('a'))
+
+    generations[0] = 2
+    assert cache.generation() == 1
+    assert cache.get('key') is not None
+    now[0] = 2.0
+    assert cache.generation() == 2
+    assert cache.get('key') is None
+
+
+def test_generation_2(monkeypatch):
+    """index_generation tableを読めない場合はNoneを返すことを確認。"""
+    def connect(test=False):
+        raise RuntimeError('no database')
+    monkeypatch.setattr(Cursor, 'connect', connect)
+    assert ResultCache().generation() is None
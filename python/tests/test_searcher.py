@@ -2,12 +2,16 @@
 """module description
 """
 
+import threading
+
 from itemadapter import ItemAdapter
+import pysolr
 import pytest
 
 from tests.functions import reset_tables
 from twels.expr.expression import Expression
 from twels.indexer.indexer import Indexer
+from twels.searcher import searcher
 from twels.searcher.searcher import Searcher
 from twels.snippet.snippet import Snippet
 from web_crawler.web_crawler.items import Page
@@ -271,6 +275,36 @@ def test_search_8():
         reset_tables()
 
 
+def test_search_9():
+    """データベースに送るqueryの数がページの数に比例しないことを確認するテスト。
+    検索(1) + infoの取得(1) + 登録されているページの確認(1) + 表示するページの取得(1)。
+    """
+    try:
+        page_num = Searcher.search_num * 3
+        number = '1'
+        mathml = f'<math><mn>{number}</mn></math>'
+        body = f'{mathml}は数字の1つです。'
+        snippet = Snippet(body)
+        lang = 'ja'
+
+        exprs = [Expression(mathml)]
+
+        for i in range(page_num):
+            uri = f'uri_{i}'
+            title = f'title_{i}'
+            page_item = Page(uri=uri, title=title, snippet=snippet, lang=lang, exprs=exprs)
+            assert Indexer.update_db(ItemAdapter(page_item), test=True)
+
+        lr_list = [lang]
+        actual = Searcher.search(number, Searcher.search_num, lr_list, test=True)
+        assert len(actual['search_result']) == Searcher.search_num
+        assert actual['has_next'] is True
+        assert actual['query_count'] == 4
+
+    finally:
+        reset_tables()
+
+
 @pytest.mark.parametrize('test_input, expected', [
     ("not expressions.", False),
     ('1+2', True),
@@ -293,3 +327,166 @@ def test_search_8():
 def test_is_expr_1(test_input, expected):
     """入力が数式かどうかを判別する関数のテスト。"""
     assert Searcher._is_expr(test_input) == expected
+
+
+def test_compile_query_1():
+    """同じLaTeXは2回目からSearcher.query_cacheのpath setを使うことを確認するテスト。"""
+    Searcher.query_cache.clear()
+    Searcher.query_cache.reset_stats()
+    path_set = Searcher._compile_query('x^2 + 1')
+    assert path_set
+    assert Searcher._compile_query(' x^2 + 1 ') == path_set
+    stats = Searcher.query_cache.stats()
+    assert stats['memory_hits'] == 1
+    assert stats['misses'] == 1
+
+
+class _Solr:
+    """solr.search()の引数を記録し，start，rowsで指定された範囲のドキュメントを返すSolrの代わり。"""
+    def __init__(self, num_found: int):
+        self.num_found = num_found
+        self.kwargs = None
+
+    def search(self, q, **kwargs):
+        self.kwargs = kwargs
+        ids = range(kwargs['start'], min(kwargs['start'] + kwargs['rows'], self.num_found))
+        return pysolr.Results({
+            'response': {'docs': [{'id': str(i), 'url': [f'uri_{i}'], 'title': [f'title_{i}']} for i in ids],
+                         'numFound': self.num_found},
+            'highlighting': {str(i): {'content': [f'<span class="hl">{i}</span>']} for i in ids if i % 2 == 0},
+        })
+
+
+@pytest.mark.parametrize('start, num_found, expected_uris, expected_has_next', [
+    (0, 25, [f'uri_{i}' for i in range(10)], True),
+    (10, 20, [f'uri_{i}' for i in range(10, 20)], False),
+    (20, 23, ['uri_20', 'uri_21', 'uri_22'], False),
+])
+def test_search_natural_lang_1(monkeypatch, start, num_found, expected_uris, expected_has_next):
+    """start，rows，言語をSolrに指定し，numFoundからhas_nextを求めることを確認するテスト。"""
+    solr = _Solr(num_found)
+    monkeypatch.setattr(searcher, 'get_solr_client', lambda: solr)
+    result = Searcher.search('関数', start, ['ja', 'en'])
+    assert [page['uri'] for page in result['search_result']] == expected_uris
+    assert result['has_next'] == expected_has_next
+    assert solr.kwargs['start'] == start
+    assert solr.kwargs['rows'] == Searcher.search_num + 1
+    assert solr.kwargs['fq'] == 'lang:("ja" OR "en")'
+    assert solr.kwargs['fl'] == 'id,url,title'
+    page = result['search_result'][0]
+    assert page['title'] == f'title_{start}'
+    assert str(page['snippet']) == f'<span class="hl">{start}</span>'
+    assert str(result['search_result'][1]['snippet']) == ''
+
+
+def test_search_natural_lang_2(monkeypatch):
+    """検索対象の言語がない場合はSolrに問い合わせないことを確認するテスト。"""
+    def get_solr_client():
+        raise AssertionError('Solr should not be called.')
+    monkeypatch.setattr(searcher, 'get_solr_client', get_solr_client)
+    result = Searcher.search('関数', 0, [])
+    assert result['search_result'] == []
+    assert not result['has_next']
+
+
+def _page(uri: str) -> dict:
+    return {'uri': uri, 'title': 'title', 'snippet': Snippet('snippet', clean=False)}
+
+
+def _pages(uris: list[str], start: int) -> dict:
+    """uriのリストのstart番目からsearch_num個を検索結果として返す関数。"""
+    return {
+        'search_result': [_page(uri) for uri in uris[start:start + Searcher.search_num]],
+        'has_next': len(uris) > start + Searcher.search_num
+    }
+
+
+def test_search_hybrid_1(monkeypatch):
+    """自然言語と数式を別のthreadで同時に検索し，検索結果をまとめることを確認するテスト。"""
+    # 両方の検索が始まるまで待つので，同時に検索しないと終わらない。
+    barrier = threading.Barrier(2, timeout=5)
+
+    def search_expr(latex, start, lr_list, test=False, after=None):
+        barrier.wait()
+        return {'search_result': [_page('a'), _page('b')], 'has_next': False, 'compile_time': 0.1}
+
+    def search_natural_lang(query, start, lr_list):
+        if start == 0:
+            barrier.wait()
+        assert query == 'Fourier transform'
+        return _pages(['b', 'c'] + [f'text{i}' for i in range(10)], start)
+
+    monkeypatch.setattr(Searcher, '_search_expr', staticmethod(search_expr))
+    monkeypatch.setattr(Searcher, '_search_natural_lang', staticmethod(search_natural_lang))
+    result = Searcher.search(['Fourier transform \\int f(x)e^{-ikx}dx'], 0, ['ja'])
+    assert [page['uri'] for page in result['search_result']][:3] == ['b', 'a', 'c']
+    assert len(result['search_result']) == Searcher.search_num
+    assert result['has_next']
+    assert result['compile_time'] == 0.1
+    assert result['timed_out'] == []
+
+
+def test_search_hybrid_2(monkeypatch):
+    """時間内に返らなかった検索の結果は使わないことを確認するテスト。"""
+    finish = threading.Event()
+
+    def search_expr(latex, start, lr_list, test=False, after=None):
+        return {'search_result': [_page('a')], 'has_next': False}
+
+    def search_natural_lang(query, start, lr_list):
+        finish.wait(5)
+        return {'search_result': [_page('b')], 'has_next': True}
+
+    monkeypatch.setattr(Searcher, '_search_expr', staticmethod(search_expr))
+    monkeypatch.setattr(Searcher, '_search_natural_lang', staticmethod(search_natural_lang))
+    monkeypatch.setitem(Searcher.hybrid_budgets, 'text', 0.05)
+    try:
+        result = Searcher.search(['Fourier transform', 'x^2'], 0, ['ja'])
+    finally:
+        finish.set()
+    assert [page['uri'] for page in result['search_result']] == ['a']
+    assert not result['has_next']
+    assert result['timed_out'] == ['text']
+
+
+def test_search_hybrid_3(monkeypatch):
+    """両方の検索結果が1ページ分ある場合に，まとめた検索結果をsearch_num個にすることを確認するテスト。"""
+    def search_expr(latex, start, lr_list, test=False, after=None):
+        return _pages([f'formula{i}' for i in range(Searcher.search_num)], start)
+
+    def search_natural_lang(query, start, lr_list):
+        return _pages([f'text{i}' for i in range(Searcher.search_num)], start)
+
+    monkeypatch.setattr(Searcher, '_search_expr', staticmethod(search_expr))
+    monkeypatch.setattr(Searcher, '_search_natural_lang', staticmethod(search_natural_lang))
+    result = Searcher.search(['Fourier transform', 'x^2'], 0, ['ja'])
+    assert len(result['search_result']) == Searcher.search_num
+    assert [page['uri'] for page in result['search_result'][:4]] == ['formula0', 'text0', 'formula1', 'text1']
+    assert result['has_next']
+
+
+def test_search_hybrid_4(monkeypatch):
+    """次のページを順に検索すると，まとめた検索結果が欠けたり重複したりしないことを確認するテスト。"""
+    formula_uris = [f'uri{i}' for i in range(15)]
+    text_uris = [f'uri{i}' for i in range(10, 25)]
+
+    def search_expr(latex, start, lr_list, test=False, after=None):
+        return _pages(formula_uris, start)
+
+    def search_natural_lang(query, start, lr_list):
+        return _pages(text_uris, start)
+
+    monkeypatch.setattr(Searcher, '_search_expr', staticmethod(search_expr))
+    monkeypatch.setattr(Searcher, '_search_natural_lang', staticmethod(search_natural_lang))
+    uris = []
+    start = 0
+    while True:
+        result = Searcher.search(['Fourier transform', 'x^2'], start, ['ja'])
+        assert len(result['search_result']) <= Searcher.search_num
+        uris.extend(page['uri'] for page in result['search_result'])
+        if not result['has_next']:
+            break
+        start += Searcher.search_num
+    assert start == 2 * Searcher.search_num
+    assert len(uris) == len(set(uris))
+    assert set(uris) == set(formula_uris) | set(text_uris)
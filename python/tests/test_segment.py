@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""module description
+"""
+import json
+
+import pytest
+
+from twels.database.cursor import Cursor
+from twels.indexer.info import Info
+from twels.searcher import similarity
+from twels.segment.segment import Segment, SegmentError, SegmentWriter
+from twels.segment.segment_set import SegmentSet, read_manifest, write_manifest
+from twels.segment.updater import MIN_TIER_BYTES, SegmentUpdater, merge_segments, pick_merge_run
+
+
+def _make_rows() -> list[tuple[str, int, str]]:
+    """path_dictionaryのレコードを作る関数。"""
+    return [
+        ('path1', 3, json.dumps(['1', '2', '3'])),
+        ('path2', 3, json.dumps(['1', '2'])),
+        ('path3', 3, json.dumps(['1'])),
+        ('path1', 1, json.dumps(['4'])),
+        ('path1', 30, json.dumps(['5'])),
+        ('path4', 2, json.dumps(['6'])),
+        ('/mi/∑', 2, json.dumps(['6'])),
+    ]
+
+
+def _make_info(uri_id: int) -> Info:
+    info = Info({'uri_id': [], 'lang': [], 'expr_start_pos': []})
+    info.add_page(uri_id, 'ja', [uri_id * 10])
+    return info
+
+
+def _write_segment(path, rows: list[tuple[str, int, str]], expr_ids: list[int]):
+    writer = SegmentWriter()
+    for expr_path, expr_size, ids in rows:
+        writer.add_path(expr_path, expr_size, json.loads(ids))
+    for expr_id in expr_ids:
+        writer.add_expr(expr_id, 3, expr_id + 100, _make_info(expr_id))
+    writer.write(path)
+
+
+def test_segment_1(tmp_path):
+    """書き込んだpath_dictionaryのレコードをpathから読み込めることを確認するテスト。"""
+    _write_segment(tmp_path / 'a.twseg', _make_rows(), [1, 2, 3])
+    segment = Segment(tmp_path / 'a.twseg')
+    assert segment.path_count == 5
+    assert segment.find_path('path1') is not None
+    assert segment.find_path('/mi/∑') is not None
+    assert segment.find_path('path0') is None
+    rows = sorted((expr_size, expr_ids.tolist()) for expr_size, expr_ids in segment.rows({'path1', '/mi/∑', 'unknown'}))
+    assert rows == [(1, [4]), (2, [6]), (3, [1, 2, 3]), (30, [5])]
+    segment.close()
+
+
+def test_segment_2(tmp_path):
+    """MySQLのpath_dictionaryのレコードで計算した場合と同じ検索結果になることを確認するテスト。"""
+    rows = _make_rows()
+    path_set = {'path1', 'path2', 'path3'}
+    _write_segment(tmp_path / 'a.twseg', rows, [])
+    segment = Segment(tmp_path / 'a.twseg')
+
+    mysql_rows = [(expr_size, expr_ids) for expr_path, expr_size, expr_ids in rows if expr_path in path_set]
+    assert similarity.top_k(segment.rows(path_set), len(path_set)) == similarity.top_k(mysql_rows, len(path_set))
+
+
+def test_infos_1(tmp_path):
+    """inverted_indexのinfoとexpr_lenを読み込めることを確認するテスト。"""
+    _write_segment(tmp_path / 'a.twseg', _make_rows(), [3, 1, 2])
+    segment = Segment(tmp_path / 'a.twseg')
+    assert len(segment) == 3
+    infos = segment.infos([2, 5, 3])
+    assert infos == {2: (_make_info(2), 102), 3: (_make_info(3), 103)}
+    assert segment.expr_size(1) == 3
+    assert segment.expr_size(5) is None
+
+
+def test_broken_1(tmp_path):
+    """segment fileではないfileや途中で切れたfileを開くとSegmentErrorになることを確認するテスト。"""
+    (tmp_path / 'a.twseg').write_bytes(b'not a segment file')
+    with pytest.raises(SegmentError):
+        Segment(tmp_path / 'a.twseg')
+
+    _write_segment(tmp_path / 'b.twseg', _make_rows(), [1, 2, 3])
+    data = (tmp_path / 'b.twseg').read_bytes()
+    (tmp_path / 'b.twseg').write_bytes(data[:len(data) // 2])
+    with pytest.raises(SegmentError):
+        Segment(tmp_path / 'b.twseg')
+
+
+def test_segment_set_1(tmp_path, monkeypatch):
+    """manifest.jsonに書かれたsegmentをまとめて検索し，書き換えると開き直すことを確認するテスト。"""
+    monkeypatch.setitem(Cursor.segment_config, 'test_dir', str(tmp_path))
+    monkeypatch.setattr(SegmentSet, '_sets', {})
+    rows = _make_rows()
+    _write_segment(tmp_path / 'a.twseg', rows[:3], [1, 2, 3])
+    _write_segment(tmp_path / 'b.twseg', rows[3:], [4, 5, 6])
+    assert read_manifest(tmp_path) == {'generation': 0, 'segments': []}
+    write_manifest(tmp_path, {'generation': 1, 'segments': ['a.twseg']})
+
+    segment_set = SegmentSet.get(test=True)
+    assert len(segment_set) == 3
+    assert SegmentSet.get(test=True) is segment_set
+
+    write_manifest(tmp_path, {'generation': 2, 'segments': ['a.twseg', 'b.twseg']})
+    segment_set = SegmentSet.get(test=True)
+    assert segment_set.generation == 2
+    assert len(segment_set) == 6
+    path_set = {'path1', 'path2', 'path3'}
+    assert segment_set.search(path_set) == similarity.top_k(
+        [(expr_size, expr_ids) for expr_path, expr_size, expr_ids in rows if expr_path in path_set], len(path_set))
+    assert sorted(segment_set.infos([1, 6, 7])) == [1, 6]
+
+
+def test_segment_set_2(monkeypatch):
+    """directoryが設定されていない場合はNoneを返すことを確認するテスト。"""
+    monkeypatch.setitem(Cursor.segment_config, 'test_dir', '')
+    assert SegmentSet.get(test=True) is None
+
+
+def test_tombstones_1(tmp_path):
+    """add_tombstone()した数式は，同じsegmentに追加していても書き込まないことを確認するテスト。"""
+    writer = SegmentWriter()
+    writer.add_path('path1', 3, [1, 2])
+    writer.add_path('path2', 3, [2])
+    writer.add_expr(1, 3, 101, _make_info(1))
+    writer.add_expr(2, 3, 102, _make_info(2))
+    writer.add_tombstone(2)
+    writer.add_tombstone(7)
+    writer.write(tmp_path / 'a.twseg')
+
+    segment = Segment(tmp_path / 'a.twseg')
+    assert segment.tombstones.tolist() == [2, 7]
+    assert [(expr_size, expr_ids.tolist()) for expr_size, expr_ids in segment.rows({'path1', 'path2'})] == [(3, [1])]
+    assert segment.infos([1, 2]) == {1: (_make_info(1), 101)}
+
+
+def test_segment_set_3(tmp_path):
+    """新しいsegmentのtombstonesにある数式は古いsegmentで検索せず，infoは新しいsegmentのものを使うことを確認するテスト。"""
+    _write_segment(tmp_path / 'a.twseg', _make_rows(), [1, 2, 3, 4])
+    writer = SegmentWriter()
+    writer.add_tombstone(1)
+    writer.add_expr(2, 3, 200, _make_info(20))
+    writer.write(tmp_path / 'b.twseg')
+    write_manifest(tmp_path, {'generation': 2, 'segments': ['a.twseg', 'b.twseg']})
+
+    segment_set = SegmentSet(tmp_path)
+    assert [expr_id for expr_id, _ in segment_set.search({'path1', 'path2', 'path3'})] == ['2', '4', '3', '5']
+    assert segment_set.infos([1, 2, 3]) == {2: (_make_info(20), 200), 3: (_make_info(3), 103)}
+    assert len(segment_set) == 3
+
+
+def _flush_changes(updater: SegmentUpdater):
+    """数式の追加，infoの更新，削除をdeltaとして書き込む関数。"""
+    rows = _make_rows()
+    for i in range(0, len(rows), 2):
+        writer = SegmentWriter()
+        for expr_path, expr_size, expr_ids in rows[i:i+2]:
+            writer.add_path(expr_path, expr_size, json.loads(expr_ids))
+            for expr_id in json.loads(expr_ids):
+                writer.add_expr(int(expr_id), expr_size, 100, _make_info(int(expr_id)))
+        updater.flush(writer)
+    writer = SegmentWriter()
+    writer.add_tombstone(2)
+    writer.add_expr(3, 3, 100, _make_info(30))
+    updater.flush(writer)
+
+
+def test_updater_1(tmp_path, monkeypatch):
+    """flush()したdeltaをすぐに検索でき，merge()しても検索結果が変わらないことを確認するテスト。"""
+    monkeypatch.setitem(Cursor.segment_config, 'test_dir', str(tmp_path))
+    monkeypatch.setattr(SegmentSet, '_sets', {})
+    updater = SegmentUpdater(tmp_path, merge_factor=2, background=False)
+    assert updater.flush(SegmentWriter()) is None
+    _flush_changes(updater)
+
+    path_set = {'path1', 'path2', 'path3', '/mi/∑'}
+    segment_set = SegmentSet.get(test=True)
+    assert len(segment_set.segments) == 5
+    expected = segment_set.search(path_set)
+    assert '2' not in [expr_id for expr_id, _ in expected]
+    assert segment_set.infos([3]) == {3: (_make_info(30), 100)}
+
+    # 全てのsegmentが同じtierなので，1つにmergeする．
+    merged = updater.merge()
+    segment_set = SegmentSet.get(test=True)
+    assert [segment.path for segment in segment_set.segments] == [merged]
+    assert segment_set.search(path_set) == expected
+    assert segment_set.infos([2, 3]) == {3: (_make_info(30), 100)}
+    # 一番古いsegmentを含めてmergeしたので，tombstonesは不要．
+    assert len(segment_set.segments[0].tombstones) == 0
+    assert sorted(path.name for path in tmp_path.glob('*.twseg')) == [merged.name]
+    assert updater.merge() is None
+    assert updater.merge(merge_all=True) is None
+
+
+def test_merge_segments_1(tmp_path):
+    """一番古いsegmentを含めずにmergeした場合は，tombstonesを残すことを確認するテスト。"""
+    _write_segment(tmp_path / 'a.twseg', _make_rows(), [1, 2, 3])
+    writer = SegmentWriter()
+    writer.add_path('path1', 3, [7])
+    writer.add_expr(7, 3, 107, _make_info(7))
+    writer.add_tombstone(1)
+    writer.write(tmp_path / 'b.twseg')
+    writer = SegmentWriter()
+    writer.add_tombstone(7)
+    writer.add_tombstone(2)
+    writer.write(tmp_path / 'c.twseg')
+    write_manifest(tmp_path, {'generation': 3, 'segments': ['a.twseg', 'b.twseg', 'c.twseg']})
+    path_set = {'path1', 'path2', 'path3'}
+    expected = SegmentSet(tmp_path).search(path_set)
+    assert [expr_id for expr_id, _ in expected] == ['4', '3', '5']
+
+    merge_segments([Segment(tmp_path / 'b.twseg'), Segment(tmp_path / 'c.twseg')], tmp_path / 'd.twseg')
+    merged = Segment(tmp_path / 'd.twseg')
+    assert merged.tombstones.tolist() == [1, 2, 7]
+    assert len(merged) == 0
+    write_manifest(tmp_path, {'generation': 4, 'segments': ['a.twseg', 'd.twseg']})
+    assert SegmentSet(tmp_path).search(path_set) == expected
+
+
+def test_updater_2(tmp_path):
+    """background threadでmergeしても検索結果が変わらないことを確認するテスト。"""
+    _flush_changes(SegmentUpdater(tmp_path, merge_factor=2, background=False))
+    expected = SegmentSet(tmp_path).search({'path1', 'path2', 'path3'})
+
+    directory = tmp_path / 'background'
+    updater = SegmentUpdater(directory, merge_factor=2)
+    _flush_changes(updater)
+    updater.wait()
+    segment_set = SegmentSet(directory)
+    assert len(segment_set.segments) == 1
+    assert segment_set.search({'path1', 'path2', 'path3'}) == expected
+
+
+def test_pick_merge_run_1():
+    """同じtierのsegmentがmerge_factor個以上並んでいる一番新しい範囲を選ぶことを確認するテスト。"""
+    small = MIN_TIER_BYTES
+    large = MIN_TIER_BYTES * 4
+    assert pick_merge_run([], 4) is None
+    assert pick_merge_run([large, small, small, small], 4) is None
+    assert pick_merge_run([large, small, small, small, small], 4) == (1, 5)
+    assert pick_merge_run([large, large, large, large, small], 4) == (0, 4)
+    assert pick_merge_run([small, small, large, large, small, small], 2) == (4, 6)
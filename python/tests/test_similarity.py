@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""module description
+"""
+import json
+import random
+from array import array
+from itertools import islice
+
+import pytest
+
+from twels.searcher import similarity
+
+
+def _sorted_scores(rows: list[tuple[int, list[str]]], query_size: int) -> list[list]:
+    """全ての数式の類似度を計算してsortした結果を返す関数。"""
+    shared: dict[str, int] = {}
+    sizes: dict[str, int] = {}
+    for expr_size, expr_ids in rows:
+        for expr_id in expr_ids:
+            shared[expr_id] = shared.get(expr_id, 0) + 1
+            sizes[expr_id] = expr_size
+    scores = [[expr_id, similarity.jaccard(n, query_size, sizes[expr_id])] for expr_id, n in shared.items()]
+    return sorted(scores, key=lambda x: (-x[1], int(x[0])))
+
+
+def _random_rows(seed: int, query_size: int) -> list[tuple[int, list[str]]]:
+    """query_size個のpathのpath_dictionaryのレコードをランダムに作る関数。
+    数式ごとにexpr_sizeを決め，そのうちのexpr_size個以下のpathを検索する数式と共通にする。
+    """
+    rng = random.Random(seed)
+    # {(path, expr_size): expr_ids}
+    records: dict[tuple[int, int], list[str]] = {}
+    for expr_id in range(1, 300):
+        expr_size = rng.randint(1, 30)
+        shared = rng.randint(0, min(query_size, expr_size))
+        for path in rng.sample(range(query_size), shared):
+            records.setdefault((path, expr_size), []).append(str(expr_id))
+    return [(expr_size, expr_ids) for (_, expr_size), expr_ids in records.items()]
+
+
+def test_jaccard_1():
+    """jaccard()とupper_bound()のテスト。"""
+    assert similarity.jaccard(5, 5, 5) == 1
+    assert similarity.jaccard(2, 4, 3) == 2 / 5
+    assert similarity.upper_bound(4, 3) == 3 / 4
+    assert similarity.upper_bound(3, 4) == 3 / 4
+
+
+@pytest.mark.parametrize('seed, query_size', [
+    (0, 1),
+    (1, 3),
+    (2, 8),
+    (3, 20),
+])
+def test_iter_scores_1(seed, query_size):
+    """iter_scores()が全ての数式の類似度をsortした結果と同じ順番で返すことを確認するテスト。"""
+    rows = _random_rows(seed, query_size)
+    actual = [[str(expr_id), score] for expr_id, score in similarity.iter_scores(rows, query_size)]
+    assert actual == _sorted_scores(rows, query_size)
+
+
+def test_iter_scores_2():
+    """expr_idsはJSONの文字列でもよいことを確認するテスト。"""
+    rows = [(2, json.dumps(['1', '2'])), (2, ['2']), (1, json.dumps(['3']))]
+    actual = list(similarity.iter_scores(rows, 2))
+    assert actual == [(2, 1.0), (3, 0.5), (1, 1 / 3)]
+
+
+def test_iter_scores_3():
+    """必要な数式を返した時点で，類似度の上限が低いexpr_sizeの計算をしていないことを確認するテスト。"""
+    # 1回でまとめて計算するexpr_idの数を超えるので，最初の計算にはexpr_sizeが100のレコードを含まない。
+    expr_ids = [str(expr_id) for expr_id in range(1, similarity.FIRST_BATCH_SIZE + 1)]
+    rows = [(1, json.dumps(expr_ids)), (100, None)]
+    scores = similarity.iter_scores(rows, 1)
+    assert list(islice(scores, len(expr_ids))) == [(int(expr_id), 1.0) for expr_id in expr_ids]
+    with pytest.raises(TypeError):
+        next(scores)
+
+
+def test_iter_scores_4():
+    """pathがない場合は何も返さないことを確認するテスト。"""
+    assert list(similarity.iter_scores([], 0)) == []
+
+
+@pytest.mark.parametrize('seed, query_size', [
+    (4, 3),
+    (5, 8),
+])
+def test_iter_scores_5(seed, query_size):
+    """afterを指定すると，その数式から続きを返すことを確認するテスト。"""
+    rows = _random_rows(seed, query_size)
+    expected = list(similarity.iter_scores(rows, query_size))
+    for i in (0, 1, len(expected) // 2, len(expected) - 1):
+        expr_id, score = expected[i]
+        assert list(similarity.iter_scores(rows, query_size, after=(score, expr_id))) == expected[i:]
+
+
+@pytest.mark.parametrize('limit, offset', [
+    (5, 0),
+    (5, 10),
+    (None, 3),
+    (1000, 0),
+])
+def test_top_k_1(limit, offset):
+    """top_k()がsortした結果のoffset番目からlimit個と同じことを確認するテスト。"""
+    rows = _random_rows(4, 5)
+    expected = _sorted_scores(rows, 5)
+    stop = None if limit is None else offset + limit
+    assert similarity.top_k(rows, 5, limit, offset) == expected[offset:stop]
+
+
+def _stored_scores(seed: int) -> list[list]:
+    """search() stored functionの戻り値のように，順番を決めずに[['expr_id', 類似度], ...]を作る関数。
+    同じ類似度の数式を多く含む。
+    """
+    rng = random.Random(seed)
+    return [[str(expr_id), rng.choice([1.0, 0.5, 0.25, 0.2, 0.1])] for expr_id in rng.sample(range(1, 1000), 200)]
+
+
+@pytest.mark.parametrize('limit, offset', [
+    (5, 0),
+    (5, 10),
+    (None, 0),
+    (None, 3),
+    (1000, 0),
+])
+def test_rank_1(limit, offset):
+    """rank()が類似度の高い順，同じ場合はexpr_idの小さい順に並べた結果のoffset番目からlimit個と同じことを確認するテスト。"""
+    scores = _stored_scores(0)
+    expected = sorted(scores, key=lambda x: (-x[1], int(x[0])))
+    stop = None if limit is None else offset + limit
+    assert similarity.rank(scores, limit, offset) == expected[offset:stop]
+
+
+def test_iter_ranked_1():
+    """iter_ranked()が類似度の高い順，同じ場合はexpr_idの小さい順に返すことを確認するテスト。
+    stored functionが返す順番が変わっても，同じ順番になる。
+    """
+    scores = _stored_scores(1)
+    expected = sorted(((int(expr_id), score) for expr_id, score in scores), key=lambda x: (-x[1], x[0]))
+    assert list(similarity.iter_ranked(scores)) == expected
+    assert list(similarity.iter_ranked(reversed(scores))) == expected
+    assert list(similarity.iter_ranked([])) == []
+
+
+def test_iter_ranked_2():
+    """afterを指定すると，stored functionが返す順番が変わっても，その数式から続きを返すことを確認するテスト。
+    afterの数式がない場合は，同じ類似度でexpr_idがそれより大きい数式から返す。
+    """
+    scores = _stored_scores(2)
+    shuffled = random.Random(3).sample(scores, len(scores))
+    expected = list(similarity.iter_ranked(scores))
+    for i in (0, 1, len(expected) // 2, len(expected) - 1):
+        expr_id, score = expected[i]
+        assert list(similarity.iter_ranked(shuffled, after=(score, expr_id))) == expected[i:]
+    first = next(i for i, (_, score) in enumerate(expected) if score == 0.5)
+    assert list(similarity.iter_ranked(shuffled, after=(0.5, 0))) == expected[first:]
+
+
+def test_to_expr_ids_1():
+    """to_expr_ids()でJSON, list, arrayのexpr_idsを同じndarrayにすることを確認するテスト。"""
+    expected = [3, 10, 2000000000]
+    for expr_ids in (json.dumps(['3', '10', '2000000000']), json.dumps(expected).encode(), ['3', '10', '2000000000'], array('I', expected)):
+        assert similarity.to_expr_ids(expr_ids).tolist() == expected
+    assert similarity.to_expr_ids('[]').tolist() == []
+
+
+def test_score_csr_1():
+    """score_csr()で全ての数式の共通するpathの数と類似度をまとめて計算することを確認するテスト。"""
+    rows = [(3, ['1', '2', '3']), (3, ['1', '2']), (1, ['4'])]
+    expr_ids, scores = similarity.score_csr(*similarity.to_csr(rows), 2)
+    assert expr_ids.tolist() == [1, 2, 3, 4]
+    assert scores.tolist() == [2 / 3, 2 / 3, 1 / 4, 1 / 2]
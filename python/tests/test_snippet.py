@@ -2,7 +2,7 @@
 """module description
 """
 from twels.snippet.snippet import Snippet
-from twels.expr.expression import Expression
+from twels.expr.expression import Expression, ExpressionTable
 
 
 def test_snippet_str_1():
@@ -151,3 +151,43 @@ def test_clean_3():
     actual = Snippet(text)
     expected = 'This text will be green. Inline styles take precedence over CSS included externally. The style attribute can override it, though. '
     assert actual.text == expected
+
+
+def test_snippet_expr_table_1():
+    """ExpressionTableを使った場合と使わない場合で同じSnippetになることを確認するテスト。
+    数式で始まって終わる場合と，数式が連続する場合と，数式が取り除かれるタグの中にある場合。
+    """
+    mathml1 = """<math xmlns="http://www.w3.org/1998/Math/MathML" display="inline"><mrow><mn>1</mn><mo>+</mo><mn>2</mn></mrow></math>"""
+    mathml2 = """<math display="block">\n<semantics><mi>a</mi><annotation>a</annotation></semantics>\n</math>"""
+    body = (f'{mathml1}<p>ページの  説明。</p>{mathml2}{mathml1}<nav>{mathml2}</nav>'
+            f'<span class="katex"><span class="katex-html">a</span></span><!-- {mathml1} -->は数式です。{mathml2}')
+    expr_table = ExpressionTable()
+    actual = Snippet(body, expr_table=expr_table)
+    expected = Snippet(body)
+    assert actual.snippet == expected.snippet
+    assert actual.text == expected.text
+    assert expr_table.misses == 2
+    assert expr_table.hits == 4
+
+
+def test_snippet_expr_table_2():
+    """ExpressionTableで作ったExpressionがSnippetで使われることを確認するテスト。
+    """
+    mathml = """<math xmlns="http://www.w3.org/1998/Math/MathML" display="inline"><mrow><mn>1</mn><mo>+</mo><mn>2</mn></mrow></math>"""
+    expr_table = ExpressionTable()
+    expr = expr_table.get(mathml)
+    snippet = Snippet(f'ページの説明。{mathml}は数式です。', expr_table=expr_table)
+    assert snippet.snippet[1] is expr
+    assert expr_table.misses == 1
+    assert expr_table.hits == 1
+
+
+def test_snippet_lazy_1():
+    """lazy=Trueの場合は保存したsnippetをそのままtextにし，snippetは使うときに作ることを確認するテスト。
+    """
+    mathml = """<math xmlns="http://www.w3.org/1998/Math/MathML" display="inline"><mrow><mn>1</mn><mo>+</mo><mn>2</mn></mrow></math>"""
+    stored = str(Snippet(f'ページの説明。{mathml}は数式です。'))
+    snippet = Snippet(stored, clean=False, lazy=True)
+    assert snippet._snippet is None
+    assert str(snippet) == snippet.text == stored
+    assert snippet.snippet == Snippet(stored, clean=False).snippet
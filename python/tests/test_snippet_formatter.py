@@ -28,3 +28,17 @@ def test_format_1():
     actual = Formatter.format(snippet, expr_start_pos, expr_len)
     expected = f'数式<span class="hl">{expr.mathml}</span>は、乗算と呼ばれています。'
     assert expected == actual
+
+
+def test_format_2():
+    """長いsnippetで抜粋する範囲だけをハイライトした場合と，snippet全体をハイライトしてから抜粋した場合で，
+    同じ結果になることを確認。数式の位置が先頭に近い場合，途中の場合，最後の場合。
+    """
+    exprs = [Expression(f'<math><mi>x</mi><mo>+</mo><mn>{i}</mn></math>') for i in range(60)]
+    body = ''.join(f'{"あいうえお" * (i % 7 * 10)}{expr.mathml}' for i, expr in enumerate(exprs)) + 'です。'
+    snippet = Snippet(body, clean=False, lazy=True)
+    for i, expr in enumerate(exprs):
+        start_pos = snippet.search_expr_start_pos(expr)[0]
+        expr_len = len(expr.mathml)
+        highlighted = Formatter._highlight(snippet.text, start_pos, start_pos + expr_len)
+        assert Formatter.format(snippet, [start_pos], expr_len) == Formatter._excerpt(highlighted, start_pos)
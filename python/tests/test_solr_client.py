@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""module description
+"""
+import pysolr
+import pytest
+
+from twels.solr import client
+
+
+class _Kazoo:
+    """KazooClientの代わり。"""
+    def __init__(self):
+        self.stopped = False
+        self.closed = False
+
+    def stop(self):
+        self.stopped = True
+
+    def close(self):
+        self.closed = True
+
+
+class _ZooKeeper:
+    """pysolr.ZooKeeperの代わり。作られた回数を数える。"""
+    instances = []
+
+    def __init__(self, hosts, timeout=15):
+        self.hosts = hosts
+        self.timeout = timeout
+        self.zk = _Kazoo()
+        __class__.instances.append(self)
+
+    def getRandomURL(self, collname, only_leader=False):
+        return f'http://solr1:8983/solr/{collname}'
+
+
+@pytest.fixture
+def zookeeper(monkeypatch):
+    _ZooKeeper.instances = []
+    monkeypatch.setattr(pysolr, 'ZooKeeper', _ZooKeeper)
+    monkeypatch.setattr(client, '_client', None)
+    monkeypatch.setattr(client, '_client_pid', 0)
+    return _ZooKeeper
+
+
+def test_get_solr_client_1(zookeeper):
+    """2回目以降は同じclientを返し，ZooKeeperに1回だけ接続することを確認するテスト。"""
+    solr = client.get_solr_client()
+    assert client.get_solr_client() is solr
+    assert len(zookeeper.instances) == 1
+    assert solr.timeout == (client.CONNECT_TIMEOUT, client.READ_TIMEOUT)
+    assert solr.retry_count == client.RETRY_COUNT
+    adapter = solr.get_session().get_adapter('http://solr1:8983/solr')
+    assert adapter._pool_maxsize == client.POOL_SIZE
+    assert adapter.max_retries.total == 0
+
+
+def test_get_solr_client_2(zookeeper, monkeypatch):
+    """forkされたprocessでは新しいclientを作り，親プロセスの接続は閉じないことを確認するテスト。"""
+    solr = client.get_solr_client()
+    monkeypatch.setattr(client.os, 'getpid', lambda: -1)
+    assert client.get_solr_client() is not solr
+    assert len(zookeeper.instances) == 2
+
+    client.close_solr_client()
+    assert zookeeper.instances[1].zk.closed
+    assert not zookeeper.instances[0].zk.closed
+
+
+def test_close_solr_client_1(zookeeper):
+    """ZooKeeperの接続を閉じて，次に呼び出されたときに接続し直すことを確認するテスト。"""
+    solr = client.get_solr_client()
+    client.close_solr_client()
+    assert zookeeper.instances[0].zk.stopped
+    assert zookeeper.instances[0].zk.closed
+    assert client.get_solr_client() is not solr
+    client.close_solr_client()
+    client.close_solr_client()
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""module description
+"""
+from pathlib import Path
+
+import pysolr
+from scrapy.http import HtmlResponse
+
+from twels.solr import indexer
+from web_crawler.web_crawler.spiders import functions
+
+TEST_DATA_DIR = Path(__file__).resolve().parent / 'test_data'
+
+
+class _Solr:
+    """solr.add()，solr.commit()の呼び出しを記録するSolrの代わり。"""
+    def __init__(self, fail_on_add: int | None = None):
+        self.added = []
+        self.add_kwargs = []
+        self.commits = 0
+        self.fail_on_add = fail_on_add
+
+    def add(self, docs, **kwargs):
+        if self.fail_on_add is not None and len(self.add_kwargs) == self.fail_on_add:
+            raise pysolr.SolrError('cannot add')
+        self.added.append([doc['id'] for doc in docs])
+        self.add_kwargs.append(kwargs)
+
+    def commit(self):
+        self.commits += 1
+
+
+def _make_pages(tmp_path, names: list[str]) -> list[str]:
+    paths = []
+    for name in names:
+        path = tmp_path / name
+        # 空のファイルは抽出に失敗する。
+        text = '' if name.startswith('broken') else f'<html><head><title>{name}</title></head><body>{name}</body></html>'
+        path.write_text(text, encoding='utf-8')
+        paths.append(str(path))
+    return paths
+
+
+def test_index_pages_1(tmp_path, monkeypatch):
+    """それぞれのドキュメントを1回だけbatch_size個ずつ送り，最後に1回だけcommitすることを確認するテスト。
+    抽出に失敗したページは登録しない。
+    """
+    monkeypatch.setattr(indexer, 'WEB_PAGES_DIR', tmp_path)
+    names = [f'{i:02d}.html' for i in range(7)] + ['broken.html']
+    paths = _make_pages(tmp_path, names)
+    solr = _Solr()
+
+    assert indexer.index_pages(solr, paths, workers=3, batch_size=3, commit_within=1000)
+    assert solr.added == [['00.html', '01.html', '02.html'], ['03.html', '04.html', '05.html'], ['06.html']]
+    assert all(kwargs == {'commit': False, 'commitWithin': 1000} for kwargs in solr.add_kwargs)
+    assert solr.commits == 1
+
+
+def test_index_pages_2(tmp_path, monkeypatch):
+    """solr.add()に失敗したら，それ以降のbatchを送らずにcommitもしないことを確認するテスト。"""
+    monkeypatch.setattr(indexer, 'WEB_PAGES_DIR', tmp_path)
+    paths = _make_pages(tmp_path, [f'{i:02d}.html' for i in range(6)])
+    solr = _Solr(fail_on_add=1)
+
+    assert not indexer.index_pages(solr, paths, workers=2, batch_size=2, commit_within=1000)
+    assert solr.added == [['00.html', '01.html']]
+    assert solr.commits == 0
+
+
+def test_parse_doc_1():
+    """Wikipediaのページからタイトル，URL，本文のテキストを抽出することを確認するテスト。
+    本文のテキストはspiderがpage tableに保存するsnippetと同じ。
+    """
+    path = TEST_DATA_DIR / '方程式 - Wikipedia.html'
+    doc = indexer.parse_doc(str(path), 'wiki/方程式.html')
+    response = HtmlResponse(url=f'file://{path}', body=path.read_bytes())
+    assert doc['id'] == 'wiki/方程式.html'
+    assert doc['title'] == functions.get_title(response)
+    assert doc['url'] == 'https://ja.wikipedia.org/wiki/%E6%96%B9%E7%A8%8B%E5%BC%8F'
+    assert doc['lang'] == functions.get_lang(response)
+    assert doc['content'] == functions.get_snippet(response).text
+
+
+def test_parse_doc_2(tmp_path):
+    """canonicalのlinkタグがなければog:urlやld+jsonからURLを取得し，ないフィールドは送らないことを確認するテスト。
+    langがない場合はDEFAULT_LANGにする。
+    """
+    path = tmp_path / 'a.html'
+    path.write_text('<html><head><meta property="og:url" content="https://example.com/og">'
+                    '<meta name="description" content="説明"></head><body><p>a</p></body></html>', encoding='utf-8')
+    assert indexer.parse_doc(str(path), 'a.html') == {
+        'id': 'a.html', 'description': '説明', 'url': 'https://example.com/og', 'lang': indexer.DEFAULT_LANG,
+        'content': 'a'
+    }
+
+    path.write_text('<html><head><script type="application/ld+json">{"url": "https://example.com/ld"}</script>'
+                    '</head><body><p>a</p></body></html>', encoding='utf-8')
+    assert indexer.parse_doc(str(path), 'a.html')['url'] == 'https://example.com/ld'
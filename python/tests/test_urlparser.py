@@ -93,3 +93,17 @@ def test_parse_url_7():
     }
     actual = parse_url(query)
     assert actual == expected
+
+
+def test_parse_url_after_1():
+    """URLが検索結果の続きのtokenを含むとき。startも残す。
+    """
+    query = 'q=a&start=10&after=WyJhYmMiLDEwXQ&lr=ja'
+    expected = {
+        'q': ['a'],
+        'start': ['10'],
+        'lr': ['ja'],
+        'after': ['WyJhYmMiLDEwXQ']
+    }
+    actual = parse_url(query)
+    assert actual == expected
@@ -4,14 +4,18 @@
 
 import json
 import os
+import threading
+from collections.abc import Iterator
 from contextlib import contextmanager
 from pathlib import Path
 
 import environ
 import mysql.connector
 
+from twels.database.pool import ConnectionPool
 from twels.expr.expression import Expression
 from twels.indexer.info import Info
+from twels.searcher import similarity
 from twels.snippet.snippet import Snippet
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -21,6 +25,34 @@ environ.Env.read_env(os.path.join(BASE_DIR.parent, '.env'))
 env = environ.Env()
 
 
+class CountingCursor:
+    """実行したqueryの数（データベースとの往復の回数）を数えるためのcursorのwrapper．
+    Notes:
+        executemany()はINSERT文とREPLACE文の場合は1つのqueryにまとめられるので1回と数え，
+        それ以外の場合はparameterの数だけ数える．
+    """
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        Cursor.add_query_count(1)
+        return self._cursor.execute(operation, params, *args, **kwargs)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        seq_params = list(seq_params)
+        if operation.lstrip()[:7].upper() in ('INSERT ', 'REPLACE'):
+            Cursor.add_query_count(1 if seq_params else 0)
+        else:
+            Cursor.add_query_count(len(seq_params))
+        return self._cursor.executemany(operation, seq_params, *args, **kwargs)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
 class Cursor:
     """Databaseと接続するためのクラス．
     """
@@ -45,6 +77,47 @@ class Cursor:
         'connection_timeout': 100  # second
     }
 
+    # connection poolの設定
+    pool_config = {
+        'size': env.int('DB_POOL_SIZE', default=5),
+        'idle_timeout': env.float('DB_POOL_IDLE_TIMEOUT', default=300),  # second
+        'health_check_interval': env.float('DB_POOL_HEALTH_CHECK_INTERVAL', default=30),  # second
+        'wait_timeout': env.float('DB_POOL_WAIT_TIMEOUT', default=30)  # second
+    }
+
+    # in-memoryのpath_dictionaryの設定．詳しくはtwels/searcher/path_index.pyを参照．
+    # enabledがTrueのときは，Indexerがpath_change tableにpath_dictionaryの変更を記録する．
+    path_index_config = {
+        'enabled': env.bool('PATH_INDEX_ENABLED', default=False),
+        'poll_interval': env.float('PATH_INDEX_POLL_INTERVAL', default=1),  # second
+        # 後からcommitされた小さいchange_idの変更を読み込むために，もう一度読み込むchange_idの数．
+        'poll_window': env.int('PATH_INDEX_POLL_WINDOW', default=10000)
+    }
+
+    # mmapで読み込む数式のindexのsegmentを置くdirectory．詳しくはtwels/segment/segment_set.pyを参照．
+    # 空の場合はsegmentを使わない．
+    # segmentを使う場合，Indexerはpath_dictionaryの代わりにsegmentの差分を書き込む．
+    segment_config = {
+        'dir': env.str('SEGMENT_DIR', default=''),
+        'test_dir': env.str('SEGMENT_TEST_DIR', default=''),
+        'merge_factor': env.int('SEGMENT_MERGE_FACTOR', default=4)
+    }
+
+    # key: test, value: ConnectionPool．プロセス全体で共有する．
+    _pools: dict[bool, ConnectionPool] = {}
+    _pools_lock = threading.Lock()
+    # スレッドごとに使用中のconnectionと実行したqueryの数．
+    # connectionはconnect()を入れ子で呼び出したときに使い回す．
+    _local = threading.local()
+
+    # multi-row statementで1度に扱うレコードの数
+    batch_size = 500
+
+    @staticmethod
+    def add_query_count(n: int):
+        """このスレッドで実行したqueryの数を加算する関数．"""
+        __class__._local.query_count = __class__.get_query_count() + n
+
     @staticmethod
     def append_expr_id_if_not_registered(cursor, expr_id: int, expr_path: str, expr_size: int):
         """path_dictionaryのexpr_pathに対応するexpr_idsにexpr_idが未登録であれば登録する関数．
@@ -75,6 +148,14 @@ class Cursor:
         """
         cursor.execute('DELETE FROM inverted_index WHERE expr_id = %s LIMIT 1', (expr_id,))
 
+    @staticmethod
+    def delete_from_inverted_index_where_expr_id_in(cursor, expr_ids: list[int]):
+        """inverted_index tableのexpr_idが一致するレコードをまとめて削除する関数．
+        """
+        for chunk in __class__._chunks(expr_ids):
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f'DELETE FROM inverted_index WHERE expr_id IN ({placeholders})', chunk)
+
     @staticmethod
     def delete_from_page_where_uri_id_1(cursor, uri_id: int):
         """page tableのuri_idが一致するレコードを削除する関数．
@@ -92,6 +173,17 @@ class Cursor:
             (expr_path, expr_size)
             )
 
+    @staticmethod
+    def delete_from_path_dictionary_where_expr_path_and_size_in(cursor, keys: list[tuple[str, int]]):
+        """path_dictionary tableの(expr_path, expr_size)が一致するレコードをまとめて削除する関数．
+        """
+        for chunk in __class__._chunks(keys):
+            placeholders = ', '.join(['(%s, %s)'] * len(chunk))
+            cursor.execute(
+                f'DELETE FROM path_dictionary WHERE (expr_path, expr_size) IN ({placeholders})',
+                [v for key in chunk for v in key]
+                )
+
     @staticmethod
     def get_cleaned_path(path: str) -> str:
         """ '"$[2]"'のような文字列から無駄なダブルクォーテーションを削除して返す関数．
@@ -100,9 +192,69 @@ class Cursor:
         return tmp[:-1]
 
     @staticmethod
-    def insert_into_page_values_1_2_3_4(cursor, uri: str, exprs: list[Expression], title: str, snippet: Snippet):
+    def get_query_count() -> int:
+        """このスレッドで実行したqueryの数を返す関数．
+        Cursor.cursor()で作成したcursorで実行したqueryだけを数える．
+        """
+        return getattr(__class__._local, 'query_count', 0)
+
+    @staticmethod
+    def insert_into_inverted_index_values_many(cursor, rows: list[tuple[Expression, int, Info]]):
+        """inverted_index tableに複数のレコードを1つのqueryで登録する関数．
+        Args:
+            rows: [(expr, expr_size, info), ...]
+        """
+        query = 'INSERT INTO inverted_index (expr, expr_len, expr_size, info) VALUES (%s, %s, %s, %s)'
+        for chunk in __class__._chunks(rows):
+            cursor.executemany(query, [
+                (expr.mathml, len(expr.mathml), expr_size, info.to_bytes()) for expr, expr_size, info in chunk
+                ])
+
+    @staticmethod
+    def insert_into_page_values_1_2_3_4(cursor, uri: str, exprs: list[Expression], title: str, snippet: Snippet) -> int:
+        """page tableにレコードを登録する関数．
+        Returns:
+            登録したレコードのuri_id．
+        """
         exprs_str = __class__._make_exprs_json_serializable(exprs)
         cursor.execute('INSERT INTO page (uri, exprs, title, snippet) VALUES (%s, %s, %s, %s)', (uri, json.dumps(exprs_str), title, str(snippet)))
+        return cursor.lastrowid
+
+    @staticmethod
+    def insert_into_page_values_many(cursor, rows: list[tuple[str, list[Expression], str, Snippet]]):
+        """page tableに複数のレコードを1つのqueryで登録する関数．
+        Args:
+            rows: [(uri, exprs, title, snippet), ...]
+        """
+        query = 'INSERT INTO page (uri, exprs, title, snippet) VALUES (%s, %s, %s, %s)'
+        for chunk in __class__._chunks(rows):
+            cursor.executemany(query, [
+                (uri, json.dumps(__class__._make_exprs_json_serializable(exprs)), title, str(snippet))
+                for uri, exprs, title, snippet in chunk
+                ])
+
+    @staticmethod
+    def insert_into_path_change_values_many(cursor, rows: list[tuple[str, int, int, bool]]):
+        """path_change tableにpath_dictionaryの変更を複数まとめて記録する関数．
+        Args:
+            rows: [(expr_path, expr_size, expr_id, is_added), ...]
+                is_added: expr_idsにexpr_idを追加した場合はTrue，削除した場合はFalse．
+        """
+        query = 'INSERT INTO path_change (expr_path, expr_size, expr_id, is_added) VALUES (%s, %s, %s, %s)'
+        for chunk in __class__._chunks(rows):
+            cursor.executemany(query, chunk)
+
+    @staticmethod
+    def insert_into_path_dictionary_values_many(cursor, rows: list[tuple[str, int, list[str]]]):
+        """path_dictionary tableに複数のレコードを1つのqueryで登録する関数．
+        Args:
+            rows: [(expr_path, expr_size, expr_ids), ...]
+        """
+        query = 'INSERT INTO path_dictionary (expr_path, expr_size, expr_ids) VALUES (%s, %s, %s)'
+        for chunk in __class__._chunks(rows):
+            cursor.executemany(query, [
+                (expr_path, expr_size, json.dumps(expr_ids)) for expr_path, expr_size, expr_ids in chunk
+                ])
 
     @staticmethod
     def remove_expr_id_from_path_dictionary(cursor, expr_id: int, expr_path: str, expr_size: int) -> list:
@@ -125,41 +277,53 @@ class Cursor:
         return json.loads(cursor.fetchone()[0])
 
     @staticmethod
-    def remove_info_from_inverted_index(cursor, expr: Expression, uri_id: int) -> Info:
+    def remove_info_from_inverted_index(cursor, expr: Expression, uri_id: int) -> Info | None:
         """削除する数式とuri_idをもとにinverted_indexのinfoの該当箇所を削除する関数
+        Returns:
+            削除した後のinfo．inverted_indexにその数式のレコードがない場合は何もせずにNoneを返す．
         """
-        query = """
-        SELECT remove_info(%(expr)s, %(uri_id)s)
-        """
-        data = {
-            'expr': expr.mathml,
-            'uri_id': str(uri_id)
-        }
-        cursor.execute(query, data)
-        info_dict: dict = json.loads(cursor.fetchone()[0])
-        return Info(info_dict)
+        cursor.execute('SELECT info FROM inverted_index WHERE expr = %s FOR UPDATE', (expr.mathml,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        info = Info.loads(row[0])
+        info.remove_page(uri_id)
+        cursor.execute('UPDATE inverted_index SET info = %s WHERE expr = %s', (info.to_bytes(), expr.mathml))
+        return info
 
     @staticmethod
-    def search(cursor, path_set: set[str]) -> list:
-        """[['expr_id', degree of similarity], ...]を返す関数。
+    def reset_query_count():
+        """このスレッドで実行したqueryの数を0にする関数．"""
+        __class__._local.query_count = 0
+
+    @staticmethod
+    def search(cursor, path_set: set[str], limit: int | None = None, offset: int = 0) -> list:
+        """類似度の高い順にoffset番目からlimit個の[['expr_id', degree of similarity], ...]を返す関数。
         e.g. [['10', 0.8], ['3', 0.7], ['23', 0.4]]
+        limitがNoneの場合は全ての数式を返す。
+        Notes:
+            類似度はsearch() stored functionが計算したもの。類似度が同じ場合はexpr_idの小さい順。
+            全ての数式をsortするのではなく，heapq.nsmallest()で上位offset + limit個だけを選ぶ。
         """
-        query = """
-        SELECT search(%(path_set)s)
-        """
-        data = {
-            'path_set': json.dumps(list(path_set))
-        }
-        cursor.execute(query, data)
-        similarity = json.loads(cursor.fetchone()[0])
-        sorted_similarity = sorted(similarity, key=lambda x: x[1], reverse=True)
-        return sorted_similarity
+        return similarity.rank(__class__.select_search(cursor, path_set), limit, offset)
 
     @staticmethod
     def select_all_from_index_where_expr_id_1(cursor, expr_id: int) -> tuple | None:
         cursor.execute('SELECT * FROM inverted_index WHERE expr_id = %s', (expr_id,))
         return cursor.fetchone()
 
+    @staticmethod
+    def select_all_from_inverted_index(cursor) -> Iterator[tuple[int, int, int, Info]]:
+        """inverted_index tableの全てのレコードを返すgenerator．
+        全てのレコードをまとめてlistにしないように，batch_size個ずつ取得する．
+        Returns:
+            (expr_id, expr_len, expr_size, info)
+        """
+        cursor.execute('SELECT expr_id, expr_len, expr_size, info FROM inverted_index')
+        while rows := cursor.fetchmany(__class__.batch_size):
+            for expr_id, expr_len, expr_size, info in rows:
+                yield expr_id, expr_len, expr_size, Info.loads(info)
+
     @staticmethod
     def select_all_from_page_where_uri_id_1(cursor, uri_id: int) -> tuple | None:
         cursor.execute('SELECT * FROM page WHERE uri_id = %s', (uri_id,))
@@ -169,6 +333,29 @@ class Cursor:
         else:
             return tpl
 
+    @staticmethod
+    def select_all_from_path_change_where_change_id_gt(cursor, change_id: int) -> list[tuple[int, str, int, int, bool]]:
+        """path_change tableのchange_idより後に記録された変更を記録した順に取得する関数．
+        Returns:
+            [(change_id, expr_path, expr_size, expr_id, is_added), ...]
+        """
+        cursor.execute(
+            'SELECT change_id, expr_path, expr_size, expr_id, is_added FROM path_change WHERE change_id > %s ORDER BY change_id',
+            (change_id,)
+            )
+        return [(change_id, expr_path, expr_size, expr_id, bool(is_added)) for change_id, expr_path, expr_size, expr_id, is_added in cursor.fetchall()]
+
+    @staticmethod
+    def select_all_from_path_dictionary(cursor) -> Iterator[tuple[str, int, str]]:
+        """path_dictionary tableの全てのレコードを返すgenerator．
+        全てのレコードをまとめてlistにしないように，batch_size個ずつ取得する．
+        Returns:
+            (expr_path, expr_size, expr_ids): expr_idsはJSONの文字列のまま返す．
+        """
+        cursor.execute('SELECT expr_path, expr_size, expr_ids FROM path_dictionary')
+        while rows := cursor.fetchmany(__class__.batch_size):
+            yield from rows
+
     @staticmethod
     def select_expr_from_inverted_index_where_expr_id_1(cursor, expr_id: int) -> str | None:
         cursor.execute('SELECT expr FROM inverted_index WHERE expr_id = %s', (expr_id,))
@@ -178,6 +365,16 @@ class Cursor:
         else:
             return tpl[0]
 
+    @staticmethod
+    def select_expr_id_and_expr_size_and_info_from_inverted_index_where_expr_1(cursor, expr: Expression) -> tuple[int, int, Info] | None:
+        """inverted_index tableのexprが一致するレコードの(expr_id, expr_size, info)を取得する関数．"""
+        cursor.execute('SELECT expr_id, expr_size, info FROM inverted_index WHERE expr = %s', (expr.mathml,))
+        tpl = cursor.fetchone()
+        if tpl is None:
+            return None
+        expr_id, expr_size, info = tpl
+        return expr_id, expr_size, Info.loads(info)
+
     @staticmethod
     def select_expr_id_from_inverted_index_where_expr_1(cursor, expr: Expression) -> int | None:
         cursor.execute('SELECT expr_id FROM inverted_index WHERE expr = %s', (expr.mathml,))
@@ -188,19 +385,108 @@ class Cursor:
             return tpl[0]
 
     @staticmethod
-    def select_info_from_inverted_index_where_expr_id_1(cursor, expr_id: int) -> dict[str, list[str]] | None:
+    def select_expr_size_and_expr_ids_from_path_dictionary_where_expr_path_in(cursor, expr_paths: list[str]) -> list[tuple[int, str]]:
+        """path_dictionary tableのexpr_pathが一致するレコードのexpr_sizeとexpr_idsをまとめて取得する関数．
+        expr_idsはJSONの文字列のまま返す．必要になったときにsimilarity.iter_scores()が読み込む．
+        Returns:
+            [(expr_size, expr_ids), ...]
+        """
+        result = []
+        for chunk in __class__._chunks(expr_paths):
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f'SELECT expr_size, expr_ids FROM path_dictionary WHERE expr_path IN ({placeholders})', chunk)
+            result.extend(cursor.fetchall())
+        return result
+
+    @staticmethod
+    def select_for_update_from_inverted_index_where_expr_in(cursor, exprs: list[Expression]) -> dict[str, tuple[int, int, Info]]:
+        """inverted_index tableのexprが一致するレコードをまとめて取得して，ロックする関数．
+        Returns:
+            {mathml: (expr_id, expr_size, info), ...}
+        """
+        result = {}
+        for chunk in __class__._chunks([expr.mathml for expr in exprs]):
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(
+                f'SELECT expr_id, expr, expr_size, info FROM inverted_index WHERE expr IN ({placeholders}) FOR UPDATE',
+                chunk
+                )
+            for expr_id, mathml, expr_size, info_str in cursor.fetchall():
+                result[mathml] = (expr_id, expr_size, Info.loads(info_str))
+        return result
+
+    @staticmethod
+    def select_for_update_from_path_dictionary_where_expr_path_and_size_in(cursor, keys: list[tuple[str, int]]) -> dict[tuple[str, int], list[str]]:
+        """path_dictionary tableの(expr_path, expr_size)が一致するレコードをまとめて取得して，ロックする関数．
+        Returns:
+            {(expr_path, expr_size): expr_ids, ...}
+        """
+        result = {}
+        for chunk in __class__._chunks(keys):
+            placeholders = ', '.join(['(%s, %s)'] * len(chunk))
+            cursor.execute(
+                f'SELECT expr_path, expr_size, expr_ids FROM path_dictionary WHERE (expr_path, expr_size) IN ({placeholders}) FOR UPDATE',
+                [v for key in chunk for v in key]
+                )
+            for expr_path, expr_size, expr_ids in cursor.fetchall():
+                result[(expr_path, expr_size)] = json.loads(expr_ids)
+        return result
+
+    @staticmethod
+    def select_generation_from_index_generation(cursor) -> int:
+        """indexのgenerationを返す関数．Indexerがデータベースを更新するたびに1増える．"""
+        cursor.execute('SELECT generation FROM index_generation WHERE id = 1')
+        row = cursor.fetchone()
+        return 0 if row is None else row[0]
+
+    @staticmethod
+    def select_info_from_inverted_index_where_expr_id_1(cursor, expr_id: int) -> Info | None:
         cursor.execute('SELECT info FROM inverted_index WHERE expr_id = %s', (expr_id,))
         tpl = cursor.fetchone()
         if tpl is None:
             return None
         else:
-            return json.loads(tpl[0])
+            return Info.loads(tpl[0])
 
     @staticmethod
     def select_info_and_len_from_inverted_index_where_expr_id_1(cursor, expr_id: int) -> tuple[Info, int]:
         cursor.execute('SELECT info, expr_len FROM inverted_index WHERE expr_id = %s', (expr_id,))
         info_str, expr_len = cursor.fetchone()
-        return Info(json.loads(info_str)), expr_len
+        return Info.loads(info_str), expr_len
+
+    @staticmethod
+    def select_info_and_len_from_inverted_index_where_expr_id_in(cursor, expr_ids: list[int]) -> dict[int, tuple[Info, int]]:
+        """inverted_index tableのexpr_idが一致するレコードのinfoとexpr_lenをまとめて取得する関数．
+        Returns:
+            {expr_id: (info, expr_len), ...}
+        """
+        result = {}
+        for chunk in __class__._chunks(expr_ids):
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f'SELECT expr_id, info, expr_len FROM inverted_index WHERE expr_id IN ({placeholders})', chunk)
+            for expr_id, info_str, expr_len in cursor.fetchall():
+                result[expr_id] = (Info.loads(info_str), expr_len)
+        return result
+
+    @staticmethod
+    def select_max_change_id_from_path_change(cursor) -> int:
+        """path_change tableに最後に記録された変更のchange_idを返す関数．記録がない場合は0．"""
+        cursor.execute('SELECT COALESCE(MAX(change_id), 0) FROM path_change')
+        return cursor.fetchone()[0]
+
+    @staticmethod
+    def select_search(cursor, path_set: set[str]) -> list:
+        """search() stored functionが返す[['expr_id', degree of similarity], ...]をそのまま返す関数。
+        順番は類似度の順ではない。並べるときはsimilarity.rank()やsimilarity.iter_ranked()を使う。
+        """
+        query = """
+        SELECT search(%(path_set)s)
+        """
+        data = {
+            'path_set': json.dumps(list(path_set))
+        }
+        cursor.execute(query, data)
+        return json.loads(cursor.fetchone()[0])
 
     @staticmethod
     def select_uri_id_and_exprs_from_page_where_uri_1(cursor, uri: str) -> tuple[int | None, set[Expression]]:
@@ -213,6 +499,20 @@ class Cursor:
             exprs_str = json.loads(tpl[1])
             return tpl[0], set(map(Expression, exprs_str))
 
+    @staticmethod
+    def select_uri_id_and_exprs_from_page_where_uri_in(cursor, uris: list[str]) -> dict[str, tuple[int, set[Expression]]]:
+        """page tableのuriが一致するレコードをまとめて取得する関数．
+        Returns:
+            {uri: (uri_id, exprs), ...}
+        """
+        result = {}
+        for chunk in __class__._chunks(uris):
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f'SELECT uri, uri_id, exprs FROM page WHERE uri IN ({placeholders})', chunk)
+            for uri, uri_id, exprs_str in cursor.fetchall():
+                result[uri] = (uri_id, set(map(Expression, json.loads(exprs_str))))
+        return result
+
     @staticmethod
     def select_uri_id_from_page_where_uri_1(cursor, uri: str) -> int | None:
         cursor.execute('SELECT uri_id FROM page WHERE uri = %s', (uri,))
@@ -222,22 +522,60 @@ class Cursor:
         else:
             return tpl[0]
 
+    @staticmethod
+    def select_uri_id_from_page_where_uri_id_in(cursor, uri_ids: list[int]) -> set[int]:
+        """page tableに登録されているuri_idをまとめて取得する関数．
+        Returns:
+            uri_idsのうち，page tableに登録されているものの集合．
+        """
+        result = set()
+        for chunk in __class__._chunks(uri_ids):
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f'SELECT uri_id FROM page WHERE uri_id IN ({placeholders})', chunk)
+            result.update(uri_id for uri_id, in cursor.fetchall())
+        return result
+
+    @staticmethod
+    def select_uri_id_from_page_where_uri_in(cursor, uris: list[str]) -> dict[str, int]:
+        """page tableのuriが一致するレコードのuri_idをまとめて取得する関数．
+        Returns:
+            {uri: uri_id, ...}
+        """
+        result = {}
+        for chunk in __class__._chunks(uris):
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f'SELECT uri, uri_id FROM page WHERE uri IN ({placeholders})', chunk)
+            result.update(cursor.fetchall())
+        return result
+
+    @staticmethod
+    def select_uri_title_snippet_from_page_where_uri_id_in(cursor, uri_ids: list[int]) -> dict[int, tuple[str, str, str]]:
+        """page tableのuri_idが一致するレコードのuri, title, snippetをまとめて取得する関数．
+        Returns:
+            {uri_id: (uri, title, snippet), ...}
+        """
+        result = {}
+        for chunk in __class__._chunks(uri_ids):
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f'SELECT uri_id, uri, title, snippet FROM page WHERE uri_id IN ({placeholders})', chunk)
+            for uri_id, uri, title, snippet in cursor.fetchall():
+                result[uri_id] = (uri, title, snippet)
+        return result
+
     @staticmethod
     def select_json_search_uri_id_1_from_inverted_index_where_expr_2(cursor, uri_id: int, expr: Expression) -> str | None:
         """inverted_indexのinfo内の指定されたuri_idへのpathを返す．
-        TODO: inverted_index tableのinfo内にuri_id以外で数字を保存すると，この関数はそのpathを返してしまう．
-              それへの対応．
+        infoはbinaryで保存されているのでJSON_SEARCH()は使えない．
+        Infoに変換してから，JSONにした場合のpathを返す．
         """
-        cursor.execute(
-                'SELECT JSON_SEARCH(info, "one", %s) FROM inverted_index WHERE expr = %s',
-                (uri_id, expr.mathml)
-                )
-        json_path = cursor.fetchone()[0]
-        if json_path is None:
+        cursor.execute('SELECT info FROM inverted_index WHERE expr = %s', (expr.mathml,))
+        tpl = cursor.fetchone()
+        if tpl is None:
             return None
-        else:
-            # '"$.uri_id[0]"'のような形になっているので，先頭と末尾の無駄なダブルクォーテーションを削除．
-            return __class__.get_cleaned_path(json_path)
+        uri_id_list = Info.loads(tpl[0]).uri_id_list
+        if str(uri_id) not in uri_id_list:
+            return None
+        return f'$.uri_id[{uri_id_list.index(str(uri_id))}]'
 
     @staticmethod
     def update_index(cursor, expr: Expression, expr_size: int, info: Info) -> tuple[int, bool]:
@@ -249,19 +587,27 @@ class Cursor:
         Returns:
             (expr_id, was_registered): was_registeredは数式が登録済みのときにTrueを返す．
         """
-        query = """
-        SELECT update_index(%(expr)s, %(expr_len)s, %(expr_size)s, %(info)s)
-        """
+        cursor.execute('SELECT expr_id, info FROM inverted_index WHERE expr = %s FOR UPDATE', (expr.mathml,))
+        tpl = cursor.fetchone()
+        if tpl is None:
+            cursor.execute(
+                'INSERT INTO inverted_index (expr, expr_len, expr_size, info) VALUES (%s, %s, %s, %s)',
+                (expr.mathml, len(expr.mathml), expr_size, info.to_bytes())
+                )
+            return cursor.lastrowid, False
 
-        data = {
-            'expr': expr.mathml,
-            'expr_len': len(expr.mathml),
-            'expr_size': expr_size,
-            'info': info.dumps()
-        }
-        cursor.execute(query, data)
-        d: dict = json.loads(cursor.fetchone()[0])
-        return d['expr_id'], d['was_registered']
+        expr_id, info_str = tpl
+        registered_info = Info.loads(info_str)
+        for uri_id, lang, expr_start_pos in info.pages():
+            registered_info.add_page(uri_id, lang, expr_start_pos)
+        cursor.execute('UPDATE inverted_index SET info = %s WHERE expr_id = %s', (registered_info.to_bytes(), expr_id))
+        return expr_id, True
+
+    @staticmethod
+    def update_index_generation_set_generation_plus_1(cursor):
+        """indexのgenerationを1増やす関数．Searcherが保存した検索結果を使わないようにするために呼び出す．"""
+        cursor.execute('INSERT INTO index_generation (id, generation) VALUES (1, 1) '
+                       'ON DUPLICATE KEY UPDATE generation = generation + 1')
 
     @staticmethod
     def update_inverted_index_set_info_1_where_expr_2(cursor, info_json: str, expr: Expression):
@@ -271,12 +617,44 @@ class Cursor:
     def update_inverted_index_set_info_1_where_expr_id_2(cursor, info_json: str, expr_id: int):
         cursor.execute('UPDATE inverted_index SET info = %s WHERE expr_id = %s', (info_json, expr_id))
 
+    @staticmethod
+    def update_inverted_index_set_info_many(cursor, rows: list[tuple[int, Info]]):
+        """inverted_index tableの複数のレコードのinfoを1つのqueryで更新する関数．
+        Args:
+            rows: [(expr_id, info), ...]
+        """
+        for chunk in __class__._chunks(rows):
+            cases = ' '.join(['WHEN %s THEN %s'] * len(chunk))
+            placeholders = ', '.join(['%s'] * len(chunk))
+            params = [v for expr_id, info in chunk for v in (expr_id, info.to_bytes())]
+            params.extend(expr_id for expr_id, _ in chunk)
+            cursor.execute(
+                f'UPDATE inverted_index SET info = CASE expr_id {cases} END WHERE expr_id IN ({placeholders})',
+                params
+                )
+
     @staticmethod
     def update_page_set_exprs_1_title_2_snippet_3_where_uri_id_4(cursor, exprs: list[Expression], title: str, snippet: Snippet, uri_id: int):
         exprs_str = __class__._make_exprs_json_serializable(exprs)
         query = 'UPDATE page SET exprs = %s, title = %s, snippet = %s WHERE uri_id = %s'
         cursor.execute(query, (json.dumps(exprs_str), title, str(snippet), uri_id))
 
+    @staticmethod
+    def update_path_dictionary_set_expr_ids_many(cursor, rows: list[tuple[str, int, list[str]]]):
+        """path_dictionary tableの複数のレコードのexpr_idsを1つのqueryで更新する関数．
+        Args:
+            rows: [(expr_path, expr_size, expr_ids), ...]
+        """
+        for chunk in __class__._chunks(rows):
+            cases = ' '.join(['WHEN expr_path = %s AND expr_size = %s THEN %s'] * len(chunk))
+            placeholders = ', '.join(['(%s, %s)'] * len(chunk))
+            params = [v for expr_path, expr_size, expr_ids in chunk for v in (expr_path, expr_size, json.dumps(expr_ids))]
+            params.extend(v for expr_path, expr_size, _ in chunk for v in (expr_path, expr_size))
+            cursor.execute(
+                f'UPDATE path_dictionary SET expr_ids = CASE {cases} END WHERE (expr_path, expr_size) IN ({placeholders})',
+                params
+                )
+
     @staticmethod
     def uri_is_already_registered(cursor, uri: str) -> bool:
         """page tableに指定したuriのレコードがあればTrueを返す関数．
@@ -286,26 +664,68 @@ class Cursor:
 
     @contextmanager
     def connect(test: bool = False):
-        """データベースに接続してconnectionを返す関数．エラーが発生してもちゃんとclose()する．
+        """データベースに接続してconnectionを返す関数．エラーが発生してもちゃんとpoolに戻す．
         Args:
             test: testのときにはTrueにする．
+        Notes:
+            connectionはconnection poolから取り出し，使用後はpoolに戻す．
+            同じスレッドでconnect()を入れ子で呼び出した場合は，外側と同じconnectionを使う．
+            なので，1ページの登録や1回の検索の処理全体をconnect()で囲むと，
+            その中ではconnectionを1つだけ使うようになる．
         """
+        pinned: dict = __class__._local.__dict__.setdefault('pinned', {})
+        if test in pinned:
+            yield pinned[test]
+            return
+
         # enter method
-        if test:
-            cnx = mysql.connector.connect(**__class__.config_for_test)
-        else:
-            cnx = mysql.connector.connect(**__class__.config_for_dev)
-        yield cnx
-        cnx.close()  # exit method
+        pool = __class__.get_pool(test)
+        cnx = pool.acquire()
+        pinned[test] = cnx
+        discard = False
+        try:
+            yield cnx
+        except (mysql.connector.errors.InterfaceError, mysql.connector.errors.OperationalError):
+            # 接続が切れている可能性があるので，poolには戻さない．
+            discard = True
+            raise
+        finally:
+            del pinned[test]
+            pool.release(cnx, discard=discard)  # exit method
+
+    @staticmethod
+    def get_pool(test: bool = False) -> ConnectionPool:
+        """プロセス全体で共有するconnection poolを返す関数．
+        Args:
+            test: testのときにはTrueにする．
+        """
+        pool = __class__._pools.get(test)
+        if pool is not None:
+            return pool
+        with __class__._pools_lock:
+            if test not in __class__._pools:
+                config = __class__.config_for_test if test else __class__.config_for_dev
+                __class__._pools[test] = ConnectionPool(
+                    lambda: mysql.connector.connect(**config), **__class__.pool_config
+                    )
+            return __class__._pools[test]
 
     @contextmanager
     def cursor(cnx):
         """cursorを返す関数．エラーが発生してもちゃんとclose()する．
         """
         # TODO: 可能であればPrepared Statementにする．
-        c = cnx.cursor()
-        yield c
-        c.close()  # exit method
+        c = CountingCursor(cnx.cursor())
+        try:
+            yield c
+        finally:
+            c.close()  # exit method
+
+    @staticmethod
+    def _chunks(seq: list, size: int | None = None) -> list[list]:
+        """multi-row statementの長さを制限するためにseqをsize個ずつに分割する関数．"""
+        size = size or __class__.batch_size
+        return [seq[i:i+size] for i in range(0, len(seq), size)]
 
     @staticmethod
     def _make_exprs_json_serializable(exprs: list[Expression]) -> list[str]:
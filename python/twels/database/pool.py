@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""module description
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable
+
+from mysql.connector.errors import Error, PoolError
+
+
+class ConnectionPool:
+    """データベースとのconnectionを使い回すためのクラス．スレッドセーフ．
+    Notes:
+        1. connectionの作成（TCP接続と認証）はコストが高いので，
+           一度作成したconnectionはclose()せずにpoolに戻して再利用する．
+        2. 長時間使われていないconnectionはidle_timeoutを過ぎるとcloseする．
+        3. 一定時間使われていなかったconnectionは，貸し出す前に
+           ping（health check）をして，切断されていれば作り直す．
+        4. uWSGIなどでforkされた場合，親プロセスのconnectionは使わずに作り直す．
+    """
+    def __init__(self,
+                 factory: Callable[[], Any],
+                 size: int = 5,
+                 idle_timeout: float = 300,
+                 health_check_interval: float = 30,
+                 wait_timeout: float = 30):
+        """
+        Args:
+            factory: 新しいconnectionを作成する関数．
+            size: 同時に作成できるconnectionの最大数．
+            idle_timeout: この秒数以上使われていないconnectionはcloseする．
+            health_check_interval: この秒数以上使われていないconnectionは貸し出す前にpingする．
+            wait_timeout: connectionが空くまで待つ最大の秒数．
+        """
+        if size < 1:
+            raise ValueError(f'size must be 1 or more, but {size}.')
+
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.wait_timeout = wait_timeout
+
+        self._factory = factory
+        self._cond = threading.Condition()
+        # (connection, 最後にpoolに戻された時刻)．右端が最も新しい．
+        self._idle: deque[tuple[Any, float]] = deque()
+        # 作成済みのconnectionの数（idleと貸出中の合計）
+        self._num_connections = 0
+        self._pid = os.getpid()
+
+    def acquire(self):
+        """poolからconnectionを取り出す関数．
+        空いているconnectionがなく，最大数まで作成済みの場合は空くまで待つ．
+        Raises:
+            PoolError: wait_timeoutを過ぎてもconnectionが空かなかったとき．
+        """
+        deadline = time.monotonic() + self.wait_timeout
+        with self._cond:
+            self._reset_if_forked()
+            expired = self._pop_expired()
+            while True:
+                if self._idle:
+                    cnx, last_used = self._idle.pop()
+                    break
+                if self._num_connections < self.size:
+                    self._num_connections += 1
+                    cnx, last_used = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolError(f'no connection is available in {self.wait_timeout} seconds.')
+                self._cond.wait(remaining)
+
+        # ネットワークを使う処理はlockの外で行う．
+        for old in expired:
+            __class__._close_quietly(old)
+
+        if cnx is not None:
+            if time.monotonic() - last_used < self.health_check_interval or __class__._is_healthy(cnx):
+                return cnx
+            __class__._close_quietly(cnx)
+
+        try:
+            return self._factory()
+        except BaseException:
+            self._forget()
+            raise
+
+    def release(self, cnx, discard: bool = False):
+        """connectionをpoolに戻す関数．
+        Args:
+            cnx: acquire()で取得したconnection．
+            discard: Trueのときはpoolに戻さずにcloseする．
+        Notes:
+            commitされていない変更はrollbackする．
+            また，rollbackすることで古いsnapshotを次の利用者が見ることを防ぐ．
+        """
+        if os.getpid() != self._pid:
+            # fork前に貸し出されたconnectionは，親プロセスと共有しているのでcloseしない．
+            return
+
+        if not discard:
+            try:
+                if cnx.in_transaction:
+                    cnx.rollback()
+            except Error:
+                discard = True
+
+        if discard:
+            __class__._close_quietly(cnx)
+            self._forget()
+            return
+
+        with self._cond:
+            self._idle.append((cnx, time.monotonic()))
+            self._cond.notify()
+
+    def close_all(self):
+        """poolにあるidleのconnectionをすべてcloseする関数．
+        貸出中のconnectionは，release()されたときにpoolに戻る．
+        """
+        with self._cond:
+            idle = [cnx for cnx, _ in self._idle]
+            self._idle.clear()
+            self._num_connections -= len(idle)
+            self._cond.notify_all()
+        for cnx in idle:
+            __class__._close_quietly(cnx)
+
+    def num_idle(self) -> int:
+        """poolにあるidleのconnectionの数を返す関数．"""
+        with self._cond:
+            return len(self._idle)
+
+    def num_connections(self) -> int:
+        """作成済みのconnectionの数を返す関数．"""
+        with self._cond:
+            return self._num_connections
+
+    def _forget(self):
+        """connectionを1つ作成済みの数から除く関数．"""
+        with self._cond:
+            self._num_connections -= 1
+            self._cond.notify()
+
+    def _pop_expired(self) -> list:
+        """idle_timeoutを過ぎたconnectionをpoolから取り出す関数．
+        lockを取得した状態で呼び出す．
+        """
+        expired = []
+        now = time.monotonic()
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            expired.append(self._idle.popleft()[0])
+        self._num_connections -= len(expired)
+        return expired
+
+    def _reset_if_forked(self):
+        """forkされていたらpoolを空にする関数．
+        lockを取得した状態で呼び出す．
+        Notes:
+            親プロセスとsocketを共有しているので，close()はしない．
+        """
+        pid = os.getpid()
+        if pid != self._pid:
+            self._pid = pid
+            self._idle.clear()
+            self._num_connections = 0
+
+    @staticmethod
+    def _close_quietly(cnx):
+        try:
+            cnx.close()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _is_healthy(cnx) -> bool:
+        try:
+            return cnx.is_connected()
+        except Exception:
+            return False
@@ -3,13 +3,17 @@
 """
 import html
 import re
+import threading
 
 from bs4 import BeautifulSoup
+from lxml import etree
 
 from twels.snippet.cleaner import remove_comments, remove_not_content
 
 
 MATHML_PATTERN = re.compile(r'<math[^>]*>.*?</math>', re.DOTALL)
+# remove_not_content()で属性を削除した後のタグ名．'annotation-xml' -> 'annotation'
+TAG_NAME_PATTERN = re.compile(r'[a-z]+')
 
 
 class Expression:
@@ -25,7 +29,7 @@ class Expression:
         if type(mathml) is not str:
             raise TypeError(f'Expression does not support {type(mathml)}.')
 
-        matched = re.fullmatch(MATHML_PATTERN, mathml)
+        matched = MATHML_PATTERN.fullmatch(mathml)
         if not matched:
             raise ValueError(f'"{mathml}" is invalid MathML syntax.')
 
@@ -50,6 +54,18 @@ class Expression:
     @staticmethod
     def _clean(mathml: str) -> str:
         """不要な情報を削除する関数。
+        Expression._clean_with_bs4()と同じ結果を，lxmlのparserから1回で受け取ったイベントから作成する。
+        BeautifulSoupのtreeを作らないので速い。
+        """
+        result = _MathMLCleaner.get().clean(mathml)
+        if result is None:
+            # _MathMLCleanerでは同じ結果にならない可能性があるMathML
+            return __class__._clean_with_bs4(mathml)
+        return result
+
+    @staticmethod
+    def _clean_with_bs4(mathml: str) -> str:
+        """不要な情報を削除する関数。BeautifulSoupを使う。
         """
         soup = BeautifulSoup(mathml, 'lxml')
         soup.html.unwrap()
@@ -95,3 +111,138 @@ class Expression:
 
         for item in soup.find_all(remove_list):
             item.decompose()
+
+
+class ExpressionTable:
+    """1ページの中で，同じMathMLから作るExpressionを共有するためのクラス．
+    functions.get_exprs()とSnippetは同じページの同じ数式からExpressionを作るので，
+    このクラスを通して作ることで，同じMathMLを_clean()するのは1ページにつき1回になる。
+    Notes:
+        1. MathMLの文字列をkeyにする。
+        2. _clean()した後のMathMLが同じExpressionは同じオブジェクトにする。
+    """
+    def __init__(self):
+        self._exprs: dict[str, Expression] = {}
+        self._cleaned: dict[str, Expression] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._cleaned)
+
+    def get(self, mathml: str) -> Expression:
+        """mathmlのExpressionを返す関数．まだ作っていなければ作って保存する．"""
+        expr = self._exprs.get(mathml)
+        if expr is not None:
+            self.hits += 1
+            return expr
+
+        self.misses += 1
+        expr = Expression(mathml)
+        expr = self._cleaned.setdefault(expr.mathml, expr)
+        self._exprs[mathml] = expr
+        return expr
+
+
+class _MathMLCleaner:
+    """Expression._clean()のためのlxmlのparser target．
+    BeautifulSoup(mathml, 'lxml')と同じlibxml2のHTML parserを使い，
+    タグや文字列を受け取るたびに以下の処理をして出力する。
+        1. html, bodyを削除する(unwrap)。
+        2. コメントを削除する。
+        3. semantics, mstyleを削除する(unwrap)。
+        4. annotation, mspaceを中身ごと削除する(decompose)。
+        5. 属性を削除する。
+        6. 空白, 改行, '&#x2061;'を削除する。
+    Notes:
+        BeautifulSoupと出力が異なる可能性があるものが現れた場合は，clean()でNoneを返す。
+        このとき，Expression._clean()はExpression._clean_with_bs4()を使う。
+    """
+    unwrap_tags = {'html', 'body', 'semantics', 'mstyle'}
+    decompose_tags = {'annotation', 'mspace'}
+    # BeautifulSoupが<br/>のように出力するタグと，中の文字列をescapeしないタグ．
+    unsupported_tags = {
+        'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link', 'menuitem',
+        'meta', 'param', 'source', 'track', 'wbr', 'basefont', 'bgsound', 'command', 'frame',
+        'image', 'isindex', 'nextid', 'spacer', 'script', 'style', 'template', 'rt', 'rp',
+    }
+    # 文字列から削除する文字。remove_not_content()で' 'に変換される文字と' 'と'&#x2061;'。
+    remove_chars = str.maketrans('', '', ' \t\f\r\n' + html.unescape('&#x2061;'))
+    escape_chars = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;'})
+
+    _local = threading.local()
+
+    def __init__(self):
+        self._parser = etree.HTMLParser(target=self, recover=True)
+        self._reset()
+
+    @staticmethod
+    def get() -> '_MathMLCleaner':
+        """このthreadの_MathMLCleanerを返す関数。parserの作成はコストが高いので使い回す。"""
+        cleaner = getattr(__class__._local, 'cleaner', None)
+        if cleaner is None:
+            cleaner = __class__._local.cleaner = _MathMLCleaner()
+        return cleaner
+
+    def clean(self, mathml: str) -> str | None:
+        """不要な情報を削除したMathMLを返す関数。
+        BeautifulSoupと出力が異なる可能性がある場合はNoneを返す。
+        """
+        try:
+            self._parser.feed(mathml)
+            # parserはclose()でこのobjectのclose()を呼び，その戻り値を返す。
+            return self._parser.close()
+        except etree.LxmlError:
+            self._parser = etree.HTMLParser(target=self, recover=True)
+            self._reset()
+            return None
+
+    # ここからはparserから呼ばれる関数
+    def start(self, tag: str, attrib):
+        if self._skip_depth:
+            self._skip_depth += 1
+            return
+        if tag in __class__.decompose_tags:
+            self._skip_depth = 1
+            return
+        if tag in __class__.unwrap_tags:
+            return
+        matched = TAG_NAME_PATTERN.match(tag)
+        if matched is None or tag in __class__.unsupported_tags \
+                or any('\n' in value for value in attrib.values()):
+            # remove_not_content()で属性を削除できないので，BeautifulSoupに任せる。
+            self._unsupported = True
+            return
+        self._output.append(f'<{matched.group()}>')
+
+    def end(self, tag: str):
+        if self._skip_depth:
+            self._skip_depth -= 1
+            return
+        if tag in __class__.unwrap_tags:
+            return
+        self._output.append(f'</{tag}>')
+
+    def data(self, data: str):
+        if self._skip_depth:
+            return
+        self._output.append(data.translate(__class__.remove_chars).translate(__class__.escape_chars))
+
+    def comment(self, text: str):
+        pass
+
+    def pi(self, target: str, data: str):
+        self._unsupported = True
+
+    def doctype(self, *args):
+        self._unsupported = True
+
+    def close(self) -> str | None:
+        result = None if self._unsupported else ''.join(self._output)
+        self._reset()
+        return result
+
+    def _reset(self):
+        self._output: list[str] = []
+        self._skip_depth = 0
+        self._unsupported = False
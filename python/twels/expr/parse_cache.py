@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""module description
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+
+EXPR_DIR = Path(__file__).resolve().parent
+# path setの作り方が変わるファイル．これらのファイルが変わるとcacheは無効になる．
+VERSIONED_FILES = [
+    EXPR_DIR / 'mathml.lark',
+    EXPR_DIR / 'mathml_lalr.lark',
+    EXPR_DIR / 'tree.py',
+    EXPR_DIR / 'pathset.py',
+    EXPR_DIR / 'parser_const.py',
+    EXPR_DIR.parent / 'normalizer' / 'normalizer.py',
+]
+
+
+def get_parser_version() -> str:
+    """grammarとtransformerのversionを返す関数．
+    VERSIONED_FILESの内容のhash値をversionとする．
+    """
+    h = hashlib.sha256()
+    for path in VERSIONED_FILES:
+        h.update(path.name.encode('utf-8'))
+        try:
+            h.update(path.read_bytes())
+        except FileNotFoundError:
+            pass
+    return h.hexdigest()
+
+
+class ParseCache:
+    """Parser.parse()の結果を保存するためのクラス．スレッドセーフ．
+    Notes:
+        1. 同じMathMLは多くのページや検索で現れるので，正規化したMathML（Expression.mathml）を
+           keyにしてpath setを保存する．
+        2. processのメモリ上のLRU cacheと，SQLiteのファイルのcacheの2段になっている．
+           ファイルのcacheはdirectoryを指定したときだけ使い，crawlerを再起動しても残る．
+        3. ファイルのcacheはgrammarやtransformerのversionが変わると削除する．
+        4. parseに失敗した数式は保存しない．
+    """
+    def __init__(self, maxsize: int = 100000, directory: str | os.PathLike | None = None, version: str | None = None):
+        """
+        Args:
+            maxsize: メモリ上に保存する数式の最大数．0の場合はメモリ上には保存しない．
+            directory: SQLiteのファイルを置くdirectory．Noneの場合はファイルには保存しない．
+            version: grammarとtransformerのversion．Noneの場合はget_parser_version()の値．
+        """
+        self.maxsize = maxsize
+        self.directory = Path(directory) if directory else None
+        self.version = version or get_parser_version()
+
+        self._lock = threading.Lock()
+        self._memory: OrderedDict[str, frozenset[str]] = OrderedDict()
+        self._db: sqlite3.Connection | None = None
+        self._db_pid = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, mathml: str) -> set[str] | None:
+        """保存されているpath setを返す関数．保存されていなければNoneを返す．"""
+        with self._lock:
+            path_set = self._memory.get(mathml)
+            if path_set is not None:
+                self._memory.move_to_end(mathml)
+                self.memory_hits += 1
+                return set(path_set)
+
+            db = self._get_db()
+            if db is not None:
+                row = db.execute('SELECT path_set FROM parse_cache WHERE expr_hash = ?',
+                                 (__class__._hash(mathml),)).fetchone()
+                if row is not None:
+                    path_set = frozenset(json.loads(row[0]))
+                    self._put_memory(mathml, path_set)
+                    self.disk_hits += 1
+                    return set(path_set)
+
+            self.misses += 1
+            return None
+
+    def put(self, mathml: str, path_set: set[str]):
+        """path setを保存する関数．"""
+        path_set = frozenset(path_set)
+        with self._lock:
+            self._put_memory(mathml, path_set)
+            db = self._get_db()
+            if db is not None:
+                with db:
+                    db.execute('INSERT OR REPLACE INTO parse_cache (expr_hash, path_set) VALUES (?, ?)',
+                               (__class__._hash(mathml), json.dumps(sorted(path_set), ensure_ascii=False)))
+
+    def clear(self):
+        """保存されているpath setを全て削除する関数．"""
+        with self._lock:
+            self._memory.clear()
+            db = self._get_db()
+            if db is not None:
+                with db:
+                    db.execute('DELETE FROM parse_cache')
+
+    def stats(self) -> dict[str, int | float]:
+        """hitした回数とmissした回数を返す関数．"""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_ratio': (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                'memory_size': len(self._memory),
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self.memory_hits = 0
+            self.disk_hits = 0
+            self.misses = 0
+
+    def _put_memory(self, mathml: str, path_set: frozenset[str]):
+        """メモリ上のcacheに保存する関数．lockを取得した状態で呼び出す．"""
+        if self.maxsize <= 0:
+            return
+        self._memory[mathml] = path_set
+        self._memory.move_to_end(mathml)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    def _get_db(self) -> sqlite3.Connection | None:
+        """SQLiteのconnectionを返す関数．lockを取得した状態で呼び出す．
+        forkされた場合は親プロセスのconnectionは使わずに作り直す．
+        """
+        if self.directory is None:
+            return None
+        if self._db is not None and self._db_pid == os.getpid():
+            return self._db
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        db = sqlite3.connect(self.directory / 'parse_cache.sqlite3', timeout=30, check_same_thread=False)
+        # 複数のprocessから同時に読み書きできるようにする．
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        with db:
+            db.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)')
+            db.execute('CREATE TABLE IF NOT EXISTS parse_cache (expr_hash BLOB PRIMARY KEY, path_set TEXT NOT NULL)')
+            row = db.execute("SELECT value FROM meta WHERE name = 'version'").fetchone()
+            if row is None or row[0] != self.version:
+                # grammarかtransformerが変わったので，古いpath setは使えない．
+                db.execute('DELETE FROM parse_cache')
+                db.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('version', ?)", (self.version,))
+        self._db = db
+        self._db_pid = os.getpid()
+        return db
+
+    @staticmethod
+    def _hash(mathml: str) -> bytes:
+        return hashlib.sha256(mathml.encode('utf-8')).digest()
@@ -2,15 +2,23 @@
 """module description
 """
 
+import atexit
 import logging
 import os
+import pickle
+import sys
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
 
+import lark
 from lark import Lark, exceptions, Tree
 
 from twels.expr.expression import Expression
+from twels.expr.parse_cache import ParseCache
 from twels.expr.parser_const import ParserConst
 from twels.expr.pathset import PathSet
-from twels.expr.tree import MathMLTree, find_index
+from twels.expr.tree import LalrTreeError, MathMLTree, find_index, from_lalr_tree
 from twels.utils.utils import print_in_red
 
 logger = logging.getLogger('django')
@@ -30,16 +38,160 @@ def get_lark_parser() -> Lark | None:
         print_in_red(e)
 
 
+def get_lalr_parser(use_cache: bool = True) -> Lark | None:
+    """よく使われる数式だけを解析するLALR parserを返す関数．
+    Args:
+        use_cache: Trueのときは，解析済みのgrammarをget_lalr_cache_path()のファイルから読み込む．
+                   ファイルがない，またはgrammarが変わっている場合は作り直して保存する．
+    Notes:
+        grammarの解析はprocessの起動のたびに行うとコストが高いので，ファイルに保存しておく．
+        LarkのcacheはLALRのみに対応しているので，Earley parserはParser._get_lark()で
+        必要になったときに作成する．
+    """
+    base_path = os.path.abspath(__file__)  # parser.pyのpath
+    path = os.path.normpath(os.path.join(base_path, '../mathml_lalr.lark'))
+    try:
+        with open(path, encoding='utf-8') as _grammar:
+            grammar = _grammar.read()
+    except FileNotFoundError as e:
+        print_in_red(e)
+        return None
+
+    try:
+        if use_cache:
+            try:
+                return Lark(grammar, parser='lalr', cache=get_lalr_cache_path())
+            except OSError as e:
+                # cacheのファイルを書き込めない場合は，cacheを使わずに作成する．
+                logger.warning(f'cannot use the cache of the LALR parser. {e}')
+        return Lark(grammar, parser='lalr')
+    except exceptions.GrammarError as e:
+        print_in_red(e)
+
+
+def get_lalr_cache_path() -> str:
+    """解析済みのLALR parserを保存するファイルのpathを返す関数．
+    directoryは環境変数LARK_CACHE_DIRで変更できる．
+    grammarが変わったかどうかはLarkがファイルの中のhash値で確認する．
+    """
+    cache_dir = os.environ.get('LARK_CACHE_DIR') or tempfile.gettempdir()
+    os.makedirs(cache_dir, exist_ok=True)
+    python_version = '%d%d' % sys.version_info[:2]
+    return os.path.join(cache_dir, f'twels_mathml_lalr_{lark.__version__}_py{python_version}.lark_cache')
+
+
+def _parse_in_worker(expr: Expression) -> tuple[set[str] | None, Exception | None]:
+    """Parser.parse_many()でworker processが実行する関数．
+    grammarはworker processごとに1回だけ読み込まれ，それ以降の呼び出しでは使い回される．
+    Returns:
+        (path_set, error): 成功した場合はerrorがNone．失敗した場合はpath_setがNone．
+    """
+    try:
+        return Parser._parse_uncached(expr), None
+    except Exception as e:
+        try:
+            # 親プロセスに送れない例外は，メッセージだけを持つ同じ種類の例外に変換する．
+            pickle.dumps(e)
+        except Exception:
+            e = exceptions.LarkError(str(e)) if isinstance(e, exceptions.LarkError) else Exception(str(e))
+        return None, e
+
+
 class Parser:
     """MathMLを解析するためのクラス．"""
-    _lark = get_lark_parser()
+    # Earley parserの作成はコストが高いので，LALR parserで解析できない数式が来たときに作成する．
+    _lark: Lark | None = None
+    _lark_lock = threading.Lock()
+    _lalr = get_lalr_parser()
+    # Falseのときは最初からEarley parserで解析する．
+    use_lalr = True
+    # get_parsed_tree()でそれぞれのparserが使われた回数．
+    _stats = {'lalr': 0, 'earley': 0, 'error': 0}
+    # 解析結果のcache．環境変数PARSE_CACHE_DIRを指定するとファイルにも保存する．
+    cache = ParseCache(maxsize=int(os.environ.get('PARSE_CACHE_SIZE', 100000)),
+                       directory=os.environ.get('PARSE_CACHE_DIR') or None)
+    # Parser.parse_many()で使うprocessの数．環境変数PARSER_WORKERSで変更できる．
+    workers = int(os.environ.get('PARSER_WORKERS', os.cpu_count() or 1))
+    # 数式の数がこれより少ないときは，processに送るコストの方が大きいので並列化しない．
+    min_exprs_for_pool = 8
+
+    _executor: ProcessPoolExecutor | None = None
+    _executor_workers = 0
+    _executor_pid = 0
+    _executor_lock = threading.Lock()
 
     @staticmethod
     def parse(expr: Expression) -> set[str]:
         """MathMLを解析する関数．
+        同じMathMLを解析した結果がParser.cacheにあればそれを返す．
         Returns:
             PathSet: mathmlを解析して得られたPath Set.
         """
+        path_set = __class__.cache.get(expr.mathml)
+        if path_set is not None:
+            return path_set
+        path_set = __class__._parse_uncached(expr)
+        __class__.cache.put(expr.mathml, path_set)
+        return path_set
+
+    @staticmethod
+    def parse_many(exprs: list[Expression], workers: int | None = None) -> list[tuple[set[str] | None, Exception | None]]:
+        """複数の数式をCPUのコアに分散して解析する関数．
+        Args:
+            exprs: 解析する数式のリスト
+            workers: 使うprocessの数．Noneの場合はParser.workers．1以下の場合はこのprocessで解析する．
+        Returns:
+            exprsと同じ順番の(path_set, error)のリスト．
+            解析に成功した数式はerrorがNone，失敗した数式はpath_setがNoneになる．
+        Notes:
+            processの起動とgrammarの読み込みのコストが高いので，
+            一度作成したprocess poolは使い回す．
+        """
+        if workers is None:
+            workers = __class__.workers
+
+        results: list[tuple[set[str] | None, Exception | None]] = [(None, None)] * len(exprs)
+        # cacheにない数式だけを解析する．同じ数式は1回だけ解析する．
+        missed: dict[str, list[int]] = {}
+        missed_exprs = []
+        for i, expr in enumerate(exprs):
+            if expr.mathml in missed:
+                missed[expr.mathml].append(i)
+                continue
+            path_set = __class__.cache.get(expr.mathml)
+            if path_set is None:
+                missed[expr.mathml] = [i]
+                missed_exprs.append(expr)
+            else:
+                results[i] = (path_set, None)
+
+        if workers <= 1 or len(missed_exprs) < __class__.min_exprs_for_pool:
+            parsed = [_parse_in_worker(expr) for expr in missed_exprs]
+        else:
+            executor = __class__._get_executor(workers)
+            # 1つずつ送ると通信のコストが大きいので，まとめて送る．
+            chunksize = max(1, len(missed_exprs) // (workers * 4))
+            parsed = list(executor.map(_parse_in_worker, missed_exprs, chunksize=chunksize))
+
+        for expr, (path_set, error) in zip(missed_exprs, parsed):
+            if error is None:
+                __class__.cache.put(expr.mathml, path_set)
+            for i in missed[expr.mathml]:
+                results[i] = (set(path_set) if path_set is not None else None, error)
+        return results
+
+    @staticmethod
+    def shutdown():
+        """Parser.parse_many()で使っているprocess poolを終了する関数．"""
+        with __class__._executor_lock:
+            if __class__._executor is not None and __class__._executor_pid == os.getpid():
+                __class__._executor.shutdown()
+            __class__._executor = None
+            __class__._executor_workers = 0
+
+    @staticmethod
+    def _parse_uncached(expr: Expression) -> set[str]:
+        """cacheを使わずにMathMLを解析する関数．"""
         tree = __class__.get_parsed_tree(expr)
         if tree.data == 'error':
             # 他のexceptionにしたほうがいいかも．
@@ -59,31 +211,93 @@ class Parser:
     @staticmethod
     def get_parsed_tree(expr: Expression) -> Tree:
         """MathMLを分析してTreeを作成する関数．
+        まずLALR parserで解析し，解析できなかった場合だけEarley parserで解析する．
         例外が発生した場合はTree('error', [])を返す．
         """
+        tree = __class__._get_lalr_parsed_tree(expr)
+        if tree is not None:
+            __class__._stats['lalr'] += 1
+            return tree
+
+        __class__._stats['earley'] += 1
         try:
-            parsed_tree = __class__._lark.parse(expr.mathml)
+            parsed_tree = __class__._get_lark().parse(expr.mathml)
             cleaned_tree = MathMLTree().transform(parsed_tree)
             return cleaned_tree
         except AttributeError as e:
             print_in_red('AttributeError')
             print_in_red(e)
             print_in_red('grammarファイルを正しく読み込めていない，もしくはgrammarに間違いがあります．')
+            __class__._stats['error'] += 1
             return Tree('error', [])
         except exceptions.LarkError:
             try:
                 # 条件を変えて再度parseする
                 # mtableが複数の数式を含む場合、mtdが邪魔で正しくparseできないのでmtdを削除。
                 new_mathml = expr.mathml.replace('<mtd>', '').replace('</mtd>', '').replace('<mrow></mrow>', '').replace('<mi></mi>', '')
-                parsed_tree = __class__._lark.parse(new_mathml)
+                parsed_tree = __class__._get_lark().parse(new_mathml)
                 cleaned_tree = MathMLTree().transform(parsed_tree)
                 return cleaned_tree
             except exceptions.LarkError:
                 logger.error('expression: ')
                 logger.error(expr.mathml)
                 logger.exception('LarkError')
+                __class__._stats['error'] += 1
                 return Tree('error', [])
 
+    @staticmethod
+    def get_stats() -> dict[str, int]:
+        """get_parsed_tree()でLALR parserとEarley parserが使われた回数を返す関数．
+        Returns:
+            {'lalr': LALR parserで解析できた回数,
+             'earley': Earley parserで解析した回数,
+             'error': どちらでも解析できなかった回数}
+        """
+        return dict(__class__._stats)
+
+    @staticmethod
+    def reset_stats():
+        for key in __class__._stats:
+            __class__._stats[key] = 0
+
+    @staticmethod
+    def _get_lark() -> Lark | None:
+        """Earley parserを返す関数．最初に呼ばれたときに作成する．"""
+        if __class__._lark is None:
+            with __class__._lark_lock:
+                if __class__._lark is None:
+                    __class__._lark = get_lark_parser()
+        return __class__._lark
+
+    @staticmethod
+    def _get_lalr_parsed_tree(expr: Expression) -> Tree | None:
+        """LALR parserで解析してTreeを作成する関数．
+        mathml_lalr.larkで解析できない数式の場合はNoneを返す．
+        """
+        if not __class__.use_lalr or __class__._lalr is None:
+            return None
+        try:
+            parsed_tree = from_lalr_tree(__class__._lalr.parse(expr.mathml))
+        except (exceptions.LarkError, LalrTreeError):
+            return None
+        return MathMLTree().transform(parsed_tree)
+
+    @staticmethod
+    def _get_executor(workers: int) -> ProcessPoolExecutor:
+        """workers個のprocessを持つprocess poolを返す関数．
+        forkされた場合は親プロセスのpoolは使えないので作り直す．
+        """
+        with __class__._executor_lock:
+            executor = __class__._executor
+            if executor is not None and __class__._executor_pid == os.getpid() and __class__._executor_workers == workers:
+                return executor
+            if executor is not None and __class__._executor_pid == os.getpid():
+                executor.shutdown(wait=False)
+            __class__._executor = ProcessPoolExecutor(max_workers=workers)
+            __class__._executor_workers = workers
+            __class__._executor_pid = os.getpid()
+            return __class__._executor
+
     @staticmethod
     def _make_new_trees(tree: Tree) -> list[Tree]:
         """relational operatorを複数含む式を分割して返す関数．
@@ -107,3 +321,6 @@ class Parser:
         # 関係演算子が複数含まれるので、分割する。
         tree_list.append(tree)
         return tree_list
+
+
+atexit.register(Parser.shutdown)
@@ -218,6 +218,68 @@ def find_index(children: list[Tree | Token], conditions: list[str]) -> list[int]
     return result
 
 
+class LalrTreeError(Exception):
+    """LALR parserのTreeがmathml.larkで解析した場合と同じTreeにならないときのexception．"""
+
+
+# mathml_lalr.larkのTreeの各ノードの子ノードが，mathml.larkのどの位置にあたるか．
+# 'expr'は'sum'と'product'を，'sum'は'product'を含む位置．
+_CHILD_LEVEL = {
+    ParserConst.expr_data: ParserConst.sum_data,
+    ParserConst.sum_data: ParserConst.product_data,
+    ParserConst.product_data: ParserConst.product_data,
+    'paren': ParserConst.sum_data,
+}
+
+
+def from_lalr_tree(tree: Tree) -> Tree:
+    """mathml_lalr.larkで解析したTreeを，mathml.larkで解析した場合と同じTreeに変換する関数．
+    Raises:
+        LalrTreeError: mathml.larkでは解析できない，または別のTreeになる位置にgroupがあるとき．
+    Notes:
+        mathml.larkではmrowなどのgroupは以下の位置でしか使えないので，それを確認してgroupを削除する．
+        1. exprの位置: 全てのタグ．中身はexprの位置．
+        2. sumの位置: 全てのタグ．中身はsumの位置．ただし，中身がgroupだけのときはproductの位置．
+        3. productの位置: mrowだけ．中身はproductの位置．
+    """
+    math_group: Tree = tree.children[0]
+    return Tree(ParserConst.root_data, [_from_lalr_node(math_group.children[1], ParserConst.expr_data)])
+
+
+def _from_lalr_node(node: Tree | Token, level: str) -> Tree | Token:
+    """from_lalr_tree()の再帰部分．
+    Args:
+        node: mathml_lalr.larkのTreeのノード．
+        level: そのノードがmathml.larkのどの位置にあるか．'expr', 'sum', 'product'のいずれか．
+    """
+    if isinstance(node, Token):
+        # Token('MI', '<mi>a</mi>') -> Token('TOKEN', 'a')
+        return Token(ParserConst.token_type, node[node.index('>')+1:node.rindex('<')])
+
+    if node.data == 'group':
+        open_tag, content = node.children
+        if level == ParserConst.product_data:
+            if open_tag != '<mrow>':
+                raise LalrTreeError(f'{open_tag} cannot be used as a factor.')
+            return _from_lalr_node(content, ParserConst.product_data)
+        if level == ParserConst.sum_data and isinstance(content, Tree) and content.data == 'group':
+            return _from_lalr_node(content, ParserConst.product_data)
+        return _from_lalr_node(content, level)
+
+    if node.data == ParserConst.expr_data and level != ParserConst.expr_data:
+        raise LalrTreeError('relational operators are not allowed here.')
+    if node.data == ParserConst.sum_data and level == ParserConst.product_data:
+        raise LalrTreeError('sum is not allowed here.')
+
+    child_level = _CHILD_LEVEL.get(node.data, ParserConst.expr_data)
+    children = [_from_lalr_node(child, child_level) for child in node.children
+                if not (isinstance(child, Tree) and child.data == 'plus')]
+    if node.data == ParserConst.sum_data and len(children) == 1:
+        # 先頭の+を削除したら子ノードが1つになったので，mathml.larkと同じようにsumを作らない．
+        return children[0]
+    return Tree(node.data, children)
+
+
 def _insert_pseudo_num(children: list[Tree | Token]) -> list:
     """引数の順番の情報を追加する関数"""
     return [_get_pseudo_tree(i, node) for i, node in enumerate(children)]
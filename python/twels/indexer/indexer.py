@@ -12,6 +12,8 @@ from twels.database.cursor import Cursor
 from twels.expr.expression import Expression
 from twels.expr.parser import Parser
 from twels.indexer.info import Info
+from twels.segment.segment import SegmentWriter
+from twels.segment.updater import SegmentUpdater
 from twels.snippet.snippet import Snippet
 from twels.utils.utils import print_in_red
 
@@ -21,51 +23,131 @@ logger = logging.getLogger('django')
 class Indexer:
 
     @staticmethod
-    def update_db(page_info: ItemAdapter, test: bool = False) -> bool:
+    def update_db(page_info: ItemAdapter, test: bool = False, batch: bool = False) -> bool:
         """データベースの情報を更新する関数．
         Args:
             page_info: ページについての情報を持つオブジェクト．
             test: testのときにはTrueにする．
+            batch: Trueのときは1ページ分の更新を1つのtransactionでまとめて行う．
+                   詳しくはIndexer._update_db_in_batch()を参照．
         Returns:
             データベースの情報の更新に成功したらTrueを返す．
         """
+        if batch:
+            return __class__._update_db_in_batch(page_info, test=test)
+
+        delta = __class__._new_delta(test)
         try:
-            is_success = True
-            # そのページが数式を含まないとき
-            if not page_info['exprs']:
-                with Cursor.connect(test) as cnx:
-                    with Cursor.cursor(cnx) as cursor:
-                        uri_id, delete_set = Cursor.select_uri_id_and_exprs_from_page_where_uri_1(cursor, page_info['uri'])
-                # そのページが登録されていたとき
-                if uri_id is not None:
-                    # 数式がないページでも，以前はそのページに数式があったかもしれない．
-                    # なので，そのページがpage tableに登録されていたら，そのページを削除．
+            # ページ全体の処理で同じconnectionを使い回す．
+            with Cursor.connect(test):
+                is_success = True
+                # そのページが数式を含まないとき
+                if not page_info['exprs']:
                     with Cursor.connect(test) as cnx:
                         with Cursor.cursor(cnx) as cursor:
-                            Cursor.delete_from_page_where_uri_id_1(cursor, uri_id)
-                            cnx.commit()
-                    # 登録されていた数式をもとにinverted_indexやpath_dictionaryを更新．
-                    is_success = __class__._delete_expr_from_database_with_delete_set(uri_id, delete_set, test=test)
-                return is_success
+                            uri_id, delete_set = Cursor.select_uri_id_and_exprs_from_page_where_uri_1(cursor, page_info['uri'])
+                    # そのページが登録されていたとき
+                    if uri_id is not None:
+                        # 数式がないページでも，以前はそのページに数式があったかもしれない．
+                        # なので，そのページがpage tableに登録されていたら，そのページを削除．
+                        with Cursor.connect(test) as cnx:
+                            with Cursor.cursor(cnx) as cursor:
+                                Cursor.delete_from_page_where_uri_id_1(cursor, uri_id)
+                                cnx.commit()
+                        # 登録されていた数式をもとにinverted_indexやpath_dictionaryを更新．
+                        is_success = __class__._delete_expr_from_database_with_delete_set(uri_id, delete_set, test=test, delta=delta)
+                    return is_success
 
-            uri_id, registered_exprs = __class__._update_page_table(page_info, test=test)
-            is_success = __class__._update_index_and_path_table(uri_id, registered_exprs, page_info, test=test)
-            return is_success
+                uri_id, registered_exprs = __class__._update_page_table(page_info, test=test)
+                is_success = __class__._update_index_and_path_table(uri_id, registered_exprs, page_info, test=test, delta=delta)
+                return is_success
         except Exception as e:
             print_in_red(f'error in indexer.update_db(). {e}')
             traceback.print_exc()
             return False
+        finally:
+            # commitした数式だけが記録されている．
+            __class__._flush_delta(delta, test)
+            __class__._bump_generation(test)
+
+    @staticmethod
+    def get_path_sets(exprs: list[Expression], title: str, workers: int | None = None) -> tuple[dict[Expression, set[str]], bool]:
+        """数式それぞれのpath setを求める関数．
+        数式の解析はParser.parse_many()で複数のprocessに分散して行う．
+        Args:
+            exprs: そのページの数式のリスト
+            title: エラーのログに出力するページのタイトル
+            workers: 解析に使うprocessの数．Noneの場合はParser.workers．
+        Returns:
+            (path_sets, is_success): parseに失敗した数式はpath_setsに含まれない．
+                                     is_successは全ての数式のparseに成功したときにTrue．
+        """
+        exprs = list(exprs)
+        path_sets = {}
+        is_success = True
+        for expr, (path_set, error) in zip(exprs, Parser.parse_many(exprs, workers=workers)):
+            if error is None:
+                path_sets[expr] = path_set
+                continue
+            if isinstance(error, exceptions.LarkError):
+                logger.error(f'HTML title: {title}')
+            print_in_red(f'error in indexer.get_path_sets(). {expr} {error}')
+            is_success = False
+        return path_sets, is_success
+
+    @staticmethod
+    def update_db_in_bulk(pages: list[tuple[ItemAdapter, dict[Expression, set[str]]]], test: bool = False) -> bool:
+        """複数ページ分の情報を1つのtransactionでまとめて登録する関数．
+        Args:
+            pages: [(page_info, path_sets), ...]
+                page_info: ページについての情報を持つオブジェクト．
+                path_sets: Indexer.get_path_sets()で求めた数式ごとのpath set．
+            test: testのときにはTrueにする．
+        Returns:
+            登録に成功したらTrueを返す．失敗した場合は何も登録しない．
+        """
+        delta = __class__._new_delta(test)
+        try:
+            with Cursor.connect(test) as cnx:
+                with Cursor.cursor(cnx) as cursor:
+                    __class__._write_pages_in_batch(cursor, pages, delta)
+                cnx.commit()
+            __class__._flush_delta(delta, test)
+            __class__._bump_generation(test)
+            return True
+        except Exception as e:
+            print_in_red(f'error in indexer.update_db_in_bulk(). {e}')
+            traceback.print_exc()
+            return False
+
+    @staticmethod
+    def _bump_generation(test: bool = False):
+        """indexのgenerationを1増やす関数．Searcherはgenerationが変わると保存した検索結果を使わない．
+        deltaを書き込んだ後に呼び出す．
+        """
+        try:
+            with Cursor.connect(test) as cnx:
+                with Cursor.cursor(cnx) as cursor:
+                    Cursor.update_index_generation_set_generation_plus_1(cursor)
+                cnx.commit()
+        except Exception as e:
+            print_in_red(f'error in indexer._bump_generation(). {e}')
+            traceback.print_exc()
 
     @staticmethod
-    def _delete_expr_from_database(cursor, expr: Expression, uri_id: int, test: bool = False) -> bool:
+    def _delete_expr_from_database(cursor, expr: Expression, uri_id: int, test: bool = False, delta: SegmentWriter | None = None) -> bool:
         """数式(MathML)をデータベースから削除する関数．
         tableはinverted_index, path_dictionaryを操作する．
+        deltaを指定した場合は，path_dictionaryの代わりにdeltaに記録する．
         Returns:
             削除に成功したらTrue，失敗したらFalseを返す．
         """
         try:
             # 削除対象の数式とuri_idをもとにinverted_indexのinfoの該当箇所を削除．
             info = Cursor.remove_info_from_inverted_index(cursor, expr, uri_id)
+            if info is None:
+                # 既に削除されている．
+                return True
 
             if info.is_empty():
                 # path_dictionaryの操作時にexpr_idが必要なので，ここで取得．
@@ -74,6 +156,11 @@ class Indexer:
                 # infoが空になった場合，そのexpr_idのレコードをinverted_index tableから削除．
                 Cursor.delete_from_inverted_index_where_expr_id_1(cursor, expr_id)
 
+                if delta is not None:
+                    # segmentでは数式ごとにtombstoneを記録するので，数式をparseしてpathを求める必要はない．
+                    delta.add_tombstone(expr_id)
+                    return True
+
                 # その数式のpathそれぞれとexpr_idがセットでpath_dictionaryに登録されているので，削除．
                 expr_path_set = Parser.parse(expr)
                 expr_size = len(expr_path_set)
@@ -82,6 +169,12 @@ class Indexer:
                     if not expr_ids:
                         # そのpathのexpr_idsが空になったら，そのpathのレコードを削除．
                         Cursor.delete_from_path_dictionary_where_expr_path_1(cursor, expr_path, expr_size)
+                __class__._record_path_changes(cursor, {}, {
+                    (expr_path, expr_size): {str(expr_id)} for expr_path in expr_path_set
+                    })
+            elif delta is not None:
+                expr_id, expr_size, _ = Cursor.select_expr_id_and_expr_size_and_info_from_inverted_index_where_expr_1(cursor, expr)
+                delta.add_expr(expr_id, expr_size, len(expr.mathml), info)
             return True
         except exceptions.LarkError as e:
             print_in_red(f'error in indexer._delete_expr_from_database(). {e}')
@@ -93,7 +186,7 @@ class Indexer:
             return False
 
     @staticmethod
-    def _delete_expr_from_database_with_delete_set(uri_id: int, delete_set: set[Expression], test: bool = False) -> bool:
+    def _delete_expr_from_database_with_delete_set(uri_id: int, delete_set: set[Expression], test: bool = False, delta: SegmentWriter | None = None) -> bool:
         """Indexer._delete_expr_from_database()をwrapしたmethod．
         tableはinverted_index, path_dictionaryを操作する．
         Returns:
@@ -106,7 +199,7 @@ class Indexer:
             for expr in delete_set:
                 with Cursor.connect(test) as cnx:
                     with Cursor.cursor(cnx) as cursor:
-                        delete_success = __class__._delete_expr_from_database(cursor, expr, uri_id, test=test)
+                        delete_success = __class__._delete_expr_from_database(cursor, expr, uri_id, test=test, delta=delta)
                         cnx.commit()
             return delete_success
         except Exception as e:
@@ -114,6 +207,17 @@ class Indexer:
             traceback.print_exc()
             return False
 
+    @staticmethod
+    def _flush_delta(delta: SegmentWriter | None, test: bool = False):
+        """deltaに記録した数式をsegmentとして書き込む関数．書き込んだ後はすぐに検索できる．"""
+        if delta is None:
+            return
+        try:
+            SegmentUpdater.get(test).flush(delta)
+        except Exception as e:
+            print_in_red(f'error in indexer._flush_delta(). {e}')
+            traceback.print_exc()
+
     @staticmethod
     def _get_insert_and_delete_set(new_exprs: set[Expression], registered_exprs: set[Expression]) -> tuple[set[Expression], set[Expression]]:
         """登録する数式と削除する数式それぞれの集合を返す関数．
@@ -130,13 +234,60 @@ class Indexer:
         return insert_set, delete_set
 
     @staticmethod
-    def _update_index_and_path_table(uri_id: int, registered_exprs: set[Expression], page_info: ItemAdapter, test: bool = False) -> bool:
+    def _new_delta(test: bool = False) -> SegmentWriter | None:
+        """segmentを使う場合に，追加・削除した数式を記録するSegmentWriterを返す関数．
+        segmentを使う場合は，path_dictionaryのexpr_idsを書き換える代わりにdeltaに記録して，
+        データベースをcommitした後にIndexer._flush_delta()で書き込む．
+        """
+        if SegmentUpdater.get(test) is None:
+            return None
+        return SegmentWriter()
+
+    @staticmethod
+    def _record_path_changes(cursor, additions: dict[tuple[str, int], list[str]], removals: dict[tuple[str, int], set[str]]):
+        """path_dictionaryの変更をpath_change tableに記録する関数．
+        in-memoryのpath_dictionary(twels/searcher/path_index.py)はこの記録を読み込んで変更を反映する．
+        Cursor.path_index_config['enabled']がFalseのときは何もしない．
+        Args:
+            additions: {(expr_path, expr_size): 追加したexpr_idのリスト}
+            removals: {(expr_path, expr_size): 削除したexpr_idの集合}
+        """
+        if not Cursor.path_index_config['enabled']:
+            return
+        rows = [
+            (expr_path, expr_size, int(expr_id), False)
+            for (expr_path, expr_size), expr_ids in sorted(removals.items()) for expr_id in sorted(expr_ids, key=int)
+            ]
+        rows.extend(
+            (expr_path, expr_size, int(expr_id), True)
+            for (expr_path, expr_size), expr_ids in sorted(additions.items()) for expr_id in expr_ids
+            )
+        Cursor.insert_into_path_change_values_many(cursor, rows)
+
+    @staticmethod
+    def _update_db_in_batch(page_info: ItemAdapter, test: bool = False) -> bool:
+        """Indexer.update_db()のbatch版．
+        先にそのページの全ての数式のpath setを求めてから，
+        page, inverted_index, path_dictionary tableを1つのtransactionで更新する．
+        数式ごと，pathごとにqueryを実行するのではなく，multi-row statementを使うので，
+        データベースとの往復の回数とcommitの回数が数式の数に比例しない．
+        Returns:
+            データベースの情報の更新に成功したらTrueを返す．
+            parseに失敗した数式があった場合は，その数式以外を登録してFalseを返す．
+        """
+        path_sets, is_success = __class__.get_path_sets(page_info['exprs'], page_info['title'])
+        return __class__.update_db_in_bulk([(page_info, path_sets)], test=test) and is_success
+
+    @staticmethod
+    def _update_index_and_path_table(uri_id: int, registered_exprs: set[Expression], page_info: ItemAdapter, test: bool = False,
+                                     delta: SegmentWriter | None = None) -> bool:
         """inverted_index table, path_dictionary tableを更新する関数．
         最初に新たな式を追加して，その後に古い式を削除する．
         Args:
             uri_id: そのページのuri id
             registered_exprs: そのページに登録されている式のMathMLの集合
             page_info: uriなど，そのページの情報
+            delta: 指定した場合は，path_dictionaryの代わりにdeltaに記録する．
         Returns:
             更新に成功したらTrue、失敗したらFalseを返す。
         """
@@ -144,8 +295,13 @@ class Indexer:
         snippet: Snippet = page_info['snippet']
         is_success = True
 
-        for expr in insert_set:
+        # 先に全ての数式を並列に解析しておく．
+        insert_list = list(insert_set)
+        parse_results = Parser.parse_many(insert_list)
+        for expr, (expr_path_set, parse_error) in zip(insert_list, parse_results):
             try:
+                if parse_error is not None:
+                    raise parse_error
                 expr_start_pos_list = [snippet.search_expr_start_pos(expr)]
                 info = Info({
                     "uri_id": [str(uri_id)],
@@ -153,20 +309,31 @@ class Indexer:
                     "expr_start_pos": expr_start_pos_list
                 })
 
-                expr_path_set = Parser.parse(expr)
                 expr_size = len(expr_path_set)
                 with Cursor.connect(test) as cnx:
                     with Cursor.cursor(cnx) as cursor:
                         expr_id, was_registered = Cursor.update_index(
                             cursor, expr, len(expr_path_set), info
                             )
-                        if not was_registered:
+                        if delta is not None:
+                            if was_registered:
+                                _, _, info = Cursor.select_expr_id_and_expr_size_and_info_from_inverted_index_where_expr_1(cursor, expr)
+                        elif not was_registered:
                             for path in expr_path_set:
                                 Cursor.append_expr_id_if_not_registered(
                                     cursor, expr_id, path, expr_size
                                     )
+                            __class__._record_path_changes(cursor, {
+                                (path, expr_size): [str(expr_id)] for path in expr_path_set
+                                }, {})
                         cnx.commit()
 
+                if delta is not None:
+                    if not was_registered:
+                        for path in expr_path_set:
+                            delta.add_path(path, expr_size, [expr_id])
+                    delta.add_expr(expr_id, expr_size, len(expr.mathml), info)
+
             except exceptions.LarkError as e:
                 logger.exception(f'HTML title: {page_info["title"]}')
                 print_in_red(f'error in indexer._update_index_and_path_table(). {e}')
@@ -177,7 +344,7 @@ class Indexer:
                 traceback.print_exc()
                 is_success = False
 
-        is_success_2 = __class__._delete_expr_from_database_with_delete_set(uri_id, delete_set, test=test)
+        is_success_2 = __class__._delete_expr_from_database_with_delete_set(uri_id, delete_set, test=test, delta=delta)
         return is_success and is_success_2
 
     @staticmethod
@@ -202,3 +369,167 @@ class Indexer:
                     uri_id = Cursor.select_uri_id_from_page_where_uri_1(cursor, page_info['uri'])
                     cnx.commit()
                     return uri_id, set()
+
+    @staticmethod
+    def _update_path_dictionary_in_batch(cursor, additions: dict[tuple[str, int], list[str]], removals: dict[tuple[str, int], set[str]]):
+        """path_dictionary tableのexpr_idsにexpr_idをまとめて追加・削除する関数．
+        Args:
+            additions: {(expr_path, expr_size): 追加するexpr_idのリスト}
+            removals: {(expr_path, expr_size): 削除するexpr_idの集合}
+        Notes:
+            expr_idsが空になったレコードは削除する．
+        """
+        # ロックを取得する順番を揃えるためにsortする．
+        keys = sorted(additions.keys() | removals.keys())
+        registered = Cursor.select_for_update_from_path_dictionary_where_expr_path_and_size_in(cursor, keys)
+
+        insert_rows = []
+        update_rows = []
+        delete_keys = []
+        for key in keys:
+            old_ids = registered.get(key, [])
+            removed = removals.get(key, set())
+            new_ids = [expr_id for expr_id in old_ids if expr_id not in removed]
+            for expr_id in additions.get(key, []):
+                if expr_id not in new_ids:
+                    new_ids.append(expr_id)
+
+            if key not in registered:
+                if new_ids:
+                    insert_rows.append((*key, new_ids))
+            elif not new_ids:
+                delete_keys.append(key)
+            elif new_ids != old_ids:
+                update_rows.append((*key, new_ids))
+
+        Cursor.insert_into_path_dictionary_values_many(cursor, insert_rows)
+        Cursor.update_path_dictionary_set_expr_ids_many(cursor, update_rows)
+        Cursor.delete_from_path_dictionary_where_expr_path_and_size_in(cursor, delete_keys)
+        __class__._record_path_changes(cursor, additions, removals)
+
+    @staticmethod
+    def _write_pages_in_batch(cursor, pages: list[tuple[ItemAdapter, dict[Expression, set[str]]]], delta: SegmentWriter | None = None):
+        """複数ページ分の情報をpage, inverted_index, path_dictionary tableにまとめて書き込む関数．
+        commitはしないので，呼び出し側でcommitする．
+        Args:
+            cursor: cursor
+            pages: [(page_info, path_sets), ...]
+                page_info: uriなど，そのページの情報
+                path_sets: Indexer.get_path_sets()で求めた数式ごとのpath set．
+                           path_setsに含まれない数式は登録しない．
+            delta: 指定した場合は，path_dictionaryの代わりにdeltaに記録する．
+        Notes:
+            同じuriのページが複数ある場合は，最後のものだけを登録する．
+        """
+        latest = {page_info['uri']: (page_info, path_sets) for page_info, path_sets in pages}
+        registered_pages = Cursor.select_uri_id_and_exprs_from_page_where_uri_in(cursor, list(latest))
+
+        new_pages = [
+            page_info for page_info, _ in latest.values()
+            if page_info['exprs'] and page_info['uri'] not in registered_pages
+            ]
+        Cursor.insert_into_page_values_many(cursor, [
+            (page_info['uri'], page_info['exprs'], page_info['title'], page_info['snippet']) for page_info in new_pages
+            ])
+        new_uri_ids = Cursor.select_uri_id_from_page_where_uri_in(cursor, [page_info['uri'] for page_info in new_pages])
+
+        # [(uri_id, page_info, insert_set, delete_set), ...]
+        changes: list[tuple[int, ItemAdapter, set[Expression], set[Expression]]] = []
+        for uri, (page_info, path_sets) in latest.items():
+            uri_id, registered_exprs = registered_pages.get(uri, (new_uri_ids.get(uri), set()))
+            if not page_info['exprs']:
+                # 数式がないページでも，以前はそのページに数式があったかもしれない．
+                # なので，そのページがpage tableに登録されていたら，そのページを削除．
+                if uri_id is None:
+                    continue
+                Cursor.delete_from_page_where_uri_id_1(cursor, uri_id)
+                insert_set, delete_set = set(), registered_exprs
+            else:
+                if uri in registered_pages:
+                    Cursor.update_page_set_exprs_1_title_2_snippet_3_where_uri_id_4(cursor, page_info['exprs'], page_info['title'], page_info['snippet'], uri_id)
+                insert_set, delete_set = __class__._get_insert_and_delete_set(set(page_info['exprs']), registered_exprs)
+                insert_set = {expr for expr in insert_set if expr in path_sets}
+            if insert_set or delete_set:
+                changes.append((uri_id, page_info, insert_set, delete_set))
+
+        if not changes:
+            return
+
+        touched = {expr.mathml: expr for _, _, insert_set, delete_set in changes for expr in insert_set | delete_set}
+        registered_rows = Cursor.select_for_update_from_inverted_index_where_expr_in(cursor, list(touched.values()))
+
+        # 未登録の数式．{expr: (expr_size, path_set, info)}
+        new_exprs: dict[Expression, tuple[int, set[str], Info]] = {}
+        changed_expr_ids = set()
+        for uri_id, page_info, insert_set, delete_set in changes:
+            snippet: Snippet = page_info['snippet']
+            path_sets = latest[page_info['uri']][1]
+            for expr in insert_set:
+                expr_start_pos = snippet.search_expr_start_pos(expr)
+                if expr.mathml in registered_rows:
+                    # 数式が登録済みの場合は，infoを更新する．
+                    expr_id, _, info = registered_rows[expr.mathml]
+                    info.add_page(uri_id, page_info['lang'], expr_start_pos)
+                    changed_expr_ids.add(expr_id)
+                elif expr in new_exprs:
+                    new_exprs[expr][2].add_page(uri_id, page_info['lang'], expr_start_pos)
+                else:
+                    info = Info({
+                        "uri_id": [str(uri_id)],
+                        "lang": [page_info['lang']],
+                        "expr_start_pos": [expr_start_pos]
+                    })
+                    new_exprs[expr] = (len(path_sets[expr]), path_sets[expr], info)
+            for expr in delete_set:
+                if expr.mathml in registered_rows:
+                    expr_id, _, info = registered_rows[expr.mathml]
+                    info.remove_page(uri_id)
+                    changed_expr_ids.add(expr_id)
+
+        info_rows = []
+        # infoが空になった数式．{expr: (expr_id, expr_size)}
+        removed_exprs: dict[Expression, tuple[int, int]] = {}
+        for mathml, (expr_id, expr_size, info) in registered_rows.items():
+            if expr_id not in changed_expr_ids:
+                continue
+            if info.is_empty():
+                removed_exprs[touched[mathml]] = (expr_id, expr_size)
+            else:
+                info_rows.append((expr_id, info))
+                if delta is not None:
+                    delta.add_expr(expr_id, expr_size, len(mathml), info)
+
+        # infoが空になった数式をinverted_indexとpath_dictionaryから削除．
+        # parseできない数式はpath_dictionaryに登録されていない．
+        # deltaに記録する場合は数式ごとにtombstoneを記録するので，pathを求める必要はない．
+        removals: dict[tuple[str, int], set[str]] = {}
+        if delta is None:
+            removed_path_sets, _ = __class__.get_path_sets(list(removed_exprs), 'removed expressions')
+            for expr, (expr_id, expr_size) in removed_exprs.items():
+                for expr_path in removed_path_sets.get(expr, set()):
+                    removals.setdefault((expr_path, expr_size), set()).add(str(expr_id))
+        else:
+            for expr_id, _ in removed_exprs.values():
+                delta.add_tombstone(expr_id)
+
+        Cursor.update_inverted_index_set_info_many(cursor, info_rows)
+        Cursor.delete_from_inverted_index_where_expr_id_in(cursor, [expr_id for expr_id, _ in removed_exprs.values()])
+
+        additions: dict[tuple[str, int], list[str]] = {}
+        if new_exprs:
+            Cursor.insert_into_inverted_index_values_many(cursor, [
+                (expr, expr_size, info) for expr, (expr_size, _, info) in new_exprs.items()
+                ])
+            new_ids = Cursor.select_for_update_from_inverted_index_where_expr_in(cursor, list(new_exprs))
+            for expr, (expr_size, expr_path_set, info) in new_exprs.items():
+                expr_id = new_ids[expr.mathml][0]
+                if delta is not None:
+                    for expr_path in expr_path_set:
+                        delta.add_path(expr_path, expr_size, [expr_id])
+                    delta.add_expr(expr_id, expr_size, len(expr.mathml), info)
+                    continue
+                for expr_path in expr_path_set:
+                    additions.setdefault((expr_path, expr_size), []).append(str(expr_id))
+
+        if delta is None:
+            __class__._update_path_dictionary_in_batch(cursor, additions, removals)
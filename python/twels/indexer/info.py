@@ -1,8 +1,12 @@
 # -*- coding: utf-8 -*-
 """module description
 """
-import copy
 import json
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterator
+
+from twels.indexer import posting
 
 
 class Info:
@@ -17,7 +21,15 @@ class Info:
             [1箇所目の数式の開始位置, 2箇所目の数式の開始位置, ...]  # 2ページ目
             ...
         ]
+    Notes:
+        1. 人気のある数式はページの数が多いので，Pythonのlistではなくarrayで保存する。
+           ページはuri_idの小さい順に並べる。
+           数式の開始位置は全てのページの分を1つのarrayに並べて，ページごとの数をcountsに保存する。
+        2. データベースにはto_bytes()でposting.encode()したbinaryを保存する。
+           loads()はJSONで保存されている古いinfoも読み込める。
     """
+    __slots__ = ('_uri_ids', '_langs', '_counts', '_positions')
+
     def __init__(self, info: dict):
         if not isinstance(info['uri_id'], list):
             raise TypeError(f"info['uri_id'] is not list, but {type(info['uri_id'])}.")
@@ -26,9 +38,80 @@ class Info:
         if not isinstance(info['expr_start_pos'], list):
             raise TypeError(f"info['expr_start_pos'] is not list, but {type(info['expr_start_pos'])}.")
 
-        self.uri_id_list: list[str] = copy.deepcopy(info['uri_id'])
-        self.lang_list: list[str] = copy.deepcopy(info['lang'])
-        self.expr_start_pos_list: list[list[int]] = copy.deepcopy(info['expr_start_pos'])
+        pages = sorted(zip(map(int, info['uri_id']), info['lang'], info['expr_start_pos']), key=lambda page: page[0])
+        self._uri_ids = array('q', [uri_id for uri_id, _, _ in pages])
+        self._langs = array('B', [posting.lang_to_code(lang) for _, lang, _ in pages])
+        self._counts = array('I', [len(expr_start_pos) for _, _, expr_start_pos in pages])
+        self._positions = array('I', [pos for _, _, expr_start_pos in pages for pos in expr_start_pos])
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'Info':
+        """to_bytes()の結果からInfoを作る関数。"""
+        info = cls.__new__(cls)
+        info._uri_ids, info._langs, info._counts, info._positions = posting.decode(data)
+        return info
+
+    @classmethod
+    def loads(cls, data: bytes | bytearray | str) -> 'Info':
+        """データベースのinfoの値からInfoを作る関数。
+        binaryとJSONのどちらで保存されていても読み込める。
+        """
+        if isinstance(data, str):
+            return cls(json.loads(data))
+        if data[:1] == b'{':
+            return cls(json.loads(data.decode('utf-8')))
+        return cls.from_bytes(bytes(data))
+
+    @property
+    def uri_id_list(self) -> list[str]:
+        return [str(uri_id) for uri_id in self._uri_ids]
+
+    @property
+    def lang_list(self) -> list[str]:
+        return [posting.code_to_lang(code) for code in self._langs]
+
+    @property
+    def expr_start_pos_list(self) -> list[list[int]]:
+        return [expr_start_pos for _, _, expr_start_pos in self.pages()]
+
+    def pages(self) -> Iterator[tuple[int, str, list[int]]]:
+        """(uri_id, lang, expr_start_pos)をuri_idの小さい順に返すgenerator。"""
+        positions = self._positions
+        end = 0
+        for uri_id, code, count in zip(self._uri_ids, self._langs, self._counts):
+            start = end
+            end += count
+            yield uri_id, posting.code_to_lang(code), positions[start:end].tolist()
+
+    def add_page(self, uri_id: int | str, lang: str, expr_start_pos: list[int]):
+        """1ページ分の情報を追加する関数。
+        そのページがすでに登録されている場合は、情報を置き換える。
+        """
+        uri_id = int(uri_id)
+        i = bisect_left(self._uri_ids, uri_id)
+        start = sum(self._counts[:i])
+        if i < len(self._uri_ids) and self._uri_ids[i] == uri_id:
+            self._langs[i] = posting.lang_to_code(lang)
+            self._positions[start:start+self._counts[i]] = array('I', expr_start_pos)
+            self._counts[i] = len(expr_start_pos)
+        else:
+            self._uri_ids.insert(i, uri_id)
+            self._langs.insert(i, posting.lang_to_code(lang))
+            self._counts.insert(i, len(expr_start_pos))
+            self._positions[start:start] = array('I', expr_start_pos)
+
+    def remove_page(self, uri_id: int | str):
+        """1ページ分の情報を削除する関数。
+        そのページが登録されていない場合は何もしない。
+        """
+        uri_id = int(uri_id)
+        i = bisect_left(self._uri_ids, uri_id)
+        if i < len(self._uri_ids) and self._uri_ids[i] == uri_id:
+            start = sum(self._counts[:i])
+            del self._positions[start:start+self._counts[i]]
+            del self._uri_ids[i]
+            del self._langs[i]
+            del self._counts[i]
 
     def dumps(self) -> str:
         """stringにdumpする関数。
@@ -42,21 +125,33 @@ class Info:
         }
         return json.dumps(info)
 
+    def to_bytes(self) -> bytes:
+        """データベースに保存するbinaryにする関数。
+        formatはtwels/indexer/posting.pyを参照。
+        """
+        return posting.encode(self._uri_ids, self._langs, self._counts, self._positions)
+
     def is_empty(self) -> bool:
         """
         Returns:
             True when the info is empty.
         """
-        if len(self.uri_id_list) == 0:
-            assert len(self.lang_list) == 0, f'lang_list should be empty. actual: {self.lang_list}'
-            assert len(self.expr_start_pos_list) == 0, f'expr_start_pos_list should be empty. actual: {self.lang_list}'
+        if len(self._uri_ids) == 0:
+            assert len(self._langs) == 0, f'lang_list should be empty. actual: {self.lang_list}'
+            assert len(self._positions) == 0, f'expr_start_pos_list should be empty. actual: {self._positions}'
             return True
         else:
             return False
 
     def size(self) -> int:
         """このインスタンスの要素数を返す関数"""
-        return len(self.uri_id_list)
+        return len(self._uri_ids)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Info):
+            return (self._uri_ids, self.lang_list, self._counts, self._positions) ==\
+                (other._uri_ids, other.lang_list, other._counts, other._positions)
+        return False
 
     def __str__(self) -> str:
         return self.dumps()
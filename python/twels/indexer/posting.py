@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""inverted_indexのinfoを保存するためのbinary format．
+JSONの代わりに使うことで，infoのサイズとencode, decodeの時間を小さくする．
+
+format (version 1):
+    1. version: 1 byte. JSONは'{'(0x7b)で始まるので区別できる．
+    2. ページの数n: varint
+    3. LANGSに含まれない言語の数m: varint. 続けてm個の(utf-8のbyte数: varint, utf-8の文字列)
+    4. 言語: n bytes. LANGSのindex．OTHER_LANG_CODE以上の場合は3.の(code - OTHER_LANG_CODE)番目，
+       NULL_LANG_CODEの場合はNone．
+    5. uri_id: n個のvarint. 小さい順に並べて，1つ前のuri_idとの差を保存する．
+    6. 数式の開始位置の数: n個のvarint
+    7. 数式の開始位置: 6.の合計個のvarint
+"""
+import threading
+from array import array
+from itertools import accumulate
+
+
+VERSION = 1
+# よく使う言語．indexを保存するので，順番を変えたり途中に追加したりしてはいけない．
+LANGS = ('ja', 'en', 'de', 'fr', 'es', 'it', 'pt', 'ru', 'zh', 'ko')
+OTHER_LANG_CODE = 128
+NULL_LANG_CODE = 255
+
+# メモリ上の言語のcode．LANGSのcodeはbinaryと同じで，それ以外の言語はprocessごとに追加する．
+_lang_names: list[str | None] = list(LANGS)
+_lang_codes: dict[str | None, int] = {lang: code for code, lang in enumerate(LANGS)}
+_lang_lock = threading.Lock()
+
+
+def lang_to_code(lang: str | None) -> int:
+    """言語をメモリ上のcodeにする関数．"""
+    code = _lang_codes.get(lang)
+    if code is not None:
+        return code
+    with _lang_lock:
+        if lang not in _lang_codes:
+            if len(_lang_names) > 0xff:
+                raise ValueError(f'too many languages: {lang}')
+            _lang_names.append(lang)
+            _lang_codes[lang] = len(_lang_names) - 1
+        return _lang_codes[lang]
+
+
+def code_to_lang(code: int) -> str | None:
+    """メモリ上のcodeを言語にする関数．"""
+    return _lang_names[code]
+
+
+class PostingError(ValueError):
+    """binaryのinfoが壊れているときに発生するエラー．"""
+
+
+def _varint(value: int) -> bytes:
+    """0以上の整数をLEB128のvarintにする関数．"""
+    if value < 0:
+        raise ValueError(f'varint must not be negative: {value}')
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+# 2 bytes以下のvarintの表．uri_idの差や数式の開始位置の多くはこの範囲に入る．
+_SMALL_VARINTS = [_varint(value) for value in range(1 << 14)]
+
+
+def encode_varints(values, out: bytearray):
+    """0以上の整数をLEB128のvarintにしてoutに追加する関数．"""
+    small = _SMALL_VARINTS
+    out += b''.join([
+        small[value] if 0 <= value < 0x4000
+        else small[(value & 0x7f) | 0x80][:1] + small[value >> 7] if 0x4000 <= value < 0x200000
+        else _varint(value)
+        for value in values
+        ])
+
+
+def decode_varints(data: bytes | memoryview) -> list[int]:
+    """dataに含まれる全てのvarintを読み込む関数．"""
+    values = []
+    append = values.append
+    value = 0
+    shift = 0
+    for b in data:
+        if b < 0x80:
+            append(value | (b << shift))
+            value = 0
+            shift = 0
+        else:
+            value |= (b & 0x7f) << shift
+            shift += 7
+    if shift:
+        raise PostingError('unexpected end of posting.')
+    return values
+
+
+def _read_varint(data: bytes | memoryview, pos: int) -> tuple[int, int]:
+    """data[pos:]から1つのvarintを読み込む関数．
+    Returns:
+        (value, pos): posは読み込んだ後の位置．
+    """
+    value = 0
+    shift = 0
+    while True:
+        if pos >= len(data):
+            raise PostingError('unexpected end of posting.')
+        b = data[pos]
+        pos += 1
+        value |= (b & 0x7f) << shift
+        if b < 0x80:
+            return value, pos
+        shift += 7
+
+
+def encode(uri_ids: array, langs: array, counts: array, positions: array) -> bytes:
+    """1つの数式のinfoをbinaryにする関数．
+    Args:
+        uri_ids: 小さい順に並んだuri_id．
+        langs: uri_idsと同じ順番のページの言語のメモリ上のcode．
+        counts: uri_idsと同じ順番のページの数式の開始位置の数．
+        positions: 全てのページの数式の開始位置を並べたもの．
+    """
+    out = bytearray((VERSION,))
+    encode_varints((len(uri_ids),), out)
+
+    # メモリ上のcodeからbinaryのcodeへの変換表．
+    table = bytearray(range(256))
+    others = []
+    for code in set(langs):
+        if code < len(LANGS):
+            continue
+        lang = code_to_lang(code)
+        if lang is None:
+            table[code] = NULL_LANG_CODE
+        else:
+            if OTHER_LANG_CODE + len(others) >= NULL_LANG_CODE:
+                raise ValueError(f'too many languages in one posting: {len(others)}')
+            table[code] = OTHER_LANG_CODE + len(others)
+            others.append(lang)
+    encode_varints((len(others),), out)
+    for lang in others:
+        encoded = lang.encode('utf-8')
+        encode_varints((len(encoded),), out)
+        out += encoded
+    out += langs.tobytes().translate(table)
+
+    encode_varints((uri_id - prev for prev, uri_id in zip((0, *uri_ids), uri_ids)), out)
+    encode_varints(counts, out)
+    encode_varints(positions, out)
+    return bytes(out)
+
+
+def decode(data: bytes) -> tuple[array, array, array, array]:
+    """encode()したbinaryを元に戻す関数．
+    Returns:
+        (uri_ids, langs, counts, positions): encode()の引数と同じもの．
+    """
+    view = memoryview(data)
+    if len(view) == 0 or view[0] != VERSION:
+        raise PostingError(f'unsupported posting version: {view[0] if len(view) else None}')
+    n, pos = _read_varint(view, 1)
+    m, pos = _read_varint(view, pos)
+
+    # binaryのcodeからメモリ上のcodeへの変換表．
+    table = bytearray(range(256))
+    table[NULL_LANG_CODE] = lang_to_code(None)
+    for i in range(m):
+        size, pos = _read_varint(view, pos)
+        table[OTHER_LANG_CODE + i] = lang_to_code(bytes(view[pos:pos+size]).decode('utf-8'))
+        pos += size
+    codes = bytes(view[pos:pos+n])
+    if len(codes) != n:
+        raise PostingError('unexpected end of posting.')
+    for code in set(codes):
+        if len(LANGS) <= code < OTHER_LANG_CODE or OTHER_LANG_CODE + m <= code < NULL_LANG_CODE:
+            raise PostingError(f'invalid language code: {code}')
+    langs = array('B', codes.translate(table))
+    pos += n
+
+    # 5.から7.は最後まで続くので，まとめて読み込む．
+    values = decode_varints(view[pos:])
+    counts = array('I', values[n:2*n])
+    if len(counts) != n or len(values) != 2*n + sum(counts):
+        raise PostingError('the number of values does not match.')
+    return array('q', accumulate(values[:n])), langs, counts, array('I', values[2*n:])
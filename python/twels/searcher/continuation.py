@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""数式の検索結果の続きを表すtokenのためのmodule．
+tokenには前回の検索で最後に表示したページの(類似度, expr_id, uri_id)と，表示したページの数を記録する．
+次の検索ではsimilarity.iter_ranked()やsimilarity.iter_scores()のafterにその数式を指定して，
+最初から読み直さずに続きを検索する．
+
+同じページの別の数式が後で見つかった場合に同じページを2回表示しないように，
+それまでに確認したページのuri_idはtokenではなくSearcher.continuation_cacheに保存する．
+保存したuri_idが見つからない場合は，tokenを使わずにstartから検索する．
+"""
+import base64
+import binascii
+import hashlib
+import json
+from typing import NamedTuple
+
+
+class Continuation(NamedTuple):
+    """前回の検索で最後に表示したページの位置．"""
+    # 検索する数式のpath setとlr_listのhash値．違う検索のtokenは使わない．
+    query: str
+    # 表示したページの数．次の検索のstartになる．
+    page_count: int
+    score: float
+    expr_id: int
+    uri_id: int
+
+
+def query_hash(path_set: set[str], lr_list: list[str]) -> str:
+    """path setとlr_listのhash値を返す関数．順番によらず同じ値になる．"""
+    data = json.dumps([sorted(lr_list), sorted(path_set)], ensure_ascii=False)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()[:16]
+
+
+def encode(continuation: Continuation) -> str:
+    """URLにそのまま使える文字列にする関数．"""
+    data = json.dumps(list(continuation), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def decode(token: str) -> Continuation | None:
+    """encode()した文字列をContinuationに戻す関数．不正な文字列の場合はNoneを返す．"""
+    try:
+        data = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        query, page_count, score, expr_id, uri_id = json.loads(data)
+        return Continuation(str(query), int(page_count), float(score), int(expr_id), int(uri_id))
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        return None
+
+
+def state_key(token: str) -> str:
+    """tokenまでに確認したページのuri_idを保存するkeyを返す関数．"""
+    return 'twels:continuation:' + hashlib.sha256(token.encode('ascii')).hexdigest()
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""自然言語と数式を含む検索のためのmodule．
+"Fourier transform \\int f(x)e^{-ikx}dx"のような検索は自然言語の部分と数式の部分に分け，
+Searcherがそれぞれを同時に検索する．
+それぞれの検索結果の順位はreciprocal rank fusion(RRF)でuriごとに1つの順位にまとめる．
+"""
+import re
+from collections.abc import Callable
+
+# RRFの定数．大きいほど上位と下位の差が小さくなる．
+RRF_K = 60
+# 数式の中の単語として扱わない，自然言語の単語．
+# ASCIIの文字の場合は，数式の変数(x, dx)と区別するために3文字以上にする．
+# ギリシャ文字(α, π)と数学用の文字(ℏ, 𝑥)は数式の変数なので，単語の先頭にしない．
+NON_WORD_LETTERS = '\u0370-\u03ff\u1f00-\u1fff\u2100-\u214f\U0001d400-\U0001d7ff'
+WORD_PATTERN = re.compile(rf'[a-zA-Z]{{3,}}|[^\W\d_a-zA-Z{NON_WORD_LETTERS}][^\W\d_]*')
+# 数式の中でバックスラッシュなしで書かれることがある関数の名前．
+MATH_FUNCTIONS = {
+    'arccos', 'arcsin', 'arctan', 'cos', 'cosh', 'cot', 'csc', 'deg', 'det', 'dim', 'exp', 'gcd',
+    'inf', 'ker', 'lim', 'log', 'max', 'min', 'mod', 'sec', 'sin', 'sinh', 'sup', 'tan', 'tanh'
+}
+
+
+def fuse(rankings: list[list[dict]], start: int = 0, k: int = RRF_K) -> list[dict]:
+    """複数の検索結果をreciprocal rank fusionで1つにまとめる関数．
+    同じuriのページは1つにまとめ，最も順位が高い検索結果のページを使う．
+    Args:
+        rankings: 検索結果のリスト．それぞれの検索結果はstartから順に並んでいる．
+        start: 検索開始位置．順位はstart + 1から数える．
+    Returns:
+        RRFのscoreが高い順のページのリスト．scoreが同じ場合はrankingsで先に現れたページが先になる．
+    """
+    scores: dict[str, float] = {}
+    best: dict[str, tuple[int, dict]] = {}
+    for ranking in rankings:
+        for rank, page in enumerate(ranking, start + 1):
+            uri = page['uri']
+            scores[uri] = scores.get(uri, 0.0) + 1 / (k + rank)
+            if uri not in best or rank < best[uri][0]:
+                best[uri] = (rank, page)
+    return [best[uri][1] for uri in sorted(scores, key=lambda uri: -scores[uri])]
+
+
+def is_word(token: str) -> bool:
+    """空白で区切った数式の語の一部が自然言語の単語ならTrueを返す関数．"""
+    return WORD_PATTERN.fullmatch(token) is not None and token.lower() not in MATH_FUNCTIONS
+
+
+def split_query(terms: list[str], is_expr: Callable[[str], bool]) -> tuple[str, list[str]]:
+    """検索する語のリストを自然言語の部分と数式の部分に分ける関数．
+    数式の語は空白で区切り，続く数式の単語は1つの数式にまとめ，自然言語の単語は数式から除く．
+    数式の語が自然言語の単語を含まない場合は，その語をそのまま1つの数式にする．
+    Args:
+        terms: 検索する語のリスト．e.g. parse_url()の'q'．
+        is_expr: 数式かどうかを判別する関数．e.g. Searcher._is_expr()．
+    Returns:
+        (text, exprs): textは自然言語の部分を空白でつなげたもの．exprsは数式のLaTeXのリスト．
+    """
+    words: list[str] = []
+    exprs: list[str] = []
+    for term in terms:
+        if not is_expr(term):
+            words.append(term)
+            continue
+        tokens = term.split()
+        if not any(is_word(token) for token in tokens):
+            exprs.append(term)
+            continue
+        expr_tokens: list[str] = []
+        for token in tokens:
+            if is_word(token):
+                words.append(token)
+                if expr_tokens:
+                    exprs.append(' '.join(expr_tokens))
+                    expr_tokens = []
+            else:
+                expr_tokens.append(token)
+        if expr_tokens:
+            exprs.append(' '.join(expr_tokens))
+    return ' '.join(word.strip() for word in words if word.strip()), exprs
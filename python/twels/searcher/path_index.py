@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""path_dictionaryをメモリ上に持つ数式検索のためのindex．
+Cursor.path_index_config['enabled']がTrueのときは，Searcherは数式を検索するたびに
+path_dictionaryを読み込むのではなく，processごとに1回だけ読み込んだこのindexを使う．
+Falseのときや，読み込みに失敗したときはこれまで通りMySQLを使う．
+このindexの類似度はsimilarity.jaccard()で計算するので，search() stored functionと同じになることを
+実際のデータベースで確認してから有効にする(tests/benchmarks/check_similarity.py)．
+
+path_change table:
+    Indexerがpath_dictionaryを変更したときに，同じtransactionで変更を1つずつ記録するtable．
+    PathIndexはpoll_interval秒に1回，前回より後の変更を読み込んで反映する．
+    change_idはAUTO_INCREMENTなので，先に記録したtransactionが後からcommitされると，
+    それより大きいchange_idの変更を先に読み込むことがある．なので，前回読み込んだ最大のchange_idより
+    poll_window個前からもう一度読み込み，まだ反映していない変更があればそこから順に反映し直す．
+        CREATE TABLE path_change (
+            change_id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY,
+            expr_path (path_dictionary.expr_pathと同じ型) NOT NULL,
+            expr_size INT NOT NULL,
+            expr_id INT UNSIGNED NOT NULL,
+            is_added BOOLEAN NOT NULL
+        );
+"""
+import json
+import threading
+import time
+import traceback
+from array import array
+from collections.abc import Iterable, Iterator
+
+from twels.database.cursor import Cursor
+from twels.searcher import similarity
+from twels.utils.utils import print_in_red
+
+
+class PathIndex:
+    """path -> (expr_size -> expr_ids)のinverted index．
+    Notes:
+        1. pathの文字列は1回だけ保存し，indexではpath_idを使う。
+        2. expr_idsは小さい順に並べたarray('I')で保存する。
+           similarity.iter_scores()はarrayのexpr_idsをそのままCSR行列にしてNumPyで計算する。
+        3. 変更を反映するときはarrayを書き換えずに新しいarrayに置き換えるので，
+           検索中のthreadが持っているarrayは変わらない。
+        4. 変更は同じ(expr_path, expr_size, expr_id)について何度反映しても結果が同じなので，
+           読み込み中に記録された変更や，後からcommitされた変更より後の変更をもう一度反映しても問題ない。
+    """
+    # key: test, value: PathIndex．プロセス全体で共有する．
+    _indexes: dict[bool, 'PathIndex'] = {}
+    _indexes_lock = threading.Lock()
+
+    def __init__(self):
+        # {expr_path: path_id}
+        self._path_ids: dict[str, int] = {}
+        # path_idごとの{expr_size: expr_ids}
+        self._postings: list[dict[int, array]] = []
+        self._last_change_id = 0
+        # 最後のpoll_window個のchange_idのうち，反映したもの．
+        self._applied_change_ids: set[int] = set()
+        self._last_poll = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get(test: bool = False) -> 'PathIndex | None':
+        """プロセス全体で共有するPathIndexを返す関数．
+        初めて呼ばれたときにpath_dictionaryを読み込み，その後はpath_changeの変更を反映してから返す．
+        Args:
+            test: testのときにはTrueにする．
+        Returns:
+            無効になっているときや，読み込みに失敗したときはNone．
+        """
+        if not Cursor.path_index_config['enabled']:
+            return None
+        try:
+            index = __class__._indexes.get(test)
+            if index is None:
+                with __class__._indexes_lock:
+                    if test not in __class__._indexes:
+                        index = PathIndex()
+                        index.load(test)
+                        __class__._indexes[test] = index
+                    index = __class__._indexes[test]
+            index.poll(test)
+            return index
+        except Exception as e:
+            print_in_red(f'error in PathIndex.get(). {e}')
+            traceback.print_exc()
+            return None
+
+    @staticmethod
+    def clear():
+        """共有しているPathIndexを削除する関数．次のget()でもう一度読み込む．"""
+        with __class__._indexes_lock:
+            __class__._indexes.clear()
+
+    def load(self, test: bool = False):
+        """path_dictionaryの全てのレコードを読み込む関数．"""
+        with Cursor.connect(test) as cnx, Cursor.cursor(cnx) as cursor:
+            # 読み込み中に記録された変更は，次のpoll()で反映する．
+            last_change_id = Cursor.select_max_change_id_from_path_change(cursor)
+            rows = Cursor.select_all_from_path_dictionary(cursor)
+            self.load_rows(rows)
+        self._last_change_id = last_change_id
+        self._applied_change_ids = set()
+        self._last_poll = time.monotonic()
+
+    def load_rows(self, rows: Iterable[tuple[str, int, str | list[str]]]):
+        """path_dictionaryのレコードからindexを作る関数．
+        Args:
+            rows: [(expr_path, expr_size, expr_ids), ...] expr_idsはJSONの文字列でもよい．
+        """
+        path_ids: dict[str, int] = {}
+        postings: list[dict[int, array]] = []
+        for expr_path, expr_size, expr_ids in rows:
+            if isinstance(expr_ids, (str, bytes, bytearray)):
+                expr_ids = json.loads(expr_ids)
+            path_id = path_ids.setdefault(expr_path, len(path_ids))
+            if path_id == len(postings):
+                postings.append({})
+            postings[path_id][expr_size] = array('I', sorted(map(int, expr_ids)))
+        with self._lock:
+            self._path_ids = path_ids
+            self._postings = postings
+
+    def poll(self, test: bool = False):
+        """前回から poll_interval 秒以上経っていれば，path_changeの変更を反映する関数．"""
+        if time.monotonic() - self._last_poll < Cursor.path_index_config['poll_interval']:
+            return
+        self._last_poll = time.monotonic()
+        window = Cursor.path_index_config['poll_window']
+        with Cursor.connect(test) as cnx, Cursor.cursor(cnx) as cursor:
+            changes = Cursor.select_all_from_path_change_where_change_id_gt(cursor, max(self._last_change_id - window, 0))
+        self.apply_changes(changes, window)
+
+    def apply(self, changes: Iterable[tuple[str, int, int | str, bool]]):
+        """path_dictionaryの変更を記録した順に反映する関数．
+        Args:
+            changes: [(expr_path, expr_size, expr_id, is_added), ...]
+        """
+        with self._lock:
+            # {(path_id, expr_size): 変更後のexpr_idの集合}
+            touched: dict[tuple[int, int], set[int]] = {}
+            for expr_path, expr_size, expr_id, is_added in changes:
+                path_id = self._path_ids.get(expr_path)
+                if path_id is None:
+                    if not is_added:
+                        continue
+                    path_id = self._path_ids[expr_path] = len(self._postings)
+                    self._postings.append({})
+                key = (path_id, expr_size)
+                if key not in touched:
+                    touched[key] = set(self._postings[path_id].get(expr_size, ()))
+                if is_added:
+                    touched[key].add(int(expr_id))
+                else:
+                    touched[key].discard(int(expr_id))
+
+            for (path_id, expr_size), expr_ids in touched.items():
+                if expr_ids:
+                    self._postings[path_id][expr_size] = array('I', sorted(expr_ids))
+                else:
+                    self._postings[path_id].pop(expr_size, None)
+
+    def apply_changes(self, changes: list[tuple[int, str, int, int, bool]], window: int):
+        """path_changeのレコードのうち，まだ反映していないものがあれば反映する関数．
+        後からcommitされた変更は，それより後の変更と一緒にchange_idの順にもう一度反映する．
+        Args:
+            changes: change_idの順に並んだ[(change_id, expr_path, expr_size, expr_id, is_added), ...]
+            window: 反映したchange_idを覚えておく数．
+        """
+        first = next((i for i, change in enumerate(changes) if change[0] not in self._applied_change_ids), None)
+        if first is None:
+            return
+        changes = changes[first:]
+        self.apply((expr_path, expr_size, expr_id, is_added) for _, expr_path, expr_size, expr_id, is_added in changes)
+        self._last_change_id = max(self._last_change_id, changes[-1][0])
+        self._applied_change_ids.update(change[0] for change in changes)
+        self._applied_change_ids = {
+            change_id for change_id in self._applied_change_ids if change_id > self._last_change_id - window
+            }
+
+    def rows(self, path_set: set[str]) -> list[tuple[int, array]]:
+        """path_setのpathを含む数式の(expr_size, expr_ids)を返す関数．
+        Cursor.select_expr_size_and_expr_ids_from_path_dictionary_where_expr_path_in()と同じもの．
+        """
+        with self._lock:
+            return [
+                (expr_size, expr_ids)
+                for path_id in map(self._path_ids.get, path_set) if path_id is not None
+                for expr_size, expr_ids in self._postings[path_id].items()
+                ]
+
+    def iter_scores(self, path_set: set[str], after: tuple[float, int] | None = None) -> Iterator[tuple[int, float]]:
+        """(expr_id, 類似度)を類似度の高い順に返すgenerator．詳しくはsimilarity.iter_scores()を参照．"""
+        return similarity.iter_scores(self.rows(path_set), len(path_set), after)
+
+    def search(self, path_set: set[str], limit: int | None = None, offset: int = 0) -> list:
+        """Cursor.search()と同じ形式の[['expr_id', degree of similarity], ...]を返す関数。
+        類似度はsearch() stored functionではなくsimilarity.jaccard()で計算する。
+        """
+        return similarity.top_k(self.rows(path_set), len(path_set), limit, offset)
+
+    def __len__(self) -> int:
+        """登録されているpathの数．"""
+        return sum(1 for postings in self._postings if postings)
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""module description
+"""
+import hashlib
+import json
+import threading
+import time
+import traceback
+from collections import OrderedDict
+
+from twels.database.cursor import Cursor
+from twels.utils.utils import print_in_red
+
+
+class ResultCache:
+    """Searcher.search()の数式の検索結果を保存するためのクラス．スレッドセーフ．
+    Notes:
+        1. keyは検索する数式のpath set，start，lr_listとindexのgenerationから作る．
+           LaTeXの書き方が違っても，path setが同じなら同じ検索結果になる．
+        2. processのメモリ上のLRU cacheと，uWSGIのworkerで共有するcache(backend)の2段になっている．
+           backendはDjangoのcache frameworkのように get(key) と set(key, value, timeout) を持つobject．
+        3. Indexerがデータベースを更新するとindex_generation tableのgenerationが1増えるので，
+           それより前に保存した検索結果は使わない．generationはpoll_interval秒ごとに確認する．
+        4. 保存した検索結果はttl秒で期限切れになる．
+    """
+    def __init__(self, maxsize: int = 1000, ttl: float = 300, backend=None, poll_interval: float = 1):
+        """
+        Args:
+            maxsize: メモリ上に保存する検索結果の最大数．0の場合はメモリ上には保存しない．
+            ttl: 検索結果を保存する秒数．
+            backend: workerで共有するcache．Noneの場合は使わない．
+            poll_interval: index_generation tableを確認する間隔(秒)．
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.backend = backend
+        self.poll_interval = poll_interval
+
+        self._lock = threading.Lock()
+        # {key: (期限, result)}
+        self._memory: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        # (generation, 確認した時刻)
+        self._generation: tuple[int | None, float] = (None, float('-inf'))
+        self.memory_hits = 0
+        self.backend_hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0 or self.backend is not None
+
+    @staticmethod
+    def make_key(path_set: set[str], start: int, lr_list: list[str], generation: int) -> str:
+        """検索結果のkeyを返す関数．path setとlr_listは順番によらず同じkeyになる．"""
+        data = json.dumps([generation, start, sorted(lr_list), sorted(path_set)], ensure_ascii=False)
+        return 'twels:search:' + hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> dict | None:
+        """保存されている検索結果を返す関数．保存されていなければNoneを返す．"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires, result = entry
+                if expires > now:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return __class__._copy(result)
+                del self._memory[key]
+
+        result = self._backend_get(key)
+        with self._lock:
+            if result is None:
+                self.misses += 1
+                return None
+            self.backend_hits += 1
+            self._put_memory(key, result, now)
+        return __class__._copy(result)
+
+    def put(self, key: str, result: dict):
+        """検索結果を保存する関数．"""
+        result = __class__._copy(result)
+        with self._lock:
+            self._put_memory(key, result, time.monotonic())
+        if self.backend is not None:
+            try:
+                self.backend.set(key, result, self.ttl)
+            except Exception as e:
+                print_in_red(f'error in ResultCache.put(). {e}')
+
+    def generation(self, test: bool = False) -> int | None:
+        """indexのgenerationを返す関数．poll_interval秒以内に確認した場合はデータベースに問い合わせない．
+        generationが変わったときは，メモリ上の検索結果を全て削除する．
+        Returns:
+            generation．index_generation tableを読めなかった場合はNone．
+        """
+        now = time.monotonic()
+        generation, checked_at = self._generation
+        if now - checked_at < self.poll_interval:
+            return generation
+        try:
+            with Cursor.connect(test) as cnx:
+                with Cursor.cursor(cnx) as cursor:
+                    generation = Cursor.select_generation_from_index_generation(cursor)
+        except Exception as e:
+            print_in_red(f'error in ResultCache.generation(). {e}')
+            traceback.print_exc()
+            generation = None
+        with self._lock:
+            if generation != self._generation[0]:
+                self._memory.clear()
+            self._generation = (generation, now)
+        return generation
+
+    def clear(self):
+        """メモリ上の検索結果を全て削除する関数．backendの検索結果はttl秒で期限切れになる．"""
+        with self._lock:
+            self._memory.clear()
+            self._generation = (None, float('-inf'))
+
+    def stats(self) -> dict[str, int | float]:
+        """hitした回数とmissした回数を返す関数．"""
+        with self._lock:
+            lookups = self.memory_hits + self.backend_hits + self.misses
+            return {
+                'memory_hits': self.memory_hits,
+                'backend_hits': self.backend_hits,
+                'misses': self.misses,
+                'hit_ratio': (self.memory_hits + self.backend_hits) / lookups if lookups else 0.0,
+                'memory_size': len(self._memory),
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self.memory_hits = 0
+            self.backend_hits = 0
+            self.misses = 0
+
+    def _backend_get(self, key: str) -> dict | None:
+        if self.backend is None:
+            return None
+        try:
+            return self.backend.get(key)
+        except Exception as e:
+            print_in_red(f'error in ResultCache.get(). {e}')
+            return None
+
+    def _put_memory(self, key: str, result: dict, now: float):
+        """メモリ上のcacheに保存する関数．lockを取得した状態で呼び出す．"""
+        if self.maxsize <= 0:
+            return
+        self._memory[key] = (now + self.ttl, result)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    @staticmethod
+    def _copy(result: dict) -> dict:
+        """呼び出し側で検索結果のlistを変更してもcacheが変わらないようにする．"""
+        if 'search_result' not in result:
+            return dict(result)
+        return {**result, 'search_result': list(result['search_result'])}
@@ -1,15 +1,27 @@
 # -*- coding: utf-8 -*-
 """module description
 """
+import os
 import re
+import threading
+import time
+from collections.abc import Iterable
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import islice
 
 import latex2mathml.converter
 from lark import exceptions
 
 from twels.expr.expression import Expression
+from twels.expr.parse_cache import ParseCache
 from twels.expr.parser import Parser
 from twels.database.cursor import Cursor
 from twels.normalizer.normalizer import Normalizer
+from twels.searcher import continuation, hybrid, similarity
+from twels.searcher.continuation import Continuation
+from twels.searcher.path_index import PathIndex
+from twels.searcher.result_cache import ResultCache
+from twels.segment.segment_set import SegmentSet
 from twels.snippet.formatter import Formatter
 from twels.snippet.snippet import Snippet
 from twels.solr.client import get_solr_client
@@ -20,85 +32,213 @@ class Searcher:
     """
     # 検索結果として表示する数
     search_num = 10
+    # 1つのqueryでinfoを取得する数式の数
+    expr_batch_size = 20
+    # 数式の検索結果のcache．backendはfront/twelS/wsgi.pyで設定する．
+    result_cache = ResultCache(
+        maxsize=int(os.environ.get('SEARCH_CACHE_SIZE', 1000)),
+        ttl=float(os.environ.get('SEARCH_CACHE_TTL', 300)),
+        poll_interval=float(os.environ.get('SEARCH_CACHE_POLL_INTERVAL', 1)),
+    )
+    # 検索するLaTeXから求めたpath setのcache．ページを送ると同じLaTeXを何度も検索する．
+    query_cache = ParseCache(maxsize=int(os.environ.get('QUERY_CACHE_SIZE', 10000)))
+    # 検索結果の続きのtokenまでに確認したページのuri_id．詳しくはtwels/searcher/continuation.pyを参照．
+    continuation_cache = ResultCache(
+        maxsize=int(os.environ.get('CONTINUATION_CACHE_SIZE', 10000)),
+        ttl=float(os.environ.get('CONTINUATION_CACHE_TTL', 1800)),
+    )
+    # 自然言語と数式を含む検索で，Solrと数式のindexを同時に検索するthreadの数．
+    hybrid_workers = int(os.environ.get('HYBRID_WORKERS', 8))
+    # 自然言語と数式を含む検索で，それぞれの検索結果を待つ秒数．時間内に返らなかった検索結果は使わない．
+    hybrid_budgets = {
+        'text': float(os.environ.get('HYBRID_TEXT_BUDGET', 1.0)),
+        'formula': float(os.environ.get('HYBRID_FORMULA_BUDGET', 3.0)),
+    }
+
+    _hybrid_executor: ThreadPoolExecutor | None = None
+    _hybrid_executor_pid = 0
+    _hybrid_executor_lock = threading.Lock()
 
     @staticmethod
-    def search(query: str, start: int, lr_list: list[str], test: bool = False) -> dict:
+    def search(query: str | list[str], start: int, lr_list: list[str], test: bool = False,
+               after: str | None = None) -> dict:
         """
         Args:
-            query: 検索する自然言語または数式（LaTeX）。
+            query: 検索する自然言語または数式（LaTeX）。検索する語のリスト(parse_url()の'q')でもよい。
+                自然言語と数式を両方含む場合は，それぞれを同時に検索して検索結果をまとめる。
             start: 検索開始位置。
             lr_list: 検索対象の言語のリスト。
             test: testのときにはTrueにする。
+            after: 前回の検索結果の'next'。指定した場合はstartではなくtokenの位置から検索する。
         Returns:
             {
                 'search_result': search result.
                 'has_next': 未表示の検索結果が残っていればTrue。
+                'next': 続きを検索するためのtoken。続きがない場合はNone。
+                'query_count': この検索でデータベースに送ったqueryの数。
+                'cache_hit': 保存した検索結果を返した場合はTrue。
+                'compile_time': 数式のLaTeXをpath setに変換するのにかかった秒数。自然言語の場合は0。
+                'timed_out': 自然言語と数式を含む検索で，時間内に結果が返らなかった検索('text'または'formula')のリスト。
             }
         """
+        Cursor.reset_query_count()
         # LaTeX -> MathML -> Tree (-> Normalize) -> path set
         try:
-            if __class__._is_expr(query):
-                return __class__._search_expr(query, start, lr_list, test)
+            terms = query if isinstance(query, list) else [query]
+            text, exprs = hybrid.split_query(terms, __class__._is_expr)
+            if len(exprs) + bool(text) > 1:
+                result = __class__._search_hybrid(text, exprs, start, lr_list, test)
+            elif exprs:
+                result = __class__._search_expr(exprs[0], start, lr_list, test, after)
             else:
-                return __class__._search_natural_lang(query)
+                result = __class__._search_natural_lang(text, start, lr_list)
 
         except exceptions.LarkError:
-            return {
+            result = {
                 'search_result': [],
                 'has_next': False
             }
         except Exception:
-            return {
+            result = {
                 'search_result': [],
                 'has_next': False
             }
+        result['query_count'] = Cursor.get_query_count()
+        result.setdefault('cache_hit', False)
+        result.setdefault('compile_time', 0.0)
+        result.setdefault('next', None)
+        result.setdefault('timed_out', [])
+        return result
+
+    @staticmethod
+    def _compile_query(latex: str) -> set[str]:
+        """検索する数式のLaTeXをpath setに変換する関数。
+        LaTeX -> MathML -> Tree (-> Normalize) -> path set の結果をSearcher.query_cacheに保存する。
+        """
+        latex = latex.strip()
+        path_set = __class__.query_cache.get(latex)
+        if path_set is not None:
+            return path_set
+        mathml = latex2mathml.converter.convert(latex)
+        path_set = Parser.parse(Expression(mathml))
+        __class__.query_cache.put(latex, path_set)
+        return path_set
+
+    @staticmethod
+    def _get_first(value: str | list[str]) -> str:
+        """Solrのフィールドの値を返す関数。複数の値を持つフィールドの場合は最初の値を返す。"""
+        if isinstance(value, list):
+            return value[0] if value else ''
+        return value
+
+    @staticmethod
+    def _get_hybrid_executor() -> ThreadPoolExecutor:
+        """自然言語と数式を含む検索で使うthread poolを返す関数．
+        forkされた場合は親プロセスのpoolは使えないので作り直す．
+        """
+        with __class__._hybrid_executor_lock:
+            if __class__._hybrid_executor is None or __class__._hybrid_executor_pid != os.getpid():
+                __class__._hybrid_executor = ThreadPoolExecutor(
+                    max_workers=__class__.hybrid_workers, thread_name_prefix='hybrid-search')
+                __class__._hybrid_executor_pid = os.getpid()
+            return __class__._hybrid_executor
 
     @staticmethod
-    def _get_search_result(score_list: list, start: int, lr_list: list[str], test: bool = False) -> tuple[list[dict], bool]:
+    def _get_search_result(scores: Iterable[tuple[int, float]], start: int, lr_list: list[str], test: bool = False,
+                           segments: SegmentSet | None = None,
+                           seen: set[int] | None = None) -> tuple[list[dict], bool, tuple[tuple[float, int, int], set[int]] | None]:
         """uri_idをクエリにpage tableからpageの情報を取得して返す関数．
         Args:
-            score_list: [['expr_id', degree of similarity], ...]
-                e.g. [['10', 0.8], ['3', 0.7], ['23', 0.4]]
+            scores: 類似度の高い順の(expr_id, degree of similarity)．
+                e.g. similarity.iter_ranked()やsimilarity.iter_scores()の戻り値．
             start: 検索開始位置。
             test: testのときにはTrueにする。
+            segments: 指定した場合は数式のinfoをinverted_indexではなくsegmentから取得する。
+            seen: 前回の検索までに確認したページのuri_id。指定した場合は，scoresは前回の検索で
+                最後に表示した数式から始まり，startは前回までに表示したページの数とする。
         Returns:
-            (search_result, has_next)
+            (search_result, has_next, last)
             search_result: uri, title, snippetをkeyに持つdictionaryのリスト。
             has_next: 未表示の検索結果が残っていればTrue。
+            last: ((類似度, expr_id, uri_id), 確認したページのuri_id)。最後に表示したページと，
+                それまでに確認したページ。続きを検索するときに使う。表示したページがない場合はNone。
+        Notes:
+            数式ごと，ページごとにqueryを実行するのではなく，
+            expr_batch_size個の数式のinfoと，候補のページのuri_idをそれぞれIN (...)でまとめて取得する．
+            表示するページのuri, title, snippetは最後に1つのqueryで取得する．
+            scoresは必要なページが揃うまでexpr_batch_size個ずつ読み進めるので，
+            それより後の数式の類似度は計算されない．
         """
-        page_count = 0
-        result_uri_ids = []
-        search_result: list[dict] = []
+        # 表示するページと，次のページがあるかを確認するための1ページ
+        needed = start + __class__.search_num + 1
+        page_count = start if seen is not None else 0
+        counted_uri_ids = set(seen) if seen is not None else set()
+        # 確認した順のuri_id
+        counted_order: list[int] = []
+        # [(uri_id, expr_start_pos, expr_len), ...] 表示するページ
+        result_pages: list[tuple[int, list[int], int]] = []
+        # ((類似度, expr_id, uri_id), 確認したuri_idの数) 最後に表示したページ
+        last: tuple[tuple[float, int, int], int] | None = None
 
-        for score in score_list:
-            expr_id: str = score[0]
-            with (Cursor.connect(test) as cnx, Cursor.cursor(cnx) as cursor):
-                info, expr_len = Cursor.select_info_and_len_from_inverted_index_where_expr_id_1(cursor, int(expr_id))
+        with (Cursor.connect(test) as cnx, Cursor.cursor(cnx) as cursor):
+            scores = iter(scores)
+            while batch_scores := list(islice(scores, __class__.expr_batch_size)):
+                expr_ids = [int(expr_id) for expr_id, _ in batch_scores]
+                if segments is not None:
+                    infos = segments.infos(expr_ids)
+                else:
+                    infos = Cursor.select_info_and_len_from_inverted_index_where_expr_id_in(cursor, expr_ids)
 
-                for j, uri_id in enumerate(info.uri_id_list):
-                    expr_start_pos = info.expr_start_pos_list[j]
-                    if (info.lang_list[j] not in lr_list) or\
-                       (uri_id in result_uri_ids) or\
-                       (not expr_start_pos):
+                # [(uri_id, expr_start_pos, expr_len, ((類似度, expr_id, uri_id), 確認したuri_idの数)), ...] 類似度の高い順
+                candidates = []
+                for expr_id, score in batch_scores:
+                    expr_id = int(expr_id)
+                    if expr_id not in infos:
                         continue
+                    info, expr_len = infos[expr_id]
+                    for uri_id, lang, expr_start_pos in info.pages():
+                        if (lang not in lr_list) or\
+                           (uri_id in counted_uri_ids) or\
+                           (not expr_start_pos):
+                            continue
+                        counted_uri_ids.add(uri_id)
+                        counted_order.append(uri_id)
+                        candidates.append((uri_id, expr_start_pos, expr_len, ((score, expr_id, uri_id), len(counted_order))))
 
-                    page_info = Cursor.select_all_from_page_where_uri_id_1(cursor, uri_id)
-                    if page_info is None:
-                        continue
-                    if start <= page_count:
-                        if len(search_result) < __class__.search_num:
-                            search_result.append(__class__._search_result(
-                                page_info[0],
-                                page_info[3],
-                                Formatter.format(Snippet(page_info[4], clean=False), expr_start_pos, expr_len)
-                            ))
-                            result_uri_ids.append(uri_id)
-                        else:
-                            # (search_num + 1)個の検索結果があるとき
-                            return search_result, True
-                    page_count += 1
-
-        return search_result, False
+                # 残りの必要なページの数だけpage tableに登録されているかを確認する．
+                j = 0
+                while j < len(candidates) and page_count < needed:
+                    batch = candidates[j:j+needed-page_count]
+                    j += len(batch)
+                    registered = Cursor.select_uri_id_from_page_where_uri_id_in(cursor, [uri_id for uri_id, _, _, _ in batch])
+                    for uri_id, expr_start_pos, expr_len, position in batch:
+                        if uri_id not in registered:
+                            continue
+                        if start <= page_count < needed - 1:
+                            result_pages.append((uri_id, expr_start_pos, expr_len))
+                            last = position
+                        page_count += 1
+
+                if page_count >= needed:
+                    break
+
+            rows = Cursor.select_uri_title_snippet_from_page_where_uri_id_in(cursor, [uri_id for uri_id, _, _ in result_pages])
+
+        search_result: list[dict] = []
+        for uri_id, expr_start_pos, expr_len in result_pages:
+            if uri_id not in rows:
+                # 確認した後に削除されたページ
+                continue
+            uri, title, snippet = rows[uri_id]
+            search_result.append(__class__._search_result(
+                uri,
+                title,
+                Formatter.format(Snippet(snippet, clean=False, lazy=True), expr_start_pos, expr_len)
+            ))
+        if last is not None:
+            position, counted = last
+            last = (position, (seen or set()) | set(counted_order[:counted]))
+        return search_result, page_count >= needed, last
 
     @staticmethod
     def _is_expr(s: str) -> bool:
@@ -116,58 +256,196 @@ class Searcher:
         return result is not None
 
     @staticmethod
-    def _search_expr(latex: str, start: int, lr_list: list[str], test: bool = False) -> dict:
+    def _resume(token: str | None, path_set: set[str], lr_list: list[str]) -> tuple[Continuation, set[int]] | None:
+        """続きを検索するためのtokenを読み込む関数。
+        Returns:
+            (continuation, seen)。tokenが不正な場合，違う検索のtokenの場合，
+            確認したページのuri_idが保存されていない場合はNone。その場合はstartから検索する。
+        """
+        if not token:
+            return None
+        position = continuation.decode(token)
+        if position is None or position.query != continuation.query_hash(path_set, lr_list):
+            return None
+        state = __class__.continuation_cache.get(continuation.state_key(token))
+        if state is None:
+            return None
+        return position, set(state['seen'])
+
+    @staticmethod
+    def _search_expr(latex: str, start: int, lr_list: list[str], test: bool = False, after: str | None = None) -> dict:
         """数式を検索する関数。
         Args:
             latex: 検索する数式（LaTeX）。
             start: 検索開始位置。
             lr_list: 検索対象の言語のリスト。
             test: testのときにはTrueにする。
+            after: 前回の検索結果の'next'。
         Returns:
             {
                 'search_result': search result.
                 'has_next': 未表示の検索結果が残っていればTrue。
+                'next': 続きを検索するためのtoken。
             }
         """
-        mathml = latex2mathml.converter.convert(latex)
-        path_set: set[str] = Parser.parse(Expression(mathml))
+        start_time = time.perf_counter()
+        path_set = __class__._compile_query(latex)
+        compile_time = time.perf_counter() - start_time
         print('path_set:', str(path_set))
-        with (Cursor.connect(test) as cnx, Cursor.cursor(cnx) as cursor):
-            score_list = Cursor.search(cursor, path_set)
 
-        search_result, has_next = __class__._get_search_result(score_list, start, lr_list, test)
+        resume = __class__._resume(after, path_set, lr_list)
+        if resume is not None:
+            start = resume[0].page_count
+
+        # テスト用のデータベースはテストごとに書き換えるので，testのときは検索結果を保存しない．
+        cache = __class__.result_cache
+        key = None
+        if cache.enabled and not test:
+            generation = cache.generation(test)
+            if generation is not None:
+                key = cache.make_key(path_set, start, lr_list, generation)
+                result = cache.get(key)
+                if result is not None:
+                    result['cache_hit'] = True
+                    result['compile_time'] = compile_time
+                    return result
+
+        result = __class__._search_path_set(path_set, start, lr_list, test, resume)
+        if key is not None:
+            cache.put(key, result)
+        result['compile_time'] = compile_time
+        return result
+
+    @staticmethod
+    def _search_hybrid(text: str, exprs: list[str], start: int, lr_list: list[str], test: bool = False) -> dict:
+        """自然言語と数式を含む検索をする関数。
+        Solrと数式のindexを別のthreadで同時に検索し，検索結果をreciprocal rank fusionでまとめる。
+        Searcher.hybrid_budgetsの秒数以内に返らなかった検索結果は使わない。
+        それぞれの検索で先頭からstart + search_num + 1個を検索してまとめ，start番目からsearch_num個を返す。
+        Args:
+            text: 検索する自然言語。
+            exprs: 検索する数式（LaTeX）のリスト。
+            start: まとめた検索結果の検索開始位置。
+            lr_list: 検索対象の言語のリスト。
+            test: testのときにはTrueにする。
+        """
+        executor = __class__._get_hybrid_executor()
+        start_time = time.perf_counter()
+        # 順位が同じ場合は数式の検索結果を先に表示する。
+        # 表示するページと，次のページがあるかを確認するための1ページ
+        needed = start + __class__.search_num + 1
+        futures: list[tuple[str, Future]] = [
+            ('formula', executor.submit(__class__._search_top, latex, needed, lr_list, test)) for latex in exprs
+        ]
+        if text:
+            futures.append(('text', executor.submit(__class__._search_top, text, needed, lr_list, test)))
+
+        results: list[dict] = []
+        timed_out: list[str] = []
+        for backend, future in futures:
+            timeout = start_time + __class__.hybrid_budgets[backend] - time.perf_counter()
+            try:
+                results.append(future.result(timeout=max(timeout, 0)))
+            except TimeoutError:
+                # 実行中の検索は止められないので，結果を使わないだけにする。
+                future.cancel()
+                timed_out.append(backend)
+
+        # それぞれのthreadでデータベースに送ったqueryの数も数える。
+        Cursor.add_query_count(sum(result['query_count'] for result in results))
+        # 毎回先頭からまとめるので，前のページに表示した検索結果は次のページには表示しない。
+        fused = hybrid.fuse([result['search_result'] for result in results])
         return {
-            'search_result': search_result,
-            'has_next': has_next
-            }
+            'search_result': fused[start:start + __class__.search_num],
+            'has_next': len(fused) > start + __class__.search_num or any(result['has_next'] for result in results),
+            'cache_hit': bool(results) and all(result['cache_hit'] for result in results),
+            'compile_time': max((result['compile_time'] for result in results), default=0.0),
+            'timed_out': timed_out,
+        }
 
     @staticmethod
-    def _search_natural_lang(query: str) -> dict:
+    def _search_natural_lang(query: str, start: int, lr_list: list[str]) -> dict:
         """自然言語を検索する関数。
-        TODO: start, lr_listへの対応。
+        start，表示する数，検索対象の言語はSolrに指定し，表示するページの分だけを取得する。
+        Args:
+            query: 検索する自然言語。
+            start: 検索開始位置。
+            lr_list: 検索対象の言語のリスト。
         """
+        # 数式の検索と同じように，検索対象の言語がない場合は何も表示しない。
+        if not lr_list:
+            return {
+                'search_result': [],
+                'has_next': False
+            }
+
         solr = get_solr_client()
+        # 次のページがあるか分かるように1つ多く取得する。
         results = solr.search(f'text:{query}', **{
+            'start': start,
+            'rows': __class__.search_num + 1,
+            # langがないドキュメントは表示されないので，twels.solr.indexerで全てのページにlangを付けて登録する。
+            'fq': 'lang:(' + ' OR '.join(f'"{lang}"' for lang in lr_list) + ')',
+            'fl': 'id,url,title',
             'hl': 'true',
             'hl.fl': 'content',
             'hl.fragsize': 300,
             'hl.tag.pre': '<span class="hl">',
             'hl.tag.post': '</span>',
+            # contentがhitしなかった場合は先頭を表示する。
+            'hl.alternateField': 'content',
+            'hl.maxAlternateFieldLength': 300,
         })
 
         search_result: list[dict] = []
 
-        for result in results:
+        for result in islice(results, __class__.search_num):
+            highlighting = results.highlighting.get(result['id'], {})
             search_result.append(__class__._search_result(
-                result['url'],
-                result['title'][0],
-                Snippet(results.highlighting[result['id']]['content'][0], clean=False)
+                __class__._get_first(result.get('url', '')),
+                __class__._get_first(result.get('title', '')),
+                Snippet(__class__._get_first(highlighting.get('content', '')), clean=False)
             ))
 
-        # TODO: has_nextの更新。
         return {
             'search_result': search_result,
-            'has_next': False
+            'has_next': results.hits > start + __class__.search_num
+            }
+
+    @staticmethod
+    def _search_path_set(path_set: set[str], start: int, lr_list: list[str], test: bool = False,
+                         resume: tuple[Continuation, set[int]] | None = None) -> dict:
+        """path setが似ている数式を検索する関数。Searcher._search_expr()の戻り値と同じ形式で返す。
+        resumeを指定した場合は，前回の検索で最後に表示した数式から検索する。
+        """
+        after = (resume[0].score, resume[0].expr_id) if resume is not None else None
+        # 検索全体の処理で同じconnectionを使い回す．
+        with Cursor.connect(test) as cnx:
+            segments = SegmentSet.get(test)
+            path_index = PathIndex.get(test) if segments is None else None
+            if segments is not None:
+                scores = segments.iter_scores(path_set, after)
+            elif path_index is not None:
+                scores = path_index.iter_scores(path_set, after)
+            else:
+                with Cursor.cursor(cnx) as cursor:
+                    scores = Cursor.select_search(cursor, path_set)
+                # search() stored functionの類似度を，必要な数式の分だけ順に並べる．
+                scores = similarity.iter_ranked(scores, after)
+
+            search_result, has_next, last = __class__._get_search_result(
+                scores, start, lr_list, test, segments, resume[1] if resume is not None else None)
+
+        token = None
+        if has_next and last is not None:
+            (score, expr_id, uri_id), seen = last
+            token = continuation.encode(Continuation(
+                continuation.query_hash(path_set, lr_list), start + __class__.search_num, score, expr_id, uri_id))
+            __class__.continuation_cache.put(continuation.state_key(token), {'seen': sorted(seen)})
+        return {
+            'search_result': search_result,
+            'has_next': has_next,
+            'next': token
             }
 
     @staticmethod
@@ -178,3 +456,31 @@ class Searcher:
             'title': title,
             'snippet': snippet
         }
+
+    @staticmethod
+    def _search_top(query: str, num: int, lr_list: list[str], test: bool = False) -> dict:
+        """queryの検索結果を先頭からnum個まで返す関数。search_num個ずつ検索してつなげる。
+        数式の検索は前回の検索結果の'next'から続きを検索する。
+        Returns:
+            Searcher.search()と同じ形式。query_countはそれぞれの検索のqueryの数の合計。
+        """
+        result = {'search_result': [], 'has_next': True, 'next': None}
+        search_result: list[dict] = []
+        query_count = 0
+        cache_hit = True
+        compile_time = 0.0
+        start = 0
+        while start < num and result['has_next']:
+            result = __class__.search(query, start, lr_list, test, result['next'])
+            search_result.extend(result['search_result'])
+            query_count += result['query_count']
+            cache_hit = cache_hit and result['cache_hit']
+            compile_time += result['compile_time']
+            start += __class__.search_num
+        return {
+            'search_result': search_result[:num],
+            'has_next': len(search_result) > num or result['has_next'],
+            'query_count': query_count,
+            'cache_hit': cache_hit,
+            'compile_time': compile_time,
+        }
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""数式の類似度の高い数式から順に返すためのmodule．
+
+検索結果の類似度はデータベースのsearch() stored functionが計算したものを使う(Cursor.select_search())．
+stored functionは[['expr_id', 類似度], ...]を順番を決めずに返すので，
+rank()とiter_ranked()は類似度の高い順に，必要な分だけ並べる．
+stored functionが返す順番は検索するたびに同じとは限らないので，類似度が同じ数式はexpr_idの小さい順にする．
+これはtop_k()やiter_scores()と同じ順番なので，afterで続きを検索しても数式が抜けたり重複したりしない．
+
+jaccard()からtop_k()までは，データベースを使わないPathIndexとSegmentSetのための類似度の計算である．
+数式の類似度をpath setのJaccard係数 |Q ∩ E| / |Q ∪ E| として計算する．
+path_dictionaryのexpr_sizeは|E|なので，共通するpathの数|Q ∩ E|を数えれば類似度が決まる．
+これがsearch() stored functionと同じ類似度になることは確かめていないので，
+PathIndexやSegmentSetを有効にする前に実際のデータベースで検索結果が一致することを確認すること．
+    python -m benchmarks.check_similarity --segment-dir DIR
+
+類似度は|Q|と|E|だけで決まる上限 min(|Q|, |E|) / max(|Q|, |E|) を持つので，
+expr_sizeごとに上限の大きい順に計算し，残りのexpr_sizeの上限よりも類似度が大きい数式から順に返す．
+必要な数の数式を返した時点で計算を止めれば，'x'のような多くの数式に含まれるpathで検索しても
+全ての数式の類似度を計算してsortする必要はない．
+
+計算はNumPyで行う．path_dictionaryのレコードを行，expr_idを列とするCSR行列を作り，
+列ごとの要素の数(共通するpathの数)と類似度を数式ごとのloopなしでまとめて求める．
+まとめて計算するレコードは上限の大きいexpr_sizeから順に選び，その数は計算するたびに2倍にする．
+"""
+import heapq
+from array import array
+from collections.abc import Iterable, Iterator
+from itertools import islice
+
+import numpy as np
+
+# 1回でまとめて計算するexpr_idの数の最初の目安．1回計算するごとに2倍にする．
+FIRST_BATCH_SIZE = 4096
+
+# JSONのexpr_idsをnp.fromstring()で読み込めるようにするための表．
+_JSON_CHARS = str.maketrans('', '', '[]" ')
+
+
+def iter_ranked(scores: Iterable[list | tuple], after: tuple[float, int] | None = None) -> Iterator[tuple[int, float]]:
+    """search() stored functionの[['expr_id', 類似度], ...]を類似度の高い順に(expr_id, 類似度)として返すgenerator．
+    類似度が同じ場合はexpr_idの小さい順に返す．
+    heapにしてから1つずつ取り出すので，必要な数式を返した時点で残りの数式は並べない．
+    Args:
+        scores: Cursor.select_search()の戻り値．
+        after: (類似度, expr_id)．指定した場合は，その数式から返す．
+            前回の検索で最後に表示した数式から続きを検索するときに使う．
+    """
+    heap = [(-score, int(expr_id)) for expr_id, score in scores]
+    if after is not None:
+        # afterより前の数式は返さない．
+        heap = [(neg_score, expr_id) for neg_score, expr_id in heap
+                if -neg_score < after[0] or (-neg_score == after[0] and expr_id >= after[1])]
+    heapq.heapify(heap)
+    while heap:
+        neg_score, expr_id = heapq.heappop(heap)
+        yield expr_id, -neg_score
+
+
+def jaccard(shared: int, query_size: int, expr_size: int) -> float:
+    """path setのJaccard係数を返す関数．
+    Args:
+        shared: 検索する数式と共通するpathの数．
+        query_size: 検索する数式のpathの数．
+        expr_size: 数式のpathの数．
+    """
+    return shared / (query_size + expr_size - shared)
+
+
+def upper_bound(query_size: int, expr_size: int) -> float:
+    """pathの数がexpr_sizeの数式の類似度の上限を返す関数．"""
+    return min(query_size, expr_size) / max(query_size, expr_size)
+
+
+def rank(scores: Iterable[list | tuple], limit: int | None = None, offset: int = 0) -> list[list]:
+    """search() stored functionの[['expr_id', 類似度], ...]を類似度の高い順に並べ，offset番目からlimit個を返す関数．
+    類似度が同じ場合はexpr_idの小さい順にする．
+    limitを指定した場合はheapq.nsmallest()で上位offset + limit個だけを選ぶ．
+    """
+    def key(x):
+        return -x[1], int(x[0])
+
+    if limit is None:
+        return sorted(scores, key=key)[offset:]
+    return heapq.nsmallest(offset + limit, scores, key=key)[offset:]
+
+
+def to_expr_ids(expr_ids: str | bytes | bytearray | list | array) -> np.ndarray:
+    """path_dictionaryのexpr_idsを整数のndarrayにする関数．
+    JSONの文字列はjson.loads()をせずにnp.fromstring()で読み込む．
+    """
+    if isinstance(expr_ids, (bytes, bytearray)):
+        expr_ids = expr_ids.decode('utf-8')
+    if isinstance(expr_ids, str):
+        return np.fromstring(expr_ids.translate(_JSON_CHARS), dtype=np.int64, sep=',')
+    if isinstance(expr_ids, np.ndarray) and expr_ids.dtype.kind in 'iu':
+        # segmentのmmapを参照するarrayはコピーしない．
+        return expr_ids
+    if isinstance(expr_ids, (list, array, np.ndarray)):
+        return np.asarray(expr_ids, dtype=np.int64)
+    raise TypeError(f'expr_ids must be JSON, list or array, but {type(expr_ids)}.')
+
+
+def to_csr(rows: Iterable[tuple[int, str | list | array]]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """path_dictionaryのレコードをCSR行列にする関数．
+    Args:
+        rows: [(expr_size, expr_ids), ...]
+    Returns:
+        (indptr, indices, row_sizes)
+        indptr: i番目のレコードのexpr_idはindices[indptr[i]:indptr[i+1]]．
+        indices: 全てのレコードのexpr_idを並べたもの．
+        row_sizes: i番目のレコードのexpr_size．
+    """
+    row_sizes = []
+    postings = []
+    for expr_size, expr_ids in rows:
+        row_sizes.append(expr_size)
+        postings.append(to_expr_ids(expr_ids))
+    indptr = np.zeros(len(postings) + 1, dtype=np.int64)
+    np.cumsum([len(expr_ids) for expr_ids in postings], out=indptr[1:])
+    indices = np.concatenate(postings) if postings else np.empty(0, dtype=np.int64)
+    return indptr, indices, np.asarray(row_sizes, dtype=np.int64)
+
+
+def score_csr(indptr: np.ndarray, indices: np.ndarray, row_sizes: np.ndarray, query_size: int) -> tuple[np.ndarray, np.ndarray]:
+    """CSR行列の全ての列(数式)の類似度をまとめて計算する関数．
+    Returns:
+        (expr_ids, scores): expr_idの小さい順．
+    Notes:
+        1つのレコードに同じexpr_idは含まれず，1つの数式のexpr_sizeは1つなので，
+        列の要素の数が共通するpathの数になり，列のどの要素のexpr_sizeも同じになる．
+    """
+    expr_ids, first, shared = np.unique(indices, return_index=True, return_counts=True)
+    expr_sizes = np.repeat(row_sizes, np.diff(indptr))[first]
+    return expr_ids, shared / (query_size + expr_sizes - shared)
+
+
+def _sort(expr_ids: np.ndarray, scores: np.ndarray) -> np.ndarray:
+    """類似度の高い順，同じ場合はexpr_idの小さい順に並べるindexを返す関数．"""
+    return np.lexsort((expr_ids, -scores))
+
+
+def iter_scores(rows: Iterable[tuple[int, str | list | array]], query_size: int,
+                after: tuple[float, int] | None = None) -> Iterator[tuple[int, float]]:
+    """(expr_id, 類似度)を類似度の高い順に返すgenerator．
+    類似度が同じ場合はexpr_idの小さい順に返す．
+    Args:
+        rows: 検索する数式のpathのpath_dictionaryのレコードの(expr_size, expr_ids)．
+            expr_idsはJSONの文字列のままでもよい．JSONは計算するときに読み込む．
+        query_size: 検索する数式のpathの数．
+        after: (類似度, expr_id)．指定した場合は，その数式から返す．
+            前回の検索で最後に表示した数式から続きを検索するときに使う．
+    """
+    if query_size <= 0:
+        return
+
+    # {expr_size: [expr_ids, ...]}
+    groups: dict[int, list] = {}
+    for expr_size, expr_ids in rows:
+        groups.setdefault(expr_size, []).append(expr_ids)
+    sizes = sorted(groups, key=lambda expr_size: (-upper_bound(query_size, expr_size), expr_size))
+
+    # 計算済みで，まだ返していない数式．
+    pending_ids = np.empty(0, dtype=np.int64)
+    pending_scores = np.empty(0, dtype=np.float64)
+    batch_size = FIRST_BATCH_SIZE
+    i = 0
+    while i < len(sizes):
+        # 上限の大きいexpr_sizeから順に，expr_idの数がbatch_size以上になるまでまとめて計算する．
+        batch_rows = []
+        num = 0
+        while i < len(sizes) and num < batch_size:
+            for expr_ids in groups.pop(sizes[i]):
+                expr_ids = to_expr_ids(expr_ids)
+                batch_rows.append((sizes[i], expr_ids))
+                num += len(expr_ids)
+            i += 1
+        batch_size *= 2
+        expr_ids, scores = score_csr(*to_csr(batch_rows), query_size)
+        if after is not None:
+            # afterより前の数式は返さない．
+            keep = (scores < after[0]) | ((scores == after[0]) & (expr_ids >= after[1]))
+            expr_ids, scores = expr_ids[keep], scores[keep]
+        pending_ids = np.concatenate((pending_ids, expr_ids))
+        pending_scores = np.concatenate((pending_scores, scores))
+
+        # まだ計算していない数式の類似度はbound以下なので，boundより大きい数式の順位は変わらない．
+        bound = upper_bound(query_size, sizes[i]) if i < len(sizes) else -1.0
+        ready = pending_scores > bound
+        order = _sort(pending_ids[ready], pending_scores[ready])
+        yield from zip(pending_ids[ready][order].tolist(), pending_scores[ready][order].tolist())
+        pending_ids = pending_ids[~ready]
+        pending_scores = pending_scores[~ready]
+
+
+def top_k(rows: Iterable[tuple[int, str | list | array]], query_size: int, limit: int | None = None, offset: int = 0) -> list[list]:
+    """類似度の高い順にoffset番目からlimit個の['expr_id', 類似度]を返す関数．
+    limitがNoneの場合は最後まで返す．
+    """
+    stop = None if limit is None else offset + limit
+    return [[str(expr_id), score] for expr_id, score in islice(iter_scores(rows, query_size), offset, stop)]
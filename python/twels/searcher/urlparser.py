@@ -14,6 +14,8 @@ def parse_url(query: str) -> dict:
     Notes:
         '%20'は'a \lt b'等、LaTeXの区切り文字を表す。
         '+'はクエリの区切り文字を表す。
+        'after'は検索結果の続きのtokenで，URLに含まれるときだけkeyになる。
+        tokenが使えない場合のために，'start'も残している。
     """
     url_params = {
         'q': [],
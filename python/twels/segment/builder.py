@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""MySQLのpath_dictionaryとinverted_indexからsegment fileを作るscript．
+作ったsegmentだけをmanifest.jsonに書き，前のsegment fileは削除する．
+検索中のworkerが開いているsegment fileは，削除してもmmapを閉じるまで読み込める．
+segmentを使う場合，Indexerはpath_dictionaryを更新せずにsegmentの差分を書き込むので(twels/segment/updater.pyを参照)，
+このscriptはsegmentを使い始めるときに，数式の登録を止めてから1回だけ実行する．
+
+Pythonコンテナの/codeで以下のように実行する．
+    python -m twels.segment.builder --dir /code/segments
+"""
+import argparse
+import time
+from pathlib import Path
+
+from twels.database.cursor import Cursor
+from twels.searcher import similarity
+from twels.segment.segment import SegmentWriter
+from twels.segment.segment_set import manifest_lock, read_manifest, segment_name, write_manifest
+
+
+def build_from_database(directory: str | Path, test: bool = False) -> Path:
+    """MySQLの全てのレコードから1つのsegmentを作り，manifest.jsonを書き換える関数．
+    Returns:
+        作ったsegment fileのpath．
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    writer = SegmentWriter()
+    with Cursor.connect(test) as cnx:
+        with Cursor.cursor(cnx) as cursor:
+            for expr_path, expr_size, expr_ids in Cursor.select_all_from_path_dictionary(cursor):
+                writer.add_path(expr_path, expr_size, similarity.to_expr_ids(expr_ids).tolist())
+        with Cursor.cursor(cnx) as cursor:
+            for expr_id, expr_len, expr_size, info in Cursor.select_all_from_inverted_index(cursor):
+                writer.add_expr(expr_id, expr_size, expr_len, info)
+
+    with manifest_lock(directory):
+        manifest = read_manifest(directory)
+        generation = manifest['generation'] + 1
+        path = directory / segment_name(generation)
+        writer.write(path)
+        write_manifest(directory, {'generation': generation, 'segments': [path.name]})
+
+    for name in manifest['segments']:
+        (directory / name).unlink(missing_ok=True)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='MySQLのtableから数式のindexのsegmentを作る．')
+    parser.add_argument('--dir', type=Path, required=True, help='segmentを置くdirectory')
+    parser.add_argument('--test', action='store_true', help='テスト用のデータベースから作る')
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    path = build_from_database(args.dir, test=args.test)
+    print(f'built {path} ({path.stat().st_size / 2**20:.1f} MiB, {time.perf_counter() - start_time:.1f} seconds)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+"""数式のindexを保存する変更できないsegment file．
+path_dictionaryとinverted_indexの内容を1つのfileに保存し，mmapで読み込む．
+NumPyのarrayはmmapのメモリをそのまま参照するので，
+同じfileを開いた複数のuWSGI workerはOSのpage cacheの1つのコピーを共有する．
+
+format (version 1):
+    1. MAGIC: 8 bytes
+    2. headerのbyte数: 4 bytes (little endian)
+    3. header: JSON. {section名: [fileの先頭からのoffset, dtype, 要素の数], ...}
+    4. section: 8 bytesの境界に揃えて並べる．整数は全てlittle endian．
+        path_offsets   (u8, P+1): i番目のpathはpath_bytes[path_offsets[i]:path_offsets[i+1]]．
+        path_bytes     (u1): utf-8のbyte列の小さい順に並べたpath．
+        path_entry_ptr (u8, P+1): i番目のpathのentryはpath_entry_ptr[i]からpath_entry_ptr[i+1]の前まで．
+        entry_sizes    (u4, E): entryのexpr_size．pathごとに小さい順．
+        entry_ptr      (u8, E+1): j番目のentryのexpr_idsはpostings[entry_ptr[j]:entry_ptr[j+1]]．
+        postings       (u4): entryごとに小さい順に並べたexpr_id．
+        expr_ids       (u4, X): 数式のexpr_id．小さい順．
+        expr_sizes     (u4, X)
+        expr_lens      (u4, X)
+        info_ptr       (u8, X+1): k番目の数式のinfoはinfo_bytes[info_ptr[k]:info_ptr[k+1]]．
+        info_bytes     (u1): Info.to_bytes()したinfoを並べたもの．
+        tombstones     (u4): 削除した数式のexpr_id．小さい順．
+            manifest.jsonでこのsegmentより前(古い)のsegmentのその数式を検索しないようにする．
+            このsegmentの数式には影響しない．ないfileは空として読み込む．
+"""
+import json
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+
+import numpy as np
+
+from twels.indexer.info import Info
+
+MAGIC = b'TWSEG\x00\x00\x01'
+ALIGN = 8
+# (section名, dtype)．この順番でfileに並べる．
+SECTIONS = (
+    ('path_offsets', '<u8'),
+    ('path_bytes', 'u1'),
+    ('path_entry_ptr', '<u8'),
+    ('entry_sizes', '<u4'),
+    ('entry_ptr', '<u8'),
+    ('postings', '<u4'),
+    ('expr_ids', '<u4'),
+    ('expr_sizes', '<u4'),
+    ('expr_lens', '<u4'),
+    ('info_ptr', '<u8'),
+    ('info_bytes', 'u1'),
+    ('tombstones', '<u4'),
+)
+# headerにない場合は空とするsection．
+OPTIONAL_SECTIONS = {'tombstones'}
+
+
+class SegmentError(ValueError):
+    """segment fileが壊れているときに発生するエラー．"""
+
+
+class SegmentWriter:
+    """segment fileを作るためのクラス．
+    path_dictionaryのレコードと，inverted_indexのレコードを追加してからwrite()する．
+    差分のsegmentを作るときは，削除した数式をadd_tombstone()で追加する．
+    """
+    def __init__(self):
+        # {expr_path: {expr_size: expr_ids}}
+        self._paths: dict[str, dict[int, array]] = {}
+        # {expr_id: (expr_size, expr_len, info)}
+        self._exprs: dict[int, tuple[int, int, bytes]] = {}
+        self._tombstones: set[int] = set()
+
+    def add_path(self, expr_path: str, expr_size: int, expr_ids: Iterable[int | str] | np.ndarray):
+        """path_dictionaryの1つのレコードを追加する関数．同じ(expr_path, expr_size)の場合はexpr_idsを合わせる．"""
+        postings = self._paths.setdefault(expr_path, {}).setdefault(expr_size, array('I'))
+        if isinstance(expr_ids, np.ndarray):
+            postings.frombytes(expr_ids.astype(np.uint32, copy=False).tobytes())
+        else:
+            postings.extend(map(int, expr_ids))
+
+    def add_expr(self, expr_id: int, expr_size: int, expr_len: int, info: Info | bytes):
+        """inverted_indexの1つのレコードを追加する関数．infoはInfo.to_bytes()したものでもよい．
+        pathを追加せずにinfoだけを追加すると，前のsegmentのその数式のinfoを置き換える．
+        """
+        self._exprs[int(expr_id)] = (expr_size, expr_len, info if isinstance(info, bytes) else info.to_bytes())
+
+    def add_tombstone(self, expr_id: int):
+        """削除した数式を追加する関数．このsegmentに追加したその数式のpathとinfoも書き込まない．"""
+        self._tombstones.add(int(expr_id))
+
+    def is_empty(self) -> bool:
+        return not (self._paths or self._exprs or self._tombstones)
+
+    def write(self, path: str | Path):
+        """segment fileを書き込む関数．
+        一時fileに書き込んでからrenameするので，書き込み中のfileを読み込むことはない．
+        """
+        tombstones = np.array(sorted(self._tombstones), dtype='<u4')
+        # [(utf-8のexpr_path, expr_size, expr_ids), ...] byte列の小さい順．
+        items = sorted(
+            ((expr_path.encode('utf-8'), expr_size, postings)
+             for expr_path, postings_by_size in self._paths.items() for expr_size, postings in postings_by_size.items()),
+            key=lambda item: item[:2]
+            )
+        # 全てのentryのexpr_idを(entryの番号, expr_id)の64 bitの整数にして1回でsortし，重複と削除した数式を除く．
+        all_ids = array('I')
+        for _, _, postings in items:
+            all_ids.extend(postings)
+        ids = np.frombuffer(all_ids, dtype=np.uint32) if all_ids else np.empty(0, dtype=np.uint32)
+        keys = np.repeat(np.arange(len(items), dtype=np.uint64), [len(postings) for _, _, postings in items]) << np.uint64(32)
+        keys |= ids
+        if len(tombstones):
+            keys = keys[~np.isin(ids, tombstones)]
+        keys = np.unique(keys)
+        counts = np.bincount((keys >> np.uint64(32)).astype(np.int64), minlength=len(items))
+        # expr_idが残ったentry
+        entries = np.flatnonzero(counts).tolist()
+
+        encoded_paths: list[bytes] = []
+        path_entry_counts: list[int] = []
+        for k in entries:
+            if encoded_paths and encoded_paths[-1] == items[k][0]:
+                path_entry_counts[-1] += 1
+            else:
+                encoded_paths.append(items[k][0])
+                path_entry_counts.append(1)
+        expr_ids = sorted(self._exprs.keys() - self._tombstones)
+        infos = [self._exprs[expr_id][2] for expr_id in expr_ids]
+
+        sections = {
+            'path_offsets': _offsets(len(encoded_path) for encoded_path in encoded_paths),
+            'path_bytes': np.frombuffer(b''.join(encoded_paths), dtype='u1'),
+            'path_entry_ptr': _offsets(path_entry_counts),
+            'entry_sizes': np.array([items[k][1] for k in entries], dtype='<u4'),
+            'entry_ptr': _offsets(counts[entries].tolist()),
+            'postings': (keys & np.uint64(0xFFFFFFFF)).astype('<u4'),
+            'expr_ids': np.array(expr_ids, dtype='<u4'),
+            'expr_sizes': np.array([self._exprs[expr_id][0] for expr_id in expr_ids], dtype='<u4'),
+            'expr_lens': np.array([self._exprs[expr_id][1] for expr_id in expr_ids], dtype='<u4'),
+            'info_ptr': _offsets(len(info) for info in infos),
+            'info_bytes': np.frombuffer(b''.join(infos), dtype='u1'),
+            'tombstones': tombstones,
+        }
+
+        header = {}
+        # headerのbyte数はoffsetによって変わるので，変わらなくなるまで計算し直す．
+        header_len = 0
+        while True:
+            offset = _align(len(MAGIC) + 4 + header_len)
+            for name, dtype in SECTIONS:
+                header[name] = [offset, dtype, len(sections[name])]
+                offset = _align(offset + sections[name].nbytes)
+            encoded_header = json.dumps(header).encode('utf-8')
+            if len(encoded_header) == header_len:
+                break
+            header_len = len(encoded_header)
+
+        path = Path(path)
+        tmp_path = path.with_name(f'.{path.name}.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(MAGIC + struct.pack('<I', header_len) + encoded_header)
+            for name, dtype in SECTIONS:
+                f.write(b'\0' * (header[name][0] - f.tell()))
+                f.write(sections[name].astype(dtype, copy=False).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+
+class Segment:
+    """mmapで読み込んだsegment file．
+    Notes:
+        1. postingsなどのarrayはmmapのメモリを参照するだけで，コピーしない。
+        2. 変更できないので，複数のthreadから同時に使ってもよい。
+    """
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if self._mm[:len(MAGIC)] != MAGIC:
+                raise SegmentError(f'{self.path} is not a segment file.')
+            header_len, = struct.unpack_from('<I', self._mm, len(MAGIC))
+            header = json.loads(self._mm[len(MAGIC)+4:len(MAGIC)+4+header_len])
+            sections = {}
+            for name, dtype in SECTIONS:
+                if name in OPTIONAL_SECTIONS and name not in header:
+                    sections[name] = np.empty(0, dtype=dtype)
+                    continue
+                offset, dtype, count = header[name]
+                sections[name] = np.frombuffer(self._mm, dtype=dtype, count=count, offset=offset)
+        except (KeyError, ValueError, struct.error) as e:
+            sections = None
+            self._mm.close()
+            raise SegmentError(f'{self.path} is broken. {e}') from e
+
+        self._path_offsets = sections['path_offsets']
+        self._path_bytes_offset = header['path_bytes'][0]
+        self._path_entry_ptr = sections['path_entry_ptr']
+        self._entry_sizes = sections['entry_sizes']
+        self._entry_ptr = sections['entry_ptr']
+        self._postings = sections['postings']
+        self._expr_ids = sections['expr_ids']
+        self._expr_sizes = sections['expr_sizes']
+        self._expr_lens = sections['expr_lens']
+        self._info_ptr = sections['info_ptr']
+        self._info_bytes_offset = header['info_bytes'][0]
+        self.tombstones: np.ndarray = sections['tombstones']
+
+    def __len__(self) -> int:
+        """登録されている数式の数．"""
+        return len(self._expr_ids)
+
+    @property
+    def path_count(self) -> int:
+        return len(self._path_offsets) - 1
+
+    def _get_path(self, i: int) -> bytes:
+        start = self._path_bytes_offset + int(self._path_offsets[i])
+        return self._mm[start:self._path_bytes_offset + int(self._path_offsets[i+1])]
+
+    @property
+    def expr_ids(self) -> np.ndarray:
+        """登録されている数式のexpr_id．小さい順．"""
+        return self._expr_ids
+
+    def find_path(self, expr_path: str) -> int | None:
+        """expr_pathの番号を返す関数．登録されていない場合はNone．"""
+        encoded = expr_path.encode('utf-8')
+        i = bisect_left(range(self.path_count), encoded, key=self._get_path)
+        if i < self.path_count and self._get_path(i) == encoded:
+            return i
+        return None
+
+    def rows(self, path_set: set[str]) -> list[tuple[int, np.ndarray]]:
+        """path_setのpathを含む数式の(expr_size, expr_ids)を返す関数．
+        Cursor.select_expr_size_and_expr_ids_from_path_dictionary_where_expr_path_in()と同じもの．
+        expr_idsはmmapを参照するarray．
+        """
+        rows = []
+        for expr_path in path_set:
+            i = self.find_path(expr_path)
+            if i is None:
+                continue
+            first, last = self._path_entry_ptr[i:i+2].tolist()
+            entry_ptr = self._entry_ptr[first:last+1].tolist()
+            for k, expr_size in enumerate(self._entry_sizes[first:last].tolist()):
+                rows.append((expr_size, self._postings[entry_ptr[k]:entry_ptr[k+1]]))
+        return rows
+
+    def infos(self, expr_ids: list[int]) -> dict[int, tuple[Info, int]]:
+        """Cursor.select_info_and_len_from_inverted_index_where_expr_id_in()と同じ{expr_id: (info, expr_len)}を返す関数．"""
+        result = {}
+        if not expr_ids:
+            return result
+        positions = np.searchsorted(self._expr_ids, expr_ids)
+        for expr_id, k in zip(expr_ids, positions.tolist()):
+            if k < len(self._expr_ids) and self._expr_ids[k] == expr_id:
+                start = self._info_bytes_offset + int(self._info_ptr[k])
+                end = self._info_bytes_offset + int(self._info_ptr[k+1])
+                result[expr_id] = (Info.from_bytes(self._mm[start:end]), int(self._expr_lens[k]))
+        return result
+
+    def iter_paths(self) -> Iterator[tuple[str, int, np.ndarray]]:
+        """全てのpathの(expr_path, expr_size, expr_ids)を返すgenerator．segmentをmergeするときに使う．"""
+        path_entry_ptr = self._path_entry_ptr.tolist()
+        entry_ptr = self._entry_ptr.tolist()
+        entry_sizes = self._entry_sizes.tolist()
+        for i in range(self.path_count):
+            expr_path = self._get_path(i).decode('utf-8')
+            for j in range(path_entry_ptr[i], path_entry_ptr[i+1]):
+                yield expr_path, entry_sizes[j], self._postings[entry_ptr[j]:entry_ptr[j+1]]
+
+    def iter_exprs(self) -> Iterator[tuple[int, int, int, bytes]]:
+        """全ての数式の(expr_id, expr_size, expr_len, info)を返すgenerator．infoはInfo.to_bytes()したもの．"""
+        info_ptr = self._info_ptr.tolist()
+        for k, (expr_id, expr_size, expr_len) in enumerate(zip(
+                self._expr_ids.tolist(), self._expr_sizes.tolist(), self._expr_lens.tolist())):
+            yield expr_id, expr_size, expr_len, self._mm[self._info_bytes_offset+info_ptr[k]:self._info_bytes_offset+info_ptr[k+1]]
+
+    def expr_size(self, expr_id: int) -> int | None:
+        """expr_idの数式のexpr_sizeを返す関数．登録されていない場合はNone．"""
+        k = int(np.searchsorted(self._expr_ids, expr_id))
+        if k < len(self._expr_ids) and self._expr_ids[k] == expr_id:
+            return int(self._expr_sizes[k])
+        return None
+
+    def close(self):
+        """mmapを閉じる関数．返したarrayが使われている間は閉じずに，garbage collectionに任せる．"""
+        for name, _ in SECTIONS:
+            self.__dict__.pop(f'_{name}', None)
+        self.__dict__.pop('tombstones', None)
+        try:
+            self._mm.close()
+        except BufferError:
+            pass
+
+
+def _offsets(lengths: Iterable[int]) -> np.ndarray:
+    """長さのリストから，先頭が0の累積和のarrayを作る関数．"""
+    lengths = np.fromiter(lengths, dtype='<u8')
+    offsets = np.zeros(len(lengths) + 1, dtype='<u8')
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""directoryに置いた複数のsegment fileをまとめて検索するためのmodule．
+Cursor.segment_config['dir']にdirectoryを設定すると，Searcherはpath_dictionaryと
+inverted_indexの代わりにsegmentを検索する．空の場合はこれまで通りMySQLを使う．
+segmentの類似度はsimilarity.jaccard()で計算するので，search() stored functionと同じになることを
+実際のデータベースで確認してから設定する(tests/benchmarks/check_similarity.py)．
+
+directory:
+    manifest.json: {"generation": 数字, "segments": [segment fileの名前, ...]}
+        segmentsは古い順．manifest.jsonを書き換えると，次の検索から新しいsegmentを使う．
+        新しいsegmentのtombstonesにある数式は，それより古いsegmentでは検索しない．
+        同じ数式のinfoが複数のsegmentにある場合は，新しいsegmentのinfoを使う．
+    *.twseg: segment file．format はtwels/segment/segment.pyを参照．
+    .manifest.lock: manifest.jsonを書き換えるプロセスが取得するlock．
+"""
+import fcntl
+import json
+import os
+import threading
+import traceback
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+from twels.database.cursor import Cursor
+from twels.indexer.info import Info
+from twels.searcher import similarity
+from twels.segment.segment import Segment
+from twels.utils.utils import print_in_red
+
+MANIFEST_NAME = 'manifest.json'
+LOCK_NAME = '.manifest.lock'
+# 読み込み中にmergeでsegment fileが削除された場合に，manifest.jsonを読み直す回数．
+OPEN_RETRY = 3
+
+_manifest_thread_lock = threading.Lock()
+
+
+def read_manifest(directory: str | Path) -> dict:
+    """manifest.jsonを読み込む関数．ない場合は空のmanifestを返す．"""
+    path = Path(directory) / MANIFEST_NAME
+    if not path.exists():
+        return {'generation': 0, 'segments': []}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_manifest(directory: str | Path, manifest: dict):
+    """manifest.jsonを書き込む関数．一時fileに書き込んでからrenameする．"""
+    path = Path(directory) / MANIFEST_NAME
+    tmp_path = path.with_name(f'.{MANIFEST_NAME}.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def manifest_lock(directory: str | Path):
+    """manifest.jsonを読み込んでから書き換えるまでの間，他のthreadとプロセスが書き換えないようにするlock．"""
+    with _manifest_thread_lock, open(Path(directory) / LOCK_NAME, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def segment_name(generation: int) -> str:
+    """generation番目のsegment fileの名前を返す関数．"""
+    return f'{generation:08d}.twseg'
+
+
+def _stat(path: Path) -> tuple[int, int] | None:
+    """manifest.jsonが書き換えられたかを確認するための(inode, mtime)を返す関数．
+    write_manifest()はrenameするので，mtimeが同じでもinodeが変わる．
+    """
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+
+class SegmentSet:
+    """manifest.jsonに書かれたsegmentをまとめて検索するクラス．
+    Notes:
+        1. segmentは変更できないので，複数のthreadから同時に使ってもよい。
+        2. 1つの数式のpathは1つのsegmentにだけ含まれる。
+    """
+    # key: test, value: SegmentSet．プロセス全体で共有する．
+    _sets: dict[bool, 'SegmentSet'] = {}
+    _sets_lock = threading.Lock()
+
+    def __init__(self, directory: str | Path, previous: 'SegmentSet | None' = None):
+        """
+        Args:
+            directory: segmentを置くdirectory．
+            previous: 前に開いたSegmentSet．同じ名前のsegmentは開き直さずに使う．
+        """
+        self.directory = Path(directory)
+        self._manifest_stat = _stat(self.directory / MANIFEST_NAME)
+        manifest = read_manifest(self.directory)
+        self.generation: int = manifest['generation']
+        opened = {segment.path.name: segment for segment in previous.segments} if previous is not None else {}
+        self.segments = [opened.get(name) or Segment(self.directory / name) for name in manifest['segments']]
+        # i番目のsegmentで検索しない数式．i+1番目以降のsegmentのtombstones．
+        self._masks: list[np.ndarray] = []
+        mask = np.empty(0, dtype='<u4')
+        for segment in reversed(self.segments):
+            self._masks.append(mask)
+            if len(segment.tombstones):
+                mask = np.union1d(mask, segment.tombstones)
+        self._masks.reverse()
+
+    @staticmethod
+    def get(test: bool = False) -> 'SegmentSet | None':
+        """プロセス全体で共有するSegmentSetを返す関数．
+        manifest.jsonが書き換えられていれば，新しいsegmentを開き直す．
+        Args:
+            test: testのときにはTrueにする．
+        Returns:
+            directoryが設定されていないときや，読み込みに失敗したときはNone．
+        """
+        directory = Cursor.segment_config['test_dir' if test else 'dir']
+        if not directory:
+            return None
+        try:
+            segment_set = __class__._sets.get(test)
+            if segment_set is None or segment_set.is_stale():
+                with __class__._sets_lock:
+                    segment_set = __class__._sets.get(test)
+                    for retry in range(OPEN_RETRY):
+                        if segment_set is not None and not segment_set.is_stale():
+                            break
+                        try:
+                            segment_set = __class__._sets[test] = SegmentSet(directory, segment_set)
+                        except FileNotFoundError:
+                            # manifest.jsonを読み込んだ後に，mergeでsegment fileが削除された．
+                            if retry == OPEN_RETRY - 1:
+                                raise
+            return segment_set
+        except Exception as e:
+            print_in_red(f'error in SegmentSet.get(). {e}')
+            traceback.print_exc()
+            return None
+
+    def is_stale(self) -> bool:
+        """manifest.jsonが開いた後に書き換えられていればTrueを返す関数．"""
+        return _stat(self.directory / MANIFEST_NAME) != self._manifest_stat
+
+    def rows(self, path_set: set[str]) -> list[tuple[int, np.ndarray]]:
+        """全てのsegmentのpath_setのpathを含む数式の(expr_size, expr_ids)を返す関数．
+        削除された数式は除く．削除された数式がないsegmentのexpr_idsはmmapを参照するarray．
+        """
+        rows = []
+        for segment, mask in zip(self.segments, self._masks):
+            segment_rows = segment.rows(path_set)
+            if not len(mask) or not segment_rows:
+                rows.extend(segment_rows)
+                continue
+            # isin()はsegmentごとに1回でまとめて計算する．
+            keep = ~np.isin(np.concatenate([expr_ids for _, expr_ids in segment_rows]), mask)
+            offset = 0
+            for expr_size, expr_ids in segment_rows:
+                kept = expr_ids[keep[offset:offset+len(expr_ids)]]
+                offset += len(expr_ids)
+                if len(kept):
+                    rows.append((expr_size, kept))
+        return rows
+
+    def iter_scores(self, path_set: set[str], after: tuple[float, int] | None = None) -> Iterator[tuple[int, float]]:
+        """(expr_id, 類似度)を類似度の高い順に返すgenerator．詳しくはsimilarity.iter_scores()を参照．"""
+        return similarity.iter_scores(self.rows(path_set), len(path_set), after)
+
+    def search(self, path_set: set[str], limit: int | None = None, offset: int = 0) -> list:
+        """Cursor.search()と同じ形式の[['expr_id', degree of similarity], ...]を返す関数。
+        類似度はsearch() stored functionではなくsimilarity.jaccard()で計算する。
+        """
+        return similarity.top_k(self.rows(path_set), len(path_set), limit, offset)
+
+    def infos(self, expr_ids: list[int]) -> dict[int, tuple[Info, int]]:
+        """Cursor.select_info_and_len_from_inverted_index_where_expr_id_in()と同じ{expr_id: (info, expr_len)}を返す関数．"""
+        result = {}
+        # 新しいsegmentから順に探す．
+        for segment, mask in zip(reversed(self.segments), reversed(self._masks)):
+            remaining = [expr_id for expr_id in expr_ids if expr_id not in result]
+            if len(mask):
+                remaining = [expr_id for expr_id, masked in zip(remaining, np.isin(remaining, mask)) if not masked]
+            if not remaining:
+                break
+            result.update(segment.infos(remaining))
+        return result
+
+    def __len__(self) -> int:
+        """登録されている数式の数．"""
+        live = [np.setdiff1d(segment.expr_ids, mask) for segment, mask in zip(self.segments, self._masks)]
+        return len(np.unique(np.concatenate(live))) if live else 0
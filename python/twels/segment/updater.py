@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""数式のindexのsegmentを差分で更新するためのmodule．
+path_dictionaryのexpr_idsのJSONを書き換える代わりに，追加・削除した数式だけを含む小さいsegment(delta)を
+manifest.jsonの最後に追加する．manifest.jsonを書き換えた時点で，次の検索から新しい数式を検索できる．
+削除した数式はdeltaのtombstonesに記録し，それより古いsegmentでは検索しない．
+
+deltaが増えると検索で開くsegmentが増えるので，大きさが同じくらいのsegmentがmerge_factor個並んだら，
+background threadで1つのsegmentにmergeする(size-tiered merge)．
+mergeするsegmentの中で削除された数式は，mergeしたsegmentには書き込まない．
+一番古いsegmentを含めてmergeする場合は，tombstonesも不要になるので書き込まない．
+"""
+import math
+import threading
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from twels.database.cursor import Cursor
+from twels.segment.segment import Segment, SegmentWriter
+from twels.segment.segment_set import manifest_lock, read_manifest, segment_name, write_manifest
+from twels.utils.utils import print_in_red
+
+# このbyte数以下のsegmentは全て同じ大きさとみなす．
+MIN_TIER_BYTES = 2**16
+
+
+class SegmentUpdater:
+    """deltaの追加とsegmentのmergeを行うクラス．
+    Notes:
+        1. 追加・削除する数式はSegmentWriterに記録してflush()する．
+           データベースをcommitした後にflush()すると，MySQLとsegmentの内容が揃う．
+        2. manifest.jsonの書き換えはmanifest_lock()で他のthreadとプロセスと排他する．
+    """
+    # key: test, value: SegmentUpdater．プロセス全体で共有する．
+    _updaters: dict[bool, 'SegmentUpdater'] = {}
+    _updaters_lock = threading.Lock()
+
+    def __init__(self, directory: str | Path, merge_factor: int = 4, background: bool = True):
+        """
+        Args:
+            directory: segmentを置くdirectory．
+            merge_factor: 大きさが同じくらいのsegmentがこの数だけ並んだらmergeする．
+            background: Trueのときはflush()の後のmergeをbackground threadで行う．
+                        Falseのときはmerge()を呼び出すまでmergeしない．
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.merge_factor = max(merge_factor, 2)
+        self.background = background
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='segment-merge')
+        self._merge_future: Future | None = None
+        self._merge_lock = threading.Lock()
+
+    @staticmethod
+    def get(test: bool = False) -> 'SegmentUpdater | None':
+        """プロセス全体で共有するSegmentUpdaterを返す関数．
+        Cursor.segment_configのdirectoryが設定されていないときはNoneを返す．
+        """
+        directory = Cursor.segment_config['test_dir' if test else 'dir']
+        if not directory:
+            return None
+        updater = __class__._updaters.get(test)
+        if updater is None:
+            with __class__._updaters_lock:
+                updater = __class__._updaters.get(test)
+                if updater is None:
+                    updater = __class__._updaters[test] = SegmentUpdater(directory, Cursor.segment_config['merge_factor'])
+        return updater
+
+    def flush(self, writer: SegmentWriter) -> Path | None:
+        """writerに記録した数式をdeltaとして書き込み，manifest.jsonの最後に追加する関数．
+        Returns:
+            書き込んだdeltaのpath．writerが空の場合はNone．
+        """
+        if writer.is_empty():
+            return None
+        with manifest_lock(self.directory):
+            manifest = read_manifest(self.directory)
+            generation = manifest['generation'] + 1
+            path = self.directory / segment_name(generation)
+            writer.write(path)
+            write_manifest(self.directory, {'generation': generation, 'segments': manifest['segments'] + [path.name]})
+        if self.background:
+            self._schedule_merge()
+        return path
+
+    def _schedule_merge(self):
+        """background threadでmergeする関数．既にmerge中のときは，そのmergeが続けてmergeする．"""
+        with self._merge_lock:
+            if self._merge_future is None or self._merge_future.done():
+                self._merge_future = self._executor.submit(self._merge_in_background)
+
+    def _merge_in_background(self):
+        try:
+            while self.merge() is not None:
+                pass
+        except Exception as e:
+            print_in_red(f'error in SegmentUpdater.merge(). {e}')
+            traceback.print_exc()
+
+    def wait(self):
+        """background threadのmergeが終わるまで待つ関数．"""
+        with self._merge_lock:
+            future = self._merge_future
+        if future is not None:
+            future.result()
+
+    def merge(self, merge_all: bool = False) -> Path | None:
+        """mergeするsegmentを選んで，1つのsegmentにmergeする関数．
+        Args:
+            merge_all: Trueのときは全てのsegmentを1つにmergeする．
+        Returns:
+            mergeしたsegmentのpath．mergeするsegmentがない場合はNone．
+        """
+        with manifest_lock(self.directory):
+            manifest = read_manifest(self.directory)
+            names = manifest['segments']
+            if merge_all:
+                if not names or (len(names) == 1 and not len(Segment(self.directory / names[0]).tombstones)):
+                    return None
+                start, stop = 0, len(names)
+            else:
+                run = pick_merge_run([(self.directory / name).stat().st_size for name in names], self.merge_factor)
+                if run is None:
+                    return None
+                start, stop = run
+            # mergeしたsegmentの名前のために，generationを進めておく．
+            generation = manifest['generation'] + 1
+            write_manifest(self.directory, {'generation': generation, 'segments': names})
+        run_names = names[start:stop]
+
+        path = self.directory / segment_name(generation)
+        segments = [Segment(self.directory / name) for name in run_names]
+        try:
+            merge_segments(segments, path, keep_tombstones=start > 0)
+        finally:
+            for segment in segments:
+                segment.close()
+
+        with manifest_lock(self.directory):
+            manifest = read_manifest(self.directory)
+            names = manifest['segments']
+            # flush()はmanifest.jsonの最後にしか追加しないので，mergeしたsegmentは連続して残っている．
+            for i in range(len(names) - len(run_names) + 1):
+                if names[i:i+len(run_names)] == run_names:
+                    write_manifest(self.directory, {
+                        'generation': manifest['generation'],
+                        'segments': names[:i] + [path.name] + names[i+len(run_names):]
+                        })
+                    break
+            else:
+                # 他のプロセスが先に同じsegmentをmergeした．
+                path.unlink(missing_ok=True)
+                return None
+        # 開いているプロセスは，mmapを閉じるまで削除したfileを読み込める．
+        for name in run_names:
+            (self.directory / name).unlink(missing_ok=True)
+        return path
+
+
+def pick_merge_run(sizes: list[int], merge_factor: int) -> tuple[int, int] | None:
+    """mergeするsegmentの範囲を選ぶ関数．
+    segmentの大きさをmerge_factor倍ごとのtierに分け，同じtierのsegmentがmerge_factor個以上並んでいる範囲のうち，
+    一番新しい範囲を返す．
+    Args:
+        sizes: manifest.jsonの順(古い順)のsegmentのbyte数．
+    Returns:
+        (start, stop): sizes[start:stop]のsegmentをmergeする．ない場合はNone．
+    """
+    tiers = [int(math.log(max(size, MIN_TIER_BYTES) / MIN_TIER_BYTES, merge_factor)) for size in sizes]
+    stop = len(tiers)
+    while stop > 0:
+        start = stop - 1
+        while start > 0 and tiers[start-1] == tiers[stop-1]:
+            start -= 1
+        if stop - start >= merge_factor:
+            return start, stop
+        stop = start
+    return None
+
+
+def merge_segments(segments: list[Segment], path: str | Path, keep_tombstones: bool = True):
+    """古い順に並べたsegmentを1つのsegmentにmergeして書き込む関数．
+    Args:
+        segments: manifest.jsonの順(古い順)のsegment．
+        path: mergeしたsegmentのpath．
+        keep_tombstones: Falseのときはtombstonesを書き込まない．segmentsに一番古いsegmentが含まれる場合にFalseにする．
+    """
+    writer = SegmentWriter()
+    # i番目のsegmentで削除されていない数式を調べるために，新しいsegmentから順に読み込む．
+    mask = np.empty(0, dtype='<u4')
+    infos_written = set()
+    for segment in reversed(segments):
+        for expr_path, expr_size, expr_ids in segment.iter_paths():
+            if len(mask):
+                expr_ids = expr_ids[~np.isin(expr_ids, mask)]
+            if len(expr_ids):
+                writer.add_path(expr_path, expr_size, expr_ids)
+        masked = set(mask.tolist())
+        for expr_id, expr_size, expr_len, info in segment.iter_exprs():
+            # 新しいsegmentのinfoを優先する．
+            if expr_id not in masked and expr_id not in infos_written:
+                writer.add_expr(expr_id, expr_size, expr_len, info)
+                infos_written.add(expr_id)
+        if len(segment.tombstones):
+            mask = np.union1d(mask, segment.tombstones)
+    if keep_tombstones:
+        for expr_id in mask.tolist():
+            writer.add_tombstone(expr_id)
+    writer.write(path)
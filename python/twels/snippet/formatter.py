@@ -11,6 +11,8 @@ class Formatter:
     omit_str = '...'
     excerpt_len = 400
     space_in_front_of_math = 200
+    hl_start = '<span class="hl">'
+    hl_end = '</span>'
 
     @staticmethod
     def format(snippet: Snippet, expr_start_pos: list[int], expr_len: int) -> str:
@@ -22,19 +24,33 @@ class Formatter:
             expr_len: 数式の長さ。
         Returns:
             excerpted_snippet: 抜粋された文章．
+        Notes:
+            長いページでもsnippet全体をコピーしないように，抜粋する範囲だけを取り出してからハイライトする．
+            結果はsnippet全体をハイライトしてから抜粋した場合と同じ．
         """
-        snippet_highlighted = ''
         start_pos = 0
         for pos in expr_start_pos:
             if pos is not None:
                 start_pos = pos
                 break
         end_pos = start_pos + expr_len
+        text = snippet.text
+        # ハイライトする範囲が1つの数式と一致しない場合は，snippet全体をハイライトしてから抜粋する．
+        if len(text) + len(__class__.hl_start) + len(__class__.hl_end) < __class__.excerpt_len or\
+           not text.startswith('<math', start_pos) or\
+           text.find('</math>', start_pos) + len('</math>') != end_pos:
+            return __class__._excerpt(__class__._highlight(text, start_pos, end_pos), start_pos)
+
+        begin = __class__._get_excerpt_start(text, start_pos)
+        stop = __class__._get_excerpt_stop(text, begin, start_pos)
+        return __class__._excerpt_from_head(__class__._highlight(text[begin:stop], start_pos - begin, end_pos - begin))
+
+    @staticmethod
+    def _highlight(text: str, start_pos: int, end_pos: int) -> str:
+        """text[start_pos:end_pos]をハイライトする関数．"""
         # start_posから先に挿入するとend_posがずれるので，end_posから挿入する．
-        tmp = f'{snippet.text[:end_pos]}</span>{snippet.text[end_pos:]}'
-        snippet_highlighted = f'{tmp[:start_pos]}<span class="hl">{tmp[start_pos:]}'
-        excerpted_snippet = __class__._excerpt(snippet_highlighted, start_pos)
-        return excerpted_snippet
+        tmp = f'{text[:end_pos]}{__class__.hl_end}{text[end_pos:]}'
+        return f'{tmp[:start_pos]}{__class__.hl_start}{tmp[start_pos:]}'
 
     @staticmethod
     def _excerpt(snippet: str, start_pos: int) -> str:
@@ -47,36 +63,59 @@ class Formatter:
         # mathタグ箇所は文字数に含めない．
         if len(snippet) < __class__.excerpt_len:
             return snippet
-        elif snippet.find('<span class="hl">') == -1:
+        elif snippet.find(__class__.hl_start) == -1:
             # ハイライトされた数式はないので，先頭から抜粋．
             return __class__._excerpt_from_head(snippet)
         else:
             # ハイライトされた数式があるとき
             # 数式が複数ある場合もある
-            if start_pos < __class__.space_in_front_of_math:
-                # 先頭から抜粋
-                return __class__._excerpt_from_head(snippet)
+            return __class__._excerpt_from_head(snippet[__class__._get_excerpt_start(snippet, start_pos):])
+
+    @staticmethod
+    def _get_excerpt_start(snippet: str, start_pos: int) -> int:
+        """ハイライトする数式の前から抜粋するときの抜粋開始位置を返す関数．
+        start_posより前だけを見るので，snippetはハイライトする前でも後でもよい．
+        """
+        if start_pos < __class__.space_in_front_of_math:
+            # 先頭から抜粋
+            return 0
+        # 途中から抜粋
+        start_index = start_pos - __class__.space_in_front_of_math
+        # 抜粋開始位置がmathタグの中でないことを確認
+        if snippet.find('</math>', start_index) - snippet.find('<math', start_index) > 0:
+            # '/math>'のどこかでないことを確認．
+            tmp = snippet[start_index:start_index+len('/math>')]
+            if (tmp[:1] != '>' and
+               tmp[:2] != 'h>' and
+               tmp[:3] != 'th>' and
+               tmp[:4] != 'ath>' and
+               tmp[:5] != 'math>' and
+               tmp[:6] != '/math>'):
+                return start_index
             else:
-                # 途中から抜粋
-                start_index = start_pos - __class__.space_in_front_of_math
-                # 抜粋開始位置がmathタグの中でないことを確認
-                if snippet.find('</math>', start_index) - snippet.find('<math', start_index) > 0:
-                    # '/math>'のどこかでないことを確認．
-                    tmp = snippet[start_index:start_index+len('/math>')]
-                    if (tmp[:1] != '>' and
-                       tmp[:2] != 'h>' and
-                       tmp[:3] != 'th>' and
-                       tmp[:4] != 'ath>' and
-                       tmp[:5] != 'math>' and
-                       tmp[:6] != '/math>'):
-                        return __class__._excerpt_from_head(snippet[start_index:])
-                    else:
-                        start_index = __class__._get_last_math_tag_index(snippet, start_index)
-                        return __class__._excerpt_from_head(snippet[start_index:])
-                else:
-                    # <math>と</math>の間の場合
-                    start_index = __class__._get_last_math_tag_index(snippet, start_index)
-                    return __class__._excerpt_from_head(snippet[start_index:])
+                return __class__._get_last_math_tag_index(snippet, start_index)
+        else:
+            # <math>と</math>の間の場合
+            return __class__._get_last_math_tag_index(snippet, start_index)
+
+    @staticmethod
+    def _get_excerpt_stop(text: str, begin: int, start_pos: int) -> int:
+        """_excerpt_from_head()がtext[begin:]から抜粋するときに，読む必要がある範囲の終わりを返す関数．
+        _excerpt_from_head()と同じように数えたmathタグ以外の文字数がexcerpt_lenを超えた後の，
+        start_posより後の最初のmathタグの開始位置．ここより後は抜粋に含まれない．
+        """
+        result_length = 0
+        tail = begin
+        while True:
+            head = text.find('<math', tail)
+            if head == -1:
+                return len(text)
+            result_length += head - tail
+            if head > start_pos and result_length > __class__.excerpt_len:
+                return head
+            tail = text.find('</math>', head)
+            if tail == -1:
+                return len(text)
 
     @staticmethod
     def _excerpt_from_head(snippet: str) -> str:
@@ -106,15 +145,10 @@ class Formatter:
     @staticmethod
     def _get_last_math_tag_index(snippet: str, start_index: int) -> int:
         """start_indexの直前のmathタグの開始位置を取得する．
+        start_indexより前のmathタグを先頭から順に探さずに，start_indexから後ろ向きに探す．
         """
-        index = snippet.find('<math')
-        last_index = 0
-        while True:
-            if index == -1 or start_index - index < 0:
-                break
-            last_index = index
-            index = snippet.find('<math', index+1)
-        return last_index
+        index = snippet.rfind('<math', 0, start_index + len('<math'))
+        return max(index, 0)
 
     @staticmethod
     def _get_result(snippet: str, result_length: int, last_tail: int) -> str:
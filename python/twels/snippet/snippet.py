@@ -5,10 +5,14 @@ import re
 
 from bs4 import BeautifulSoup
 
-from twels.expr.expression import Expression, MATHML_PATTERN
+from twels.expr.expression import Expression, ExpressionTable, MATHML_PATTERN
 from twels.snippet.cleaner import remove_comments, remove_not_content
 
 
+# 数式を一時的に置き換える文字列．私用領域の文字を使う．
+PLACEHOLDER_PATTERN = re.compile('\ue000([0-9]+)\ue001')
+
+
 class Snippet:
     """Snippetに関するクラス。
     Notes:
@@ -18,10 +22,25 @@ class Snippet:
         登録できる文字のmax lengthを設定して、それに収まっているかを確認する。
         不要なタグの削除(_clean_text())の高速化。
     """
-    def __init__(self, snippet: str, clean=True):
+    def __init__(self, snippet: str, clean=True, expr_table: ExpressionTable | None = None, lazy=False):
         """登録時にはcleanする。検索時にはcleanは不要。
+        Args:
+            expr_table: 同じページの数式のExpressionTable。指定した場合はclean()の前に数式を
+                        取り出してExpressionTableのExpressionを使う。
+            lazy: clean=Falseのときだけ使える。page tableに保存したsnippetのように，
+                  str(Snippet)の結果をそのままtextにし，数式オブジェクトへの変換はself.snippetを
+                  使うときまで行わない。Formatter.format()はtextしか使わないので，検索時には変換しない。
         """
-        if clean:
+        self._snippet: list[str | Expression] | None = None
+        if lazy and not clean:
+            self.text = snippet
+            return
+
+        if clean and expr_table is not None and '\ue000' not in snippet:
+            masked, exprs = __class__._mask_exprs(snippet, expr_table)
+            cleaned = __class__._clean(masked)
+            self.snippet = __class__._unmask_exprs(cleaned, exprs)
+        elif clean:
             cleaned = __class__._clean(snippet)
             self.snippet = __class__._parse_snippet(cleaned)
         else:
@@ -30,7 +49,20 @@ class Snippet:
         self.text = __class__.__str__(self)
 
     def __str__(self):
-        return ''.join(map(str, self.snippet))
+        if self._snippet is None:
+            return self.text
+        return ''.join(map(str, self._snippet))
+
+    @property
+    def snippet(self) -> list[str | Expression]:
+        """数式部分と非数式部分で分けられたリスト。lazyの場合は最初に使うときに作る。"""
+        if self._snippet is None:
+            self._snippet = __class__._parse_snippet(self.text)
+        return self._snippet
+
+    @snippet.setter
+    def snippet(self, snippet_list: list[str | Expression]):
+        self._snippet = snippet_list
 
     def search_expr_start_pos(self, expr: Expression) -> list[int]:
         """snippetに含まれているmathmlの開始位置のリストを返す関数。
@@ -106,6 +138,33 @@ class Snippet:
 
         return str(soup)
 
+    @staticmethod
+    def _mask_exprs(snippet: str, expr_table: ExpressionTable) -> tuple[str, list[Expression]]:
+        """snippetの数式を'\ue000{i}\ue001'に置き換える関数。
+        数式はExpressionTableから取得するので，get_exprs()で作ったExpressionを再利用でき，
+        _clean()ではBeautifulSoupで数式の中を解析しなくて済む。
+        Returns:
+            (masked, exprs): exprs[i]が'\ue000{i}\ue001'の位置にあった数式。
+        """
+        exprs = []
+
+        def replace(matched: re.Match) -> str:
+            exprs.append(expr_table.get(matched.group()))
+            return f'\ue000{len(exprs) - 1}\ue001'
+
+        return MATHML_PATTERN.sub(replace, snippet), exprs
+
+    @staticmethod
+    def _unmask_exprs(snippet: str, exprs: list[Expression]) -> list[str | Expression]:
+        """_mask_exprs()で置き換えた部分を数式オブジェクトに戻す関数。
+        _parse_snippet()と同じリストを返す。
+        """
+        # re.split()の結果は[text, i, text, i, ..., text]になる。
+        splitted = re.split(PLACEHOLDER_PATTERN, snippet)
+        texts = splitted[0::2]
+        snippet_exprs = [exprs[int(i)] for i in splitted[1::2]]
+        return __class__._join(texts, snippet_exprs)
+
     @staticmethod
     def _parse_snippet(snippet: str) -> list[str | Expression]:
         """snippetの数式部分をオブジェクトに変換する関数。
@@ -129,7 +188,13 @@ class Snippet:
         # snippetの先頭や末尾にMathMLが含まれている場合、
         # split()の結果に空文字列が含まれる。
         texts = re.split(MATHML_PATTERN, snippet)
+        return __class__._join(texts, exprs)
 
+    @staticmethod
+    def _join(texts: list[str], exprs: list[Expression]) -> list[str | Expression]:
+        """textとexprを交互に並べたリストを返す関数。
+        len(texts) == len(exprs) + 1であり、空文字列の先頭と末尾のtextは含めない。
+        """
         if len(exprs) == 0 and len(texts) == 0:
             snippet_list = []
         else:
@@ -137,6 +202,6 @@ class Snippet:
             snippet_list = [elem for pair in zip(texts, exprs) for elem in pair]
             if texts[-1] != '':
                 snippet_list.append(texts[-1])
-            if snippet_list[0] == '':
+            if snippet_list and snippet_list[0] == '':
                 snippet_list.pop(0)
         return snippet_list
@@ -1,17 +1,93 @@
 # -*- coding: utf-8 -*-
-"""module description
+"""SolrCloudに接続するためのmodule．
+ZooKeeperへの接続とHTTPのsessionを作るコストが大きいので，
+get_solr_client()は1つのprocessで1つのclientを作り，それを使い回す．
+clusterの状態(collectionのshardとreplica，live nodes)はpysolr.ZooKeeperがwatchで更新するので，
+検索のたびにZooKeeperに問い合わせることはない．
+HTTPの接続はrequests.Sessionのconnection poolでkeep-aliveして再利用する．
+
+設定は以下の環境変数で変更できる．
+    SOLR_ZK_HOSTS: ZooKeeperのhost．
+    SOLR_COLLECTION: collectionの名前．
+    SOLR_USERNAME, SOLR_PASSWORD: Basic認証のユーザ名とパスワード．
+    SOLR_CONNECT_TIMEOUT, SOLR_READ_TIMEOUT: Solrへのリクエストのtimeout(秒)．
+    SOLR_ZK_TIMEOUT: ZooKeeperへの接続のtimeout(秒)．
+    SOLR_RETRY_COUNT: 失敗したリクエストを別のreplicaに送る回数．
+    SOLR_POOL_SIZE: 1つのSolrのnodeに対してkeep-aliveする接続の数．
 """
+import atexit
+import os
+import threading
+
 import pysolr
+import requests
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
 
 
+ZK_HOSTS = os.environ.get('SOLR_ZK_HOSTS', 'zoo1:2181,zoo2:2181,zoo3:2181')
+COLLECTION_NAME = os.environ.get('SOLR_COLLECTION', 'twels_collection')
+USERNAME = os.environ.get('SOLR_USERNAME', 'Hisashi')
+PASSWORD = os.environ.get('SOLR_PASSWORD', 'Kojima')
+CONNECT_TIMEOUT = float(os.environ.get('SOLR_CONNECT_TIMEOUT', 3))
+READ_TIMEOUT = float(os.environ.get('SOLR_READ_TIMEOUT', 10))
+ZK_TIMEOUT = float(os.environ.get('SOLR_ZK_TIMEOUT', 15))
+RETRY_COUNT = int(os.environ.get('SOLR_RETRY_COUNT', 3))
+POOL_SIZE = int(os.environ.get('SOLR_POOL_SIZE', 10))
+
+_client: pysolr.SolrCloud | None = None
+_client_pid = 0
+_client_lock = threading.Lock()
+
+
+def create_solr_client(read_timeout: float | None = None) -> pysolr.SolrCloud:
+    """ZooKeeperに問い合わせてSolrに接続する関数．呼び出すたびに新しく接続する．
+    Args:
+        read_timeout: Solrの応答を待つ秒数．Noneの場合はREAD_TIMEOUT．
+    """
+    session = requests.Session()
+    # pysolrはリクエストに失敗したら別のreplicaに送り直すので，requestsでは送り直さない．
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=0)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.stream = False
+
+    zookeeper = pysolr.ZooKeeper(ZK_HOSTS, timeout=ZK_TIMEOUT)
+    return pysolr.SolrCloud(
+        zookeeper,
+        COLLECTION_NAME,
+        timeout=(CONNECT_TIMEOUT, READ_TIMEOUT if read_timeout is None else read_timeout),
+        retry_count=RETRY_COUNT,
+        auth=HTTPBasicAuth(USERNAME, PASSWORD),
+        session=session
+    )
+
+
 def get_solr_client() -> pysolr.SolrCloud:
-    """ZooKeeperに問い合わせてSolrに接続する関数。"""
-    # TODO: use environment variables for credentials.
-    username = 'Hisashi'
-    password = 'Kojima'
+    """このprocessで共有するSolrのclientを返す関数．
+    最初に呼び出されたときに接続する．forkされた場合は親プロセスの接続は使えないので作り直す．
+    """
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = create_solr_client()
+            _client_pid = os.getpid()
+        return _client
+
+
+def close_solr_client():
+    """共有しているSolrのclientのZooKeeperとHTTPの接続を閉じる関数．"""
+    global _client, _client_pid
+    with _client_lock:
+        client, pid = _client, _client_pid
+        _client = None
+        _client_pid = 0
+    # forkされたprocessでは親プロセスの接続を閉じない．
+    if client is None or pid != os.getpid():
+        return
+    client.get_session().close()
+    client.zookeeper.zk.stop()
+    client.zookeeper.zk.close()
 
-    collection_name = "twels_collection"
 
-    zookeeper = pysolr.ZooKeeper("zoo1:2181,zoo2:2181,zoo3:2181")
-    return pysolr.SolrCloud(zookeeper, collection_name, auth=HTTPBasicAuth(username, password))
+atexit.register(close_solr_client)
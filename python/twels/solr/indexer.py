@@ -1,46 +1,172 @@
 # -*- coding: utf-8 -*-
-"""initialize Solr.
+"""web_crawler/web_pagesにあるHTMLファイルをSolrにまとめて登録するscript．
+タイトル，説明，URL，本文のテキストはSolr Cell(solr.extract())を使わずにlxmlでこのプロセスの中で抽出する．
+抽出は複数のプロセスで同時に行い，batch_sizeページずつ完成したドキュメントだけをsolr.add()で送る．
+あるbatchを送っている間に次のbatchを抽出する．
+commitはcommitWithinでSolrに任せ，最後に1回だけcommitする．
+ドキュメントのidはweb_pagesからのHTMLファイルのpathなので，もう一度実行すると同じドキュメントを上書きする．
+自然言語の検索はlangフィールドで言語を絞り込むので，langフィールドがない以前のドキュメントは検索されない．
+langフィールドを追加する前に登録したcollectionは，全てのページをもう一度登録する必要がある．
+
+Pythonコンテナの/codeで以下のように実行する．
+    python -m twels.solr.indexer --workers 4
 """
+import argparse
 import glob
-from pathlib import Path
+import json
+import os
+import time
 import traceback
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
 
+import lxml.html
 import pysolr
 
 from twels.snippet.snippet import Snippet
-from twels.solr.client import get_solr_client
+from twels.solr.client import create_solr_client
 from twels.utils.utils import print_in_red
 
 
-if __name__ == '__main__':
+PYTHON_ROOT_DIR = Path(__file__).resolve().parent.parent.parent
+WEB_PAGES_DIR = PYTHON_ROOT_DIR / 'web_crawler' / 'web_pages'
+# web_pagesのHTMLファイルはUTF-8で保存されている．charsetのmetaタグがないファイルも文字化けしないように指定する．
+HTML_PARSER = lxml.html.HTMLParser(encoding='utf-8')
+# <html lang>がないページの言語．langがないと自然言語の検索で言語を絞り込んだときに表示されない．
+DEFAULT_LANG = os.environ.get('SOLR_DEFAULT_LANG', 'ja')
+
+
+def get_target_paths(pattern: str = '**/*.html') -> list[str]:
+    """登録するHTMLファイルのpathのリストを返す関数．
+    Args:
+        pattern: WEB_PAGES_DIRからのglobのpattern．
+    """
+    return sorted(glob.glob(str(WEB_PAGES_DIR / pattern), recursive=True))
+
+
+def get_doc_id(path: str) -> str:
+    """ドキュメントのidを返す関数．同じHTMLファイルは同じidになる．"""
+    return os.path.relpath(path, WEB_PAGES_DIR)
+
+
+def _get_first(root: lxml.html.HtmlElement, *xpaths: str) -> str | None:
+    """xpathsを順に試して，最初に見つかった空でない値を返す関数．"""
+    for xpath in xpaths:
+        for value in root.xpath(xpath):
+            value = str(value).strip()
+            if value:
+                return value
+    return None
+
+
+def _get_url(root: lxml.html.HtmlElement) -> str | None:
+    """ページのURLを返す関数．
+    canonicalのlinkタグ，og:urlのmetaタグ，Wikipediaのページのld+jsonの順に探す．
+    """
+    url = _get_first(root, '//link[@rel="canonical"]/@href', '//meta[@property="og:url"]/@content')
+    if url is not None:
+        return url
+    for info_json in root.xpath('//script[@type="application/ld+json"]/text()'):
+        try:
+            info = json.loads(info_json)
+        except ValueError:
+            continue
+        if isinstance(info, dict) and info.get('url'):
+            return info['url']
+    return None
+
+
+def parse_doc(path: str, doc_id: str) -> dict | None:
+    """HTMLファイルから登録するドキュメントを作る関数．worker processで実行される．
+    Returns:
+        登録するドキュメント．抽出に失敗した場合はNone．
+    """
     try:
-        PYTHON_ROOT_DIR = Path(__file__).resolve().parent.parent.parent
-
-        # TODO: すべてのページを登録するには時間がかかるので、今は一部だけを登録している。
-        # html_paths = glob.glob(f'{PYTHON_ROOT_DIR}/web_crawler/web_pages/**/*.html', recursive=True)
-        html_paths = glob.glob(f'{PYTHON_ROOT_DIR}/web_crawler/web_pages/manabitimes/*.html')
-        print(f'{len(html_paths)} pages will be indexed.')
-
-        solr = get_solr_client()
-
-        docs = []
-        for i in range(len(html_paths)):
-            with open(html_paths[i]) as f:
-                raw_doc: dict = solr.extract(f)
-                html_content = raw_doc['file'].replace('<?xml version="1.0" encoding="UTF-8"?>', '')
-
-                doc = {
-                    'id': str(i+1),
-                    'title': raw_doc['file_metadata'][23],
-                    'description': raw_doc['file_metadata'][21],
-                    'url': raw_doc['file_metadata'][43],
-                    'content': Snippet(html_content).text
-                }
-                docs.append(doc)
-            solr.add(docs)
-            print('document number: ', i+1)
-
-        solr.commit()
-        print('indexed!!')
+        with open(path, 'rb') as f:
+            root = lxml.html.fromstring(f.read(), parser=HTML_PARSER)
+        body = root.find('body')
+        if body is None:
+            body = root
+        doc = {
+            'id': doc_id,
+            'title': _get_first(root, '//title/text()'),
+            'description': _get_first(root, '//meta[@name="description"]/@content',
+                                      '//meta[@property="og:description"]/@content'),
+            'url': _get_url(root),
+            'lang': (root.get('lang') or '').strip() or DEFAULT_LANG,
+            'content': Snippet(lxml.html.tostring(body, encoding='unicode', with_tail=False)).text
+        }
+        # 値がないフィールドは送らない．
+        return {key: value for key, value in doc.items() if value is not None}
+    except Exception as e:
+        print_in_red(f'error in solr.indexer.parse_doc(). {path} {e}')
+        traceback.print_exc()
+        return None
+
+
+def index_pages(solr: pysolr.Solr, paths: list[str], workers: int, batch_size: int, commit_within: int) -> bool:
+    """HTMLファイルからテキストを抽出してSolrに登録する関数．
+    同時に抽出するページの数は最大でbatch_sizeなので，ページがいくつあってもメモリの使用量は増えない．
+    Args:
+        workers: テキストを同時に抽出するプロセスの数．
+        batch_size: 1回のsolr.add()で送るドキュメントの数．
+        commit_within: 送ったドキュメントをこのミリ秒以内にcommitするようにSolrに指示する．
+    Returns:
+        全てのbatchの登録に成功したらTrueを返す．
+    """
+    batches = [paths[i:i+batch_size] for i in range(0, len(paths), batch_size)]
+    page_count = 0
+    doc_count = 0
+    start_time = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        def submit(batch: list[str]) -> list[Future]:
+            return [executor.submit(parse_doc, path, get_doc_id(path)) for path in batch]
+
+        futures = submit(batches[0]) if batches else []
+        for i, batch in enumerate(batches):
+            docs = [doc for doc in (future.result() for future in futures) if doc is not None]
+            futures = submit(batches[i+1]) if i + 1 < len(batches) else []
+
+            try:
+                if docs:
+                    solr.add(docs, commit=False, commitWithin=commit_within)
+            except pysolr.SolrError as e:
+                print_in_red(f'failed to index {batch[0]} - {batch[-1]}. {e}')
+                for future in futures:
+                    future.cancel()
+                return False
+
+            page_count += len(batch)
+            doc_count += len(docs)
+            elapsed = time.perf_counter() - start_time
+            print(f'{page_count}/{len(paths)} pages, {doc_count / elapsed:.2f} docs/sec')
+
+    solr.commit()
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='web_crawler/web_pagesのHTMLファイルをSolrに登録する．')
+    parser.add_argument('--pattern', default='**/*.html', help='登録するHTMLファイルのweb_pagesからのglobのpattern')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='テキストを同時に抽出するプロセスの数')
+    parser.add_argument('--batch-size', type=int, default=100, help='1回で送るドキュメントの数')
+    parser.add_argument('--commit-within', type=int, default=60000, help='送ったドキュメントをcommitするまでのミリ秒')
+    parser.add_argument('--timeout', type=float, default=60, help='solr.add()の応答を待つ秒数')
+    args = parser.parse_args()
+
+    paths = get_target_paths(args.pattern)
+    print(f'{len(paths)} pages will be indexed.')
+
+    start_time = time.perf_counter()
+    try:
+        solr = create_solr_client(read_timeout=args.timeout)
+        if index_pages(solr, paths, args.workers, args.batch_size, args.commit_within):
+            elapsed = time.perf_counter() - start_time
+            print(f'indexed!! ({elapsed:.1f} seconds, {len(paths) / elapsed:.2f} pages/sec)')
     except pysolr.SolrError:
         print_in_red(traceback.format_exc())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""web_pages/wikiにあるHTMLファイルからデータベースのindexをまとめて作成するscript．
+Scrapyのpipelineを通さずに，ページと数式の解析を複数のプロセスで行い，
+chunk_sizeページずつ1つのtransactionでpage, inverted_index, path_dictionary tableに登録する．
+登録が終わったファイルはcheckpointファイルに記録するので，
+途中で中断しても，もう一度実行すると続きから登録する．解析に失敗したファイルも，もう一度実行すると登録し直す．
+
+Pythonコンテナの/codeで以下のように実行する．
+    python -m web_crawler.web_crawler.bulk_indexer --workers 4
+--build-segment DIRを指定すると，登録が終わった後にtableから数式のindexのsegmentを作る．
+"""
+import argparse
+import os
+import time
+import traceback
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+
+from itemadapter import ItemAdapter
+from scrapy.http.response.html import HtmlResponse
+
+from twels.indexer.indexer import Indexer
+from twels.segment import builder
+from twels.utils.utils import print_in_red
+from web_crawler.web_crawler.items import Page
+from web_crawler.web_crawler.spiders import functions
+from web_crawler.web_crawler.spiders.local_wiki_spider import LocalWikiEnSpider, LocalWikiSpider, _get_wiki_uri
+
+
+PYTHON_ROOT_DIR = Path(__file__).resolve().parent.parent.parent
+DEFAULT_CHECKPOINT = PYTHON_ROOT_DIR / 'logs' / 'bulk_indexer' / 'indexed_paths.txt'
+
+
+def get_target_paths() -> list[str]:
+    """登録するHTMLファイルのpathのリストを返す関数．
+    LocalWikiSpiderとLocalWikiEnSpiderと同じページを対象にする．
+    """
+    paths = LocalWikiSpider.target_paths + LocalWikiEnSpider.target_paths
+    # 重複を削除する．順番は保つ．
+    return list(dict.fromkeys(paths))
+
+
+def parse_page(path: str) -> tuple[dict | None, dict]:
+    """1ページを解析する関数．worker processで実行される．
+    Args:
+        path: HTMLファイルのpath．
+    Returns:
+        (page, path_sets): pageはPageをdictにしたもの．解析に失敗した場合はNone．
+                           path_setsはIndexer.get_path_sets()で求めた数式ごとのpath set．
+    """
+    try:
+        with open(path, 'rb') as f:
+            response = HtmlResponse(url=f'file://{path}', body=f.read())
+        snippet, exprs = functions.get_snippet_and_exprs(response)
+        page = Page(
+            uri=_get_wiki_uri(response),
+            title=functions.get_title(response),
+            snippet=snippet,
+            lang=functions.get_lang(response),
+            exprs=exprs
+        )
+        # このprocess自体がworkerなので，数式の解析はこのprocessで行う．
+        path_sets, _ = Indexer.get_path_sets(page['exprs'], page['title'], workers=1)
+        return dict(page), path_sets
+    except Exception as e:
+        print_in_red(f'error in bulk_indexer.parse_page(). {path} {e}')
+        traceback.print_exc()
+        return None, {}
+
+
+def load_checkpoint(checkpoint: Path) -> set[str]:
+    """登録済みのHTMLファイルのpathの集合を返す関数．"""
+    if not checkpoint.exists():
+        return set()
+    with open(checkpoint, encoding='utf-8') as f:
+        return set(line.rstrip('\n') for line in f if line.strip())
+
+
+def save_checkpoint(checkpoint: Path, paths: list[str]):
+    """登録済みのHTMLファイルのpathをcheckpointファイルに追記する関数．"""
+    with open(checkpoint, 'a', encoding='utf-8') as f:
+        f.writelines(f'{path}\n' for path in paths)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def build(paths: list[str], checkpoint: Path, workers: int, chunk_size: int, test: bool = False) -> bool:
+    """HTMLファイルを解析してデータベースに登録する関数．
+    chunk_sizeページずつ解析と登録を行い，あるchunkを登録している間に次のchunkを解析する．
+    Returns:
+        全てのchunkの登録に成功したらTrueを返す．
+    """
+    chunks = [paths[i:i+chunk_size] for i in range(0, len(paths), chunk_size)]
+    done_count = 0
+    # 登録したページの数．解析に失敗したページは登録しないので，failed_countに数える．
+    page_count = 0
+    failed_count = 0
+    expr_count = 0
+    start_time = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        def submit(chunk: list[str]) -> list[Future]:
+            return [executor.submit(parse_page, path) for path in chunk]
+
+        futures = submit(chunks[0]) if chunks else []
+        for i, chunk in enumerate(chunks):
+            results = [future.result() for future in futures]
+            futures = submit(chunks[i+1]) if i + 1 < len(chunks) else []
+
+            # 解析に失敗したファイルはcheckpointに記録しないので，もう一度実行したときに登録し直す．
+            parsed = [(path, page, path_sets) for path, (page, path_sets) in zip(chunk, results) if page is not None]
+            pages = [(ItemAdapter(page), path_sets) for _, page, path_sets in parsed]
+            if not Indexer.update_db_in_bulk(pages, test=test):
+                print_in_red(f'failed to index {chunk[0]} - {chunk[-1]}.')
+                for future in futures:
+                    future.cancel()
+                return False
+            save_checkpoint(checkpoint, [path for path, _, _ in parsed])
+
+            done_count += len(chunk)
+            page_count += len(pages)
+            failed_count += len(chunk) - len(pages)
+            expr_count += sum(len(page_info['exprs']) for page_info, _ in pages)
+            elapsed = time.perf_counter() - start_time
+            print(f'{done_count}/{len(paths)} files, {page_count} pages indexed, {failed_count} failed, '
+                  f'{page_count / elapsed:.2f} pages/sec, {expr_count / elapsed:.2f} formulas/sec')
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='web_pages/wikiのHTMLファイルからindexをまとめて作成する．')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='解析に使うプロセスの数')
+    parser.add_argument('--chunk-size', type=int, default=200, help='1つのtransactionで登録するページの数')
+    parser.add_argument('--checkpoint', type=Path, default=DEFAULT_CHECKPOINT, help='登録済みのファイルを記録するファイル')
+    parser.add_argument('--restart', action='store_true', help='checkpointを削除して最初から登録する')
+    parser.add_argument('--test', action='store_true', help='テスト用のデータベースに登録する')
+    parser.add_argument('--build-segment', type=Path, metavar='DIR', help='登録した後に数式のindexのsegmentを作るdirectory')
+    args = parser.parse_args()
+
+    args.checkpoint.parent.mkdir(parents=True, exist_ok=True)
+    if args.restart:
+        args.checkpoint.unlink(missing_ok=True)
+
+    indexed = load_checkpoint(args.checkpoint)
+    paths = [path for path in get_target_paths() if path not in indexed]
+    print(f'{len(paths)} pages will be indexed. ({len(indexed)} pages have already been indexed.)')
+
+    start_time = time.perf_counter()
+    if build(paths, args.checkpoint, args.workers, args.chunk_size, test=args.test):
+        print(f'indexed!! ({time.perf_counter() - start_time:.1f} seconds)')
+        if args.build_segment is not None:
+            path = builder.build_from_database(args.build_segment, test=args.test)
+            print(f'built {path} ({time.perf_counter() - start_time:.1f} seconds)')
+
+
+if __name__ == '__main__':
+    main()
@@ -49,12 +49,12 @@ class WebCrawlerPipeline:
     def process_item(self, item, spider: Spider):
         """数式をデータベースに登録する関数．
         """
-        Indexer.update_db(ItemAdapter(item))
+        Indexer.update_db(ItemAdapter(item), batch=True)
         return item
 
 
 class TestCrawlerPipeline:
     """Crawlerの動作確認のためのPipeline。"""
     def process_item(self, item, spider: Spider):
-        Indexer.update_db(ItemAdapter(item), test=True)
+        Indexer.update_db(ItemAdapter(item), test=True, batch=True)
         return item
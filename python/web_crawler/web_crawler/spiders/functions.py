@@ -8,7 +8,7 @@ from bs4 import BeautifulSoup
 import requests
 from scrapy.utils.httpobj import urlparse
 
-from twels.expr.expression import Expression
+from twels.expr.expression import Expression, ExpressionTable
 from twels.snippet.snippet import Snippet
 
 
@@ -22,13 +22,16 @@ def get_title(response) -> str:
     return response.css('title::text').get()
 
 
-def get_snippet(response) -> Snippet:
+def get_snippet(response, expr_table: ExpressionTable | None = None) -> Snippet:
     """ページの説明を取得する関数．
+    Args:
+        expr_table: 同じページの数式のExpressionTable．get_exprs()と同じものを渡すと，
+                    数式を2回整形しなくて済む．
     """
     # TODO: spiderのコードの中でBeautifulSoupに置き換えられる場所があるか検討
     # 参考: https://doc.scrapy.org/en/latest/faq.html#can-i-use-scrapy-with-beautifulsoup
     body = response.css('body').get()
-    return Snippet(body)
+    return Snippet(body, expr_table=expr_table)
 
 
 def get_domain_from_uri(uri: str) -> str:
@@ -37,16 +40,31 @@ def get_domain_from_uri(uri: str) -> str:
     return f'{parseResult.scheme}://{parseResult.netloc}'
 
 
-def get_exprs(response) -> list[Expression]:
-    """ページの式のリストを返す関数．"""
+def get_exprs(response, expr_table: ExpressionTable | None = None) -> list[Expression]:
+    """ページの式のリストを返す関数．
+    Args:
+        expr_table: 同じページの数式のExpressionTable．
+    """
+    if expr_table is None:
+        expr_table = ExpressionTable()
     result = []
     for mathml in response.xpath('//math').getall():
-        result.append(Expression(mathml))
+        result.append(expr_table.get(mathml))
 
     # 数式が重複している場合に重複している数式を削除する。
     return list(set(result))
 
 
+def get_snippet_and_exprs(response) -> tuple[Snippet, list[Expression]]:
+    """ページの説明と式のリストを返す関数．
+    get_snippet()とget_exprs()で1つのExpressionTableを使うので，
+    同じ数式を整形するのは1回だけで，PageのsnippetとexprsのExpressionは同じオブジェクトになる．
+    """
+    expr_table = ExpressionTable()
+    exprs = get_exprs(response, expr_table)
+    return get_snippet(response, expr_table), exprs
+
+
 def render_katex(expr_katex: str) -> str:
     """KaTeXをMathMLに変換する関数。
     I don't use this function now, but I maybe use this in the future.
@@ -34,12 +34,13 @@ class LocalManabitimesSpider(scrapy.Spider):
     def parse(self, response: HtmlResponse):
         LocalManabitimesSpider.count += 1
         print(f'{LocalManabitimesSpider.count}番目')
+        snippet, exprs = functions.get_snippet_and_exprs(response)
         yield Page(
             uri=self._get_manabitimes_uri(response),
             title=functions.get_title(response),
-            snippet=functions.get_snippet(response),
+            snippet=snippet,
             lang=functions.get_lang(response),
-            exprs=functions.get_exprs(response)
+            exprs=exprs
         )
 
     def _get_manabitimes_uri(self, response: HtmlResponse) -> str:
@@ -51,12 +51,13 @@ class LocalWikiSpider(scrapy.Spider):
     def parse(self, response: HtmlResponse):
         LocalWikiSpider.count += 1
         print(f'{LocalWikiSpider.count}番目')
+        snippet, exprs = functions.get_snippet_and_exprs(response)
         yield Page(
             uri=_get_wiki_uri(response),
             title=functions.get_title(response),
-            snippet=functions.get_snippet(response),
+            snippet=snippet,
             lang=functions.get_lang(response),
-            exprs=functions.get_exprs(response)
+            exprs=exprs
         )
 
 
@@ -76,12 +77,13 @@ class LocalWikiEnSpider(scrapy.Spider):
     def parse(self, response: HtmlResponse):
         LocalWikiEnSpider.count += 1
         print(f'{LocalWikiEnSpider.count}番目')
+        snippet, exprs = functions.get_snippet_and_exprs(response)
         yield Page(
             uri=_get_wiki_uri(response),
             title=functions.get_title(response),
-            snippet=functions.get_snippet(response),
+            snippet=snippet,
             lang=functions.get_lang(response),
-            exprs=functions.get_exprs(response)
+            exprs=exprs
         )
 
 
@@ -92,10 +94,11 @@ class LocalTestSpider(scrapy.Spider):
     start_urls = [f'{_get_norm_path()}/math/微分方程式 - Wikipedia.html']
 
     def parse(self, response: HtmlResponse):
+        snippet, exprs = functions.get_snippet_and_exprs(response)
         yield Page(
             uri=_get_wiki_uri(response),
             title=functions.get_title(response),
-            snippet=functions.get_snippet(response),
+            snippet=snippet,
             lang=functions.get_lang(response),
-            exprs=functions.get_exprs(response)
+            exprs=exprs
         )
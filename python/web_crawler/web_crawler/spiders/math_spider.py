@@ -38,10 +38,11 @@ class MathSpider(scrapy.Spider):
 
     def _parse_response(self, response: SplashTextResponse):
         """要素を取得してItemに追加する関数．"""
+        snippet, exprs = functions.get_snippet_and_exprs(response)
         yield Page(
             uri=response.url,
             title=functions.get_title(response),
-            snippet=functions.get_snippet(response),
+            snippet=snippet,
             lang=functions.get_lang(response),
-            exprs=functions.get_exprs(response)
+            exprs=exprs
         )